@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+from numpy.fft import fft, ifft
+
+from tle.util.ranklist.rating_calculator import (JoiningRatingCalculator,
+                                                 predict_rating_changes)
+
+
+# The scalar implementation the vectorized calculator replaced, kept as the reference.
+
+def _intdiv(x, y):
+    return -(-x // y) if x < 0 else x // y
+
+
+@dataclass
+class _Contestant:
+    party: str
+    points: float
+    penalty: int
+    rating: int
+    need_rating: int = 0
+    delta: int = 0
+    rank: float = 0.0
+    seed: float = 0.0
+
+
+class _ScalarRatingCalculator:
+    def __init__(self, standings):
+        self.contestants = [_Contestant(handle, points, penalty, rating)
+                            for handle, points, penalty, rating in standings]
+        self._precalc_seed()
+        self._reassign_ranks()
+        self._process()
+        self._update_delta()
+
+    def calculate_rating_changes(self):
+        return {contestant.party: contestant.delta for contestant in self.contestants}
+
+    def get_seed(self, rating, me=None):
+        seed = self.seed[rating]
+        if me:
+            seed -= self.elo_win_prob[rating - me.rating]
+        return seed
+
+    def _precalc_seed(self):
+        MAX = 6144
+        self.elo_win_prob = np.roll(1 / (1 + pow(10, np.arange(-MAX, MAX) / 400)), -MAX)
+        count = np.zeros(2 * MAX)
+        for a in self.contestants:
+            count[a.rating] += 1
+        self.seed = 1 + ifft(fft(count) * fft(self.elo_win_prob)).real
+
+    def _reassign_ranks(self):
+        contestants = self.contestants
+        contestants.sort(key=lambda o: (-o.points, o.penalty))
+        points = penalty = rank = None
+        for i in reversed(range(len(contestants))):
+            if contestants[i].points != points or contestants[i].penalty != penalty:
+                rank = i + 1
+                points = contestants[i].points
+                penalty = contestants[i].penalty
+            contestants[i].rank = rank
+
+    def _process(self):
+        for a in self.contestants:
+            a.seed = self.get_seed(a.rating, a)
+            mid_rank = (a.rank * a.seed) ** 0.5
+            a.need_rating = self._rank_to_rating(mid_rank, a)
+            a.delta = _intdiv(a.need_rating - a.rating, 2)
+
+    def _rank_to_rating(self, rank, me):
+        left, right = 1, 8000
+        while right - left > 1:
+            mid = (left + right) // 2
+            if self.get_seed(mid, me) < rank:
+                right = mid
+            else:
+                left = mid
+        return left
+
+    def _update_delta(self):
+        contestants = self.contestants
+        n = len(contestants)
+
+        contestants.sort(key=lambda o: -o.rating)
+        correction = _intdiv(-sum(c.delta for c in contestants), n) - 1
+        for contestant in contestants:
+            contestant.delta += correction
+
+        zero_sum_count = min(4 * round(n ** 0.5), n)
+        delta_sum = -sum(contestants[i].delta for i in range(zero_sum_count))
+        correction = min(0, max(-10, _intdiv(delta_sum, zero_sum_count)))
+        for contestant in contestants:
+            contestant.delta += correction
+
+
+def _random_standings(seed, n):
+    """Standings in row order, with many ties in points and penalty and many contestants sharing
+    one rating."""
+    rng = np.random.default_rng(seed)
+    points = rng.choice([0, 500, 1000, 1500, 2750.5], size=n).tolist()
+    penalty = rng.integers(0, 4, size=n).tolist()
+    rating = np.where(rng.random(n) < 0.4, 1500, rng.integers(0, 4000, size=n)).tolist()
+    return [(f'user{i}', points[i], penalty[i], rating[i]) for i in range(n)]
+
+
+_CASES = [(seed, n) for seed in range(3) for n in (1, 2, 17, 250)]
+
+
+@pytest.mark.parametrize('seed,n', _CASES)
+def test_predict_rating_changes_matches_scalar(seed, n):
+    standings = _random_standings(seed, n)
+    expected = _ScalarRatingCalculator(standings).calculate_rating_changes()
+    changes, seed_table = predict_rating_changes(*zip(*standings))
+    assert changes == expected
+
+    # A seed table reused from a calculation with the same ratings gives the same changes.
+    changes, _ = predict_rating_changes(*zip(*standings), seed=seed_table)
+    assert changes == expected
+
+
+def test_predict_rating_changes_all_tied_same_rating():
+    standings = [(f'user{i}', 1000, 0, 1500) for i in range(100)]
+    expected = _ScalarRatingCalculator(standings).calculate_rating_changes()
+    assert predict_rating_changes(*zip(*standings))[0] == expected
+
+
+@pytest.mark.parametrize('seed,n', [(seed, n) for seed in range(3) for n in (2, 17, 120)])
+def test_joining_matches_scalar(seed, n):
+    standings = _random_standings(seed, n)
+    rng = np.random.default_rng(seed + 100)
+    joining = set(rng.choice(n, size=max(1, n // 4), replace=False).tolist())
+    rows = [row for row in range(n) if row not in joining]
+    calculator = JoiningRatingCalculator(
+        rows, [standings[row][1] for row in rows], [standings[row][2] for row in rows],
+        [standings[row][3] for row in rows])
+    for row in sorted(joining):
+        party, points, penalty, rating = standings[row]
+        contest = [standings[i] for i in sorted(rows + [row])]
+        expected = _ScalarRatingCalculator(contest).calculate_rating_changes()[party]
+        assert calculator.calculate_delta(row, points, penalty, rating) == expected
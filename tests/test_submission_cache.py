@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from tle.util import cache_system2
+from tle.util import codeforces_api as cf
+from tle.util.db import SubmissionCacheDbConn
+
+HANDLE = 'tourist'
+CONTEST_ID = 1000
+DAY = 24 * 60 * 60
+
+
+class _AsyncConn:
+    """Runs the methods of a connection inline, as coroutine functions like `AsyncDbConn`."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        method = getattr(self.conn, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class _CacheMaster:
+    def __init__(self):
+        self.submission_conn = _AsyncConn(SubmissionCacheDbConn(':memory:'))
+        self.contest_cache = type('ContestCache', (), {'contest_by_id': {}})()
+
+    def set_contest(self, phase, end_time):
+        self.contest_cache.contest_by_id[CONTEST_ID] = cf.Contest(
+            CONTEST_ID, 'Round', end_time - 2 * 60 * 60, 2 * 60 * 60, 'CF', phase, None)
+
+
+def _submission(id_, verdict, creation_time, contest_id=CONTEST_ID):
+    problem = cf.Problem(contest_id, None, 'A', 'Problem', 'PROGRAMMING', None, 800, ['dp'])
+    author = cf.Party(contest_id, [cf.Member(HANDLE)], 'CONTESTANT', None, None, False, None,
+                      creation_time)
+    return cf.Submission(id_, contest_id, problem, author, 'C++', verdict, creation_time, 0)
+
+
+def _get_submissions(cache, monkeypatch, api_submissions):
+    """Serves the submissions from `user.status` and returns the verdicts by id from the cache."""
+    async def status(*, handle, from_=None, count=None):
+        subs = api_submissions[(from_ or 1) - 1:]
+        return subs[:count] if count is not None else subs
+    monkeypatch.setattr(cf.user, 'status', status)
+    submissions = asyncio.run(cache.get_submissions(HANDLE))
+    return {sub.id: sub.verdict for sub in submissions}
+
+
+def test_verdict_changed_after_system_test(monkeypatch):
+    master = _CacheMaster()
+    cache = cache_system2.SubmissionCache(master)
+    now = time.time()
+    master.set_contest('SYSTEM_TEST', now - 60)
+    old = _submission(1, 'OK', now - 30 * DAY, contest_id=1)
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(2, 'OK', now - 600), old])
+    assert verdicts == {2: 'OK', 1: 'OK'}
+
+    # The pretests passed, but the system tests did not.
+    master.set_contest('FINISHED', now - 60)
+    verdicts = _get_submissions(cache, monkeypatch,
+                                [_submission(2, 'WRONG_ANSWER', now - 600), old])
+    assert verdicts == {2: 'WRONG_ANSWER', 1: 'OK'}
+
+    # A rejudge shortly after the contest is picked up as well.
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(2, 'SKIPPED', now - 600), old])
+    assert verdicts == {2: 'SKIPPED', 1: 'OK'}
+
+    # Once the contest has settled the submission is final, and is not fetched again.
+    master.set_contest('FINISHED', now - 4 * DAY)
+    _get_submissions(cache, monkeypatch, [_submission(2, 'SKIPPED', now - 600), old])
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(2, 'OK', now - 600), old])
+    assert verdicts == {2: 'SKIPPED', 1: 'OK'}
+
+
+def test_pending_verdict(monkeypatch):
+    master = _CacheMaster()
+    cache = cache_system2.SubmissionCache(master)
+    now = time.time()
+    master.set_contest('FINISHED', now - 30 * DAY)
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(1, 'TESTING', now - 10)])
+    assert verdicts == {1: 'TESTING'}
+
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(2, None, now),
+                                                     _submission(1, 'OK', now - 10)])
+    assert verdicts == {2: None, 1: 'OK'}
+
+    verdicts = _get_submissions(cache, monkeypatch, [_submission(2, 'TIME_LIMIT_EXCEEDED', now),
+                                                     _submission(1, 'OK', now - 10)])
+    assert verdicts == {2: 'TIME_LIMIT_EXCEEDED', 1: 'OK'}
+
+
+def test_unknown_contest_settles_by_submission_time(monkeypatch):
+    master = _CacheMaster()
+    cache = cache_system2.SubmissionCache(master)
+    now = time.time()
+    gym_id = 100001
+    _get_submissions(cache, monkeypatch, [_submission(2, 'OK', now - 600, contest_id=gym_id),
+                                          _submission(1, 'OK', now - 4 * DAY, contest_id=gym_id)])
+    verdicts = _get_submissions(cache, monkeypatch,
+                                [_submission(2, 'WRONG_ANSWER', now - 600, contest_id=gym_id),
+                                 _submission(1, 'WRONG_ANSWER', now - 4 * DAY, contest_id=gym_id)])
+    assert verdicts == {2: 'WRONG_ANSWER', 1: 'OK'}
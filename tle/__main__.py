@@ -25,13 +25,11 @@ if STORAGE_BUCKET!='None':
     })
     bucket = storage.bucket()
 
-import seaborn as sns
 from disnake.ext import commands
-from matplotlib import pyplot as plt
 
 from tle import constants
 from tle.util import codeforces_common as cf_common
-from tle.util import discord_common, font_downloader
+from tle.util import discord_common, font_downloader, graph_common
 from tle.util import clist_api
 
 
@@ -64,14 +62,7 @@ def setup():
                                                            backupCount=3, utc=True)])
 
     # matplotlib and seaborn
-    plt.rcParams['figure.figsize'] = 7.0, 3.5
-    sns.set()
-    options = {
-        'axes.edgecolor': '#A0A0C5',
-        'axes.spines.top': False,
-        'axes.spines.right': False,
-    }
-    sns.set_style('darkgrid', options)
+    graph_common.setup_style()
 
     # Download fonts if necessary
     font_downloader.maybe_download()
@@ -103,8 +94,11 @@ def main():
     # on_ready event handler rather than an on_ready listener.
     @discord_common.on_ready_event_once(bot)
     async def init():
-        clist_api.cache()
         await cf_common.initialize(args.nodb)
+        try:
+            await clist_api.cache()
+        except clist_api.ClistApiError:
+            logging.warning('Could not cache the contests from Clist', exc_info=True)
         asyncio.create_task(discord_common.presence(bot))
 
     async def no_dm_check(inter):
@@ -8,23 +8,16 @@ import pytz
 import datetime as dt
 import time
 import re
-import itertools
-import math
 import disnake
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import io
 
 from tle.cogs.handles import ATCODER_RATED_RANKS, CODECHEF_RATED_RANKS, _CLIST_RESOURCE_SHORT_FORMS, _SUPPORTED_CLIST_RESOURCES
 from collections import defaultdict, namedtuple
 from typing import List
 from disnake.ext import commands
-from matplotlib import pyplot as plt
 from matplotlib import patches as patches
-from matplotlib import lines as mlines
-from matplotlib import dates as mdates
-from matplotlib.ticker import MultipleLocator
 
 from tle import constants
 from tle.util import db
@@ -38,6 +31,8 @@ from tle.util import codeforces_common as cf_common
 from tle.util import clist_api as clist
 from tle.util import discord_common
 from tle.util import graph_common as gc
+from tle.util import compute
+from tle.util import plot_jobs
 
 from PIL import Image, ImageFont, ImageDraw
 pd.plotting.register_matplotlib_converters()
@@ -52,51 +47,26 @@ def nice_sub_type(types):
                 'PRACTICE':'Practice: {}'}
     return [nice_map[t] for t in types]
 
-def _plot_rating(resp, mark='o', resource='codeforces.com'):
-
-    for rating_changes in resp:
-        ratings, times = [], []
-        for rating_change in rating_changes:
-            ratings.append(rating_change.newRating)
-            times.append(dt.datetime.fromtimestamp(rating_change.ratingUpdateTimeSeconds))
-
-        plt.plot(times,
-                 ratings,
-                 linestyle='-',
-                 marker=mark,
-                 markersize=3,
-                 markerfacecolor='white',
-                 markeredgewidth=0.5)
-    if resource=='codechef.com':
-        gc.plot_rating_bg(CODECHEF_RATED_RANKS)
-    elif resource=='atcoder.jp':
-        gc.plot_rating_bg(ATCODER_RATED_RANKS)
-    else:
-        gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()
-
-def _plot_perf(resp, mark='o', resource='codeforces.com'):
-
-    for rating_changes in resp:
-        ratings, times = [], []
-        for rating_change in rating_changes:
-            ratings.append(rating_change.oldRating)
-            times.append(dt.datetime.fromtimestamp(rating_change.ratingUpdateTimeSeconds))
-
-        plt.plot(times,
-                 ratings,
-                 linestyle='-',
-                 marker=mark,
-                 markersize=3,
-                 markerfacecolor='white',
-                 markeredgewidth=0.5)
+def _ranks_for_resource(resource):
     if resource=='codechef.com':
-        gc.plot_rating_bg(CODECHEF_RATED_RANKS)
+        return CODECHEF_RATED_RANKS
     elif resource=='atcoder.jp':
-        gc.plot_rating_bg(ATCODER_RATED_RANKS)
-    else:
-        gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()    
+        return ATCODER_RATED_RANKS
+    return cf.RATED_RANKS
+
+def _rating_series(resp):
+    """The times and new ratings of the rating changes of every user, for
+    `plot_jobs.rating_graph`."""
+    return [([change.ratingUpdateTimeSeconds for change in rating_changes],
+             [change.newRating for change in rating_changes])
+            for rating_changes in resp]
+
+def _perf_series(resp):
+    """Like `_rating_series`, with the old ratings which hold the performance after
+    `correct_rating_changes`."""
+    return [([change.ratingUpdateTimeSeconds for change in rating_changes],
+             [change.oldRating for change in rating_changes])
+            for rating_changes in resp]
 
 def _classify_submissions(submissions):
     solved_by_type = {sub_type: [] for sub_type in cf.Party.PARTICIPANT_TYPES}
@@ -105,27 +75,6 @@ def _classify_submissions(submissions):
     return solved_by_type
 
 
-def _plot_scatter(regular, practice, virtual, point_size):
-    for contest in [practice, regular, virtual]:
-        if contest:
-            times, ratings = zip(*contest)
-            plt.scatter(times, ratings, zorder=10, s=point_size)
-
-
-def _running_mean(x, bin_size):
-    n = len(x)
-
-    cum_sum = [0] * (n + 1)
-    for i in range(n):
-        cum_sum[i + 1] = x[i] + cum_sum[i]
-
-    res = [0] * (n - bin_size + 1)
-    for i in range(bin_size, n + 1):
-        res[i - bin_size] = (cum_sum[i] - cum_sum[i - bin_size]) / bin_size
-
-    return res
-
-
 def _get_extremes(contest, problemset, submissions):
 
     def in_contest(sub):
@@ -144,9 +93,11 @@ def _get_extremes(contest, problemset, submissions):
     return min_unsolved, max_solved
 
 
-def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolved, legend):
+def _extreme_points(packed_contest_subs_problemset):
+    """Splits the contests into those with both an easiest unsolved and a hardest solved problem,
+    those with everything solved and those with nothing solved, for `plot_jobs.extremes`."""
     extremes = [
-        (dt.datetime.fromtimestamp(contest.end_time), _get_extremes(contest, problemset, subs))
+        (contest.end_time, _get_extremes(contest, problemset, subs))
         for contest, problemset, subs in packed_contest_subs_problemset
     ]
     regular = []
@@ -163,76 +114,7 @@ def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolv
             # No rated problems in the contest, which means rating is not yet available for
             # problems in this contest. Skip this data point.
             pass
-
-    solvedcolor = 'tab:orange'
-    unsolvedcolor = 'tab:blue'
-    linecolor = '#00000022'
-    outlinecolor = '#00000022'
-
-    def scatter_outline(*args, **kwargs):
-        plt.scatter(*args, **kwargs)
-        kwargs['zorder'] -= 1
-        kwargs['color'] = outlinecolor
-        if kwargs['marker'] == '*':
-            kwargs['s'] *= 3
-        elif kwargs['marker'] == 's':
-            kwargs['s'] *= 1.5
-        else:
-            kwargs['s'] *= 2
-        if 'alpha' in kwargs:
-            del kwargs['alpha']
-        if 'label' in kwargs:
-            del kwargs['label']
-        plt.scatter(*args, **kwargs)
-
-    plt.clf()
-    time_scatter, plot_min, plot_max = zip(*regular)
-    if unsolved:
-        scatter_outline(time_scatter, plot_min, zorder=10,
-                        s=14, marker='o', color=unsolvedcolor,
-                        label='Easiest unsolved')
-    if solved:
-        scatter_outline(time_scatter, plot_max, zorder=10,
-                        s=14, marker='o', color=solvedcolor,
-                        label='Hardest solved')
-
-    ax = plt.gca()
-    if solved and unsolved:
-        for t, mn, mx in regular:
-            ax.add_line(mlines.Line2D((t, t), (mn, mx), color=linecolor))
-
-    if fullsolves:
-        scatter_outline(*zip(*fullsolves), zorder=15,
-                        s=42, marker='*',
-                        color=solvedcolor)
-    if nosolves:
-        scatter_outline(*zip(*nosolves), zorder=15,
-                        s=32, marker='X',
-                        color=unsolvedcolor)
-
-    if legend:
-        plt.legend(title=f'{handle}: {rating}', title_fontsize=plt.rcParams['legend.fontsize'],
-                   loc='upper left').set_zorder(20)
-    gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()
-
-
-def _plot_average(practice, bin_size, label: str = ''):
-    if len(practice) > bin_size:
-        sub_times, ratings = map(list, zip(*practice))
-
-        sub_timestamps = [sub_time.timestamp() for sub_time in sub_times]
-        mean_sub_timestamps = _running_mean(sub_timestamps, bin_size)
-        mean_sub_times = [dt.datetime.fromtimestamp(timestamp) for timestamp in mean_sub_timestamps]
-        mean_ratings = _running_mean(ratings, bin_size)
-
-        plt.plot(mean_sub_times,
-                 mean_ratings,
-                 linestyle='-',
-                 marker='',
-                 markerfacecolor='white',
-                 markeredgewidth=0.5,
-                 label=label)
+    return regular, fullsolves, nosolves
 
 _CONTESTS_PER_PAGE = 5
 _CONTEST_PAGINATE_WAIT_TIME = 5 * 60
@@ -312,13 +194,13 @@ def _get_embed_fields_from_contests(contests):
     return fields
 
 
-def _get_ongoing_vc_participants():
+async def _get_ongoing_vc_participants():
     """ Returns a set containing the `member_id`s of users who are registered in an ongoing vc.
     """
-    ongoing_vc_ids = cf_common.user_db.get_ongoing_rated_vc_ids()
+    ongoing_vc_ids = await cf_common.user_db.get_ongoing_rated_vc_ids()
     ongoing_vc_participants = set()
     for vc_id in ongoing_vc_ids:
-        vc_participants = set(cf_common.user_db.get_rated_vc_user_ids(vc_id))
+        vc_participants = set(await cf_common.user_db.get_rated_vc_user_ids(vc_id))
         ongoing_vc_participants |= vc_participants
     return ongoing_vc_participants
 
@@ -432,7 +314,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        submissions = [await cf.user.status(handle=handle) for handle in handles]
+        submissions = await asyncio.gather(*(cf_common.cache2.submission_cache.get_submissions(handle)
+                                             for handle in handles))
         submissions = [sub for subs in submissions for sub in subs]
         submissions = filt.filter_subs(submissions)
 
@@ -467,7 +350,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
     async def leaderboard(self, inter):
         await inter.response.send_message('This may take a while...')
         handles = {handle for discord_id, handle
-                            in cf_common.user_db.get_handles_for_guild(inter.guild.id)}
+                            in await cf_common.user_db.get_handles_for_guild(inter.guild.id)}
         date = dt.datetime.now()-dt.timedelta(days=7)
         filt = cf_common.SubFilter(False)
         filt.parse('');
@@ -475,8 +358,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         rows = []
         i = 1
         for handle in handles:
-            user = cf_common.user_db.fetch_cf_user(handle)
-            submissions = await cf.user.status(handle=handle)
+            user = await cf_common.user_db.fetch_cf_user(handle)
+            submissions = await cf_common.cache2.submission_cache.get_submissions(handle)
             submissions = filt.filter_subs(submissions)
             points = 0
             problemCount = 0
@@ -549,17 +432,13 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         handles = handles or ['!' + str(inter.author)]
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await asyncio.gather(*(cf_common.cache2.submission_cache.get_submissions(handle)
+                                      for handle in handles))
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
-        plt.clf()
-        plt.xlabel('Rating')
-        plt.ylabel('Minutes spent')
-
-        max_time = 0  # for ylim
-
+        series = []
         for submissions in all_solved_subs:
-            scatter_points = []  # only matters if +scatter
+            scatter_points = [] if add_scatter else None
 
             solved_by_contest = collections.defaultdict(lambda: [])
             for submission in submissions:
@@ -592,27 +471,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 time_by_rating[rating] = sum(times) / len(times)
                 if add_scatter:
                     for t in times:
-                        scatter_points.append([rating, t])
-                        max_time = max(max_time, t)
+                        scatter_points.append((rating, t))
 
             xs = sorted(time_by_rating.keys())
             ys = [time_by_rating[rating] for rating in xs]
+            series.append((xs, ys, scatter_points))
 
-            max_time = max(max_time, max(ys, default=0))
-            plt.plot(xs, ys)
-            if add_scatter:
-                plt.scatter(*zip(*scatter_points), s=point_size)
-
-        labels = [gc.StrWrap(handle) for handle in handles]
-        plt.legend(labels)
-        plt.ylim(0, max_time + 5)
-
-        # make xticks divisible by 100
-        ticks = plt.gca().get_xticks()
-        base = ticks[1] - ticks[0]
-        plt.gca().get_xaxis().set_major_locator(MultipleLocator(base = max(base // 100 * 100, 100)))
-
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.solve_speed, series, handles, point_size)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Plot of average time spent on a problem')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -674,7 +540,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 resp.append(filtered_changes)
         else:
             handles = []
-            account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+            account_id = await cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
             if account_id!=None:
                 resp = [await clist.fetch_rating_changes([account_id])]
                 handles.append(inter.author.display_name)
@@ -698,14 +564,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if peak:
             resp = [max_prefix(user) for user in resp]
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_rating(resp, resource=resource)
         current_ratings = [rating_changes[-1].newRating if rating_changes else 'Unrated' for rating_changes in resp]
         handles = [rating_changes[-1].handle for rating_changes in resp]
-        labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        labels = [f'{handle} ({rating})' for handle, rating in zip(handles, current_ratings)]
 
+        ylim = None
         if not zoom:
             min_rating = 1100
             max_rating = 1800
@@ -713,9 +576,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.newRating)
                     max_rating = max(max_rating, rating.newRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            ylim = (min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.rating_graph, _rating_series(resp), labels,
+                                   _ranks_for_resource(resource), ylim)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Rating graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -760,7 +625,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if resource=='codeforces.com':
             handles = args or ('!' + str(inter.author),)
             handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-            resp = [await cf.user.rating(handle=handle) for handle in handles]
+            resp = await asyncio.gather(*(cf.user.rating(handle=handle) for handle in handles))
             if not any(resp):
                 handles_str = ', '.join(f'`{handle}`' for handle in handles)
                 if len(handles) == 1:
@@ -785,7 +650,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                     resp.append(data[key])
             else:
                 handles = []
-                account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+                account_id = await cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
                 if account_id!=None:
                     resp = [await clist.fetch_rating_changes([account_id])]
                     handles.append(inter.author.display_name)
@@ -809,15 +674,12 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if peak:
             resp = [max_prefix(user) for user in resp]
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_rating(resp, resource=resource)
         current_ratings = [rating_changes[-1].newRating if rating_changes else 'Unrated' for rating_changes in resp]
         if resource!='codeforces.com':
             handles = [rating_changes[-1].handle for rating_changes in resp]
-        labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        labels = [f'{handle} ({rating})' for handle, rating in zip(handles, current_ratings)]
 
+        ylim = None
         if not zoom:
             min_rating = 1100
             max_rating = 1800
@@ -825,9 +687,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.newRating)
                     max_rating = max(max_rating, rating.newRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            ylim = (min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.rating_graph, _rating_series(resp), labels,
+                                   _ranks_for_resource(resource), ylim)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Rating graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -872,7 +736,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if resource=='codeforces.com':
             handles = args or ('!' + str(inter.author),)
             handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-            resp = [await cf.user.rating(handle=handle) for handle in handles]
+            resp = await asyncio.gather(*(cf.user.rating(handle=handle) for handle in handles))
             if not any(resp):
                 handles_str = ', '.join(f'`{handle}`' for handle in handles)
                 if len(handles) == 1:
@@ -897,7 +761,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                     resp.append(data[key])
             else:
                 handles = []
-                account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+                account_id = await cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
                 if account_id!=None:
                     resp = [await clist.fetch_rating_changes([account_id],  resource=='atcoder.jp')]
                     handles.append(inter.author.display_name)
@@ -918,12 +782,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 message = f'None of the given users {handles_str} are rated'
             raise ActivitiesCogError(message)
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_perf(resp, resource=resource)
-        labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        labels = [f'{handle} ({rating})' for handle, rating in zip(handles, current_ratings)]
 
+        ylim = None
         if not zoom:
             min_rating = 1100
             max_rating = 1800
@@ -931,9 +792,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.oldRating)
                     max_rating = max(max_rating, rating.oldRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            ylim = (min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.rating_graph, _perf_series(resp), labels,
+                                   _ranks_for_resource(resource), ylim)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Performance graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -970,21 +833,22 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         contest_ids = [change.contestId for change in ratingchanges]
         subs_by_contest_id = {contest_id: [] for contest_id in contest_ids}
-        for sub in await cf.user.status(handle=handle):
+        for sub in await cf_common.cache2.submission_cache.get_submissions(handle):
             if sub.contestId in subs_by_contest_id:
                 subs_by_contest_id[sub.contestId].append(sub)
 
         packed_contest_subs_problemset = [
             (cf_common.cache2.contest_cache.get_contest(contest_id),
-             cf_common.cache2.problemset_cache.get_problemset(contest_id),
+             await cf_common.cache2.problemset_cache.get_problemset(contest_id),
              subs_by_contest_id[contest_id])
             for contest_id in contest_ids
         ]
 
         rating = max(ratingchanges, key=lambda change: change.ratingUpdateTimeSeconds).newRating
-        _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolved, legend)
-
-        discord_file = gc.get_current_figure_as_file()
+        regular, fullsolves, nosolves = _extreme_points(packed_contest_subs_problemset)
+        png = await compute.submit(plot_jobs.extremes, handle, rating, regular, fullsolves,
+                                   nosolves, solved, unsolved, legend, cf.RATED_RANKS)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Codeforces extremes graph')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1016,15 +880,13 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await asyncio.gather(*(cf_common.cache2.submission_cache.get_submissions(handle)
+                                      for handle in handles))
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Problem rating')
-        plt.ylabel('Number solved')
         if len(handles) == 1:
             # Display solved problem separately by type for a single user.
             handle, solved_by_type = handles[0], _classify_submissions(all_solved_subs[0])
@@ -1037,23 +899,22 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             step = 100
             # shift the range to center the text
             hist_bins = list(range(filt.rlo - step // 2, filt.rhi + step // 2 + 1, step))
-            plt.hist(all_ratings, stacked=True, bins=hist_bins, label=labels)
             total = sum(map(len, all_ratings))
-            plt.legend(title=f'{handle}: {total}', title_fontsize=plt.rcParams['legend.fontsize'],
-                       loc='upper right')
+            legend_title = f'{handle}: {total}'
 
         else:
             all_ratings = [[sub.problem.rating for sub in solved_subs]
                            for solved_subs in all_solved_subs]
-            labels = [gc.StrWrap(f'{handle}: {len(ratings)}')
+            labels = [f'{handle}: {len(ratings)}'
                       for handle, ratings in zip(handles, all_ratings)]
 
             step = 200 if filt.rhi - filt.rlo > 3000 // len(handles) else 100
             hist_bins = list(range(filt.rlo - step // 2, filt.rhi + step // 2 + 1, step))
-            plt.hist(all_ratings, bins=hist_bins)
-            plt.legend(labels, loc='upper right')
+            legend_title = None
 
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.solved_ratings, all_ratings, labels, hist_bins,
+                                   legend_title)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Histogram of problems solved on Codeforces')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1092,67 +953,34 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         if phase_days < 1:
             raise ActivitiesCogError('Invalid parameters')
-        phase_time = dt.timedelta(days=phase_days)
 
         handles = handles or ['!' + str(inter.author)]
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await asyncio.gather(*(cf_common.cache2.submission_cache.get_submissions(handle)
+                                      for handle in handles))
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Time')
-        plt.ylabel('Number solved')
         if len(handles) == 1:
             handle, solved_by_type = handles[0], _classify_submissions(all_solved_subs[0])
-            all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_by_type[sub_type]]
+            all_times = [[sub.creationTimeSeconds for sub in solved_by_type[sub_type]]
                          for sub_type in filt.types]
 
             nice_names = nice_sub_type(filt.types)
             labels = [name.format(len(times)) for name, times in zip(nice_names, all_times)]
-
-            dlo = min(itertools.chain.from_iterable(all_times)).date()
-            dhi = min(dt.datetime.today() + dt.timedelta(days=1), dt.datetime.fromtimestamp(filt.dhi)).date()
-            phase_cnt = math.ceil((dhi - dlo) / phase_time)
-            plt.hist(
-                all_times,
-                stacked=True,
-                label=labels,
-                range=(dhi - phase_cnt * phase_time, dhi),
-                bins=min(40, phase_cnt))
-
             total = sum(map(len, all_times))
-            plt.legend(title=f'{handle}: {total}', title_fontsize=plt.rcParams['legend.fontsize'])
+            legend_title = f'{handle}: {total}'
         else:
-            all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_subs]
+            all_times = [[sub.creationTimeSeconds for sub in solved_subs]
                          for solved_subs in all_solved_subs]
+            labels = [f'{handle}: {len(times)}' for handle, times in zip(handles, all_times)]
+            legend_title = None
 
-            # NOTE: matplotlib ignores labels that begin with _
-            # https://matplotlib.org/api/pyplot_api.html#matplotlib.pyplot.legend
-            # Add zero-width space to work around this
-            labels = [gc.StrWrap(f'{handle}: {len(times)}')
-                      for handle, times in zip(handles, all_times)]
-
-            dlo = min(itertools.chain.from_iterable(all_times)).date()
-            dhi = min(dt.datetime.today() + dt.timedelta(days=1), dt.datetime.fromtimestamp(filt.dhi)).date()
-            phase_cnt = math.ceil((dhi - dlo) / phase_time)
-            plt.hist(
-                all_times,
-                range=(dhi - phase_cnt * phase_time, dhi),
-                bins=min(40 // len(handles), phase_cnt))
-            plt.legend(labels)
-
-        # NOTE: In case of nested list, matplotlib decides type using 1st sublist,
-        # it assumes float when 1st sublist is empty.
-        # Hence explicitly assigning locator and formatter is must here.
-        locator = mdates.AutoDateLocator()
-        plt.gca().xaxis.set_major_locator(locator)
-        plt.gca().xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
-
-        plt.gcf().autofmt_xdate()
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.solved_over_time, all_times, labels, phase_days,
+                                   filt.dhi, legend_title)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Histogram of number of solved problems over time')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1183,30 +1011,20 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await asyncio.gather(*(cf_common.cache2.submission_cache.get_submissions(handle)
+                                      for handle in handles))
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Time')
-        plt.ylabel('Cumulative solve count')
-
-        all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_subs]
+        all_times = [[sub.creationTimeSeconds for sub in solved_subs]
                      for solved_subs in all_solved_subs]
-        for times in all_times:
-            cumulative_solve_count = list(range(1, len(times)+1)) + [len(times)]
-            timestretched = times + [min(dt.datetime.now(), dt.datetime.fromtimestamp(filt.dhi))]
-            plt.plot(timestretched, cumulative_solve_count)
-
-        labels = [gc.StrWrap(f'{handle}: {len(times)}')
-                  for handle, times in zip(handles, all_times)]
+        labels = [f'{handle}: {len(times)}' for handle, times in zip(handles, all_times)]
+        end = min(time.time(), filt.dhi)
 
-        plt.legend(labels)
-
-        plt.gcf().autofmt_xdate()
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.solve_count_curve, all_times, labels, end)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Curve of number of solved problems over time')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1256,11 +1074,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         handle, = await cf_common.resolve_handles(inter, self.member_converter, (handle,))
         rating_resp = [await cf.user.rating(handle=handle)]
         rating_resp = [filt.filter_rating_changes(rating_changes) for rating_changes in rating_resp]
-        submissions = filt.filter_subs(await cf.user.status(handle=handle))
+        submissions = filt.filter_subs(await cf_common.cache2.submission_cache.get_submissions(handle))
 
         def extract_time_and_rating(submissions):
-            return [(dt.datetime.fromtimestamp(sub.creationTimeSeconds), sub.problem.rating)
-                    for sub in submissions]
+            return [(sub.creationTimeSeconds, sub.problem.rating) for sub in submissions]
 
         if not any(submissions):
             raise ActivitiesCogError(f'No submissions for user `{handle}`')
@@ -1271,25 +1088,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         practice = extract_time_and_rating(solved_by_type['PRACTICE'])
         virtual = extract_time_and_rating(solved_by_type['VIRTUAL'])
 
-        plt.clf()
-        _plot_scatter(regular, practice, virtual, point_size)
-        labels = []
-        if practice:
-            labels.append('Practice')
-        if regular:
-            labels.append('Regular')
-        if virtual:
-            labels.append('Virtual')
-        if legend:
-            plt.legend(labels, loc='upper left')
-        _plot_average(practice, bin_size)
-        _plot_rating(rating_resp, mark='')
-
-        # zoom
-        ymin, ymax = plt.gca().get_ylim()
-        plt.ylim(max(ymin, filt.rlo - 100), min(ymax, filt.rhi + 100))
-
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.solved_scatter, regular, practice, virtual,
+                                   _rating_series(rating_resp), cf.RATED_RANKS, point_size,
+                                   bin_size, legend, (filt.rlo, filt.rhi))
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title=f'Rating vs solved problem rating for {handle}')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1300,7 +1102,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         """Plots rating distribution of users in this server"""
         await inter.response.defer()
 
-        res = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+        res = await cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
         ratings = [cf_user.rating for user_id, cf_user in res
                    if cf_user.rating is not None]
 
@@ -1338,17 +1140,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         colors = colors[l:r+1]
         height = height[l:r+1]
 
-        plt.clf()
-        fig = plt.figure(figsize=(15, 5))
-
-        plt.xticks(rotation=45)
-        plt.xlim(l * binsize - binsize//2, r * binsize + binsize//2)
-        plt.bar(x, height, binsize*0.9, color=colors, linewidth=0, tick_label=label, log=False)
-        plt.xlabel('Rating')
-        plt.ylabel('Number of users')
-
-        discord_file = gc.get_current_figure_as_file()
-        plt.close(fig)
+        png = await compute.submit(plot_jobs.rating_distribution, x, height, binsize*0.9, colors,
+                                   label, (l * binsize - binsize//2, r * binsize + binsize//2))
+        discord_file = gc.png_as_file(png)
 
         embed = discord_common.cf_color_embed(title=title)
         discord_common.attach_image(embed, discord_file)
@@ -1369,18 +1163,12 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         # shift the [-300, 500] gitgud range to center the text
         hist_bins = list(range(-300 - 50, 500 + 50 + 1, 100))
-        deltas = [[x[0] for x in cf_common.user_db.howgud(member.id)] for member in member]
-        labels = [gc.StrWrap(f'{member.display_name}: {len(delta)}')
+        deltas = [[x[0] for x in await cf_common.user_db.howgud(member.id)] for member in member]
+        labels = [f'{member.display_name}: {len(delta)}'
                   for member, delta in zip(member, deltas)]
 
-        plt.clf()
-        plt.margins(x=0)
-        plt.hist(deltas, bins=hist_bins, rwidth=1)
-        plt.xlabel('Problem delta')
-        plt.ylabel('Number solved')
-        plt.legend(labels, prop=gc.fontprop)
-
-        discord_file = gc.get_current_figure_as_file()
+        png = await compute.submit(plot_jobs.gitgud_deltas, deltas, labels, hist_bins)
+        discord_file = gc.png_as_file(png)
         embed = discord_common.cf_color_embed(title='Histogram of gudgitting')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1403,31 +1191,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if len(countries) > 8:
             raise ActivitiesCogError(f'At most 8 countries may be specified.')
 
-        users = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+        users = await cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
         counter = collections.Counter(user.country for _, user in users if user.country)
 
         if not countries:
             # list because seaborn complains for tuple.
             countries, counts = map(list, zip(*counter.most_common()))
-            plt.clf()
-            fig = plt.figure(figsize=(15, 5))
-            with sns.axes_style(rc={'xtick.bottom': True}):
-                sns.barplot(x=countries, y=counts)
-
-            # Show counts on top of bars.
-            ax = plt.gca()
-            for p in ax.patches:
-                x = p.get_x() + p.get_width() / 2
-                y = p.get_y() + p.get_height() + 0.5
-                ax.text(x, y, int(p.get_height()), horizontalalignment='center', color='#30304f',
-                        fontsize='x-small')
-
-            plt.xticks(rotation=40, horizontalalignment='right')
-            ax.tick_params(axis='x', length=4, color=ax.spines['bottom'].get_edgecolor())
-            plt.xlabel('Country')
-            plt.ylabel('Number of members')
-            discord_file = gc.get_current_figure_as_file()
-            plt.close(fig)
+            png = await compute.submit(plot_jobs.country_counts, countries, counts)
+            discord_file = gc.png_as_file(png)
             embed = discord_common.cf_color_embed(title='Distribution of server members by country')
         else:
             countries = [country.title() for country in countries]
@@ -1437,25 +1208,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 raise ActivitiesCogError('No rated members from the specified countries are present.')
 
             color_map = {rating: f'#{cf.rating2rank(rating).color_embed:06x}' for _, rating in data}
-            df = pd.DataFrame(data, columns=['Country', 'Rating'])
             column_order = sorted((country for country in countries if counter[country]),
                                   key=counter.get, reverse=True)
-            plt.clf()
-            if len(column_order) <= 5:
-                sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df, order=column_order,
-                              palette=color_map)
-            else:
-                # Add ticks and rotate tick labels to avoid overlap.
-                with sns.axes_style(rc={'xtick.bottom': True}):
-                    sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df,
-                                  order=column_order, palette=color_map)
-                plt.xticks(rotation=30, horizontalalignment='right')
-                ax = plt.gca()
-                ax.tick_params(axis='x', color=ax.spines['bottom'].get_edgecolor())
-            plt.legend().remove()
-            plt.xlabel('Country')
-            plt.ylabel('Rating')
-            discord_file = gc.get_current_figure_as_file()
+            png = await compute.submit(plot_jobs.country_ratings, data, column_order, color_map)
+            discord_file = gc.png_as_file(png)
             embed = discord_common.cf_color_embed(title='Rating distribution of server members by '
                                                         'country')
 
@@ -1487,10 +1243,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         (in_server, zoom), handles = cf_common.filter_flags(args, ['+server', '+zoom'])
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles, mincnt=0, maxcnt=20)
 
-        rating_changes = await cf.contest.ratingChanges(contest_id=contest_id)
+        # Saved rating changes make downloading them again unnecessary.
+        rating_changes = await cf_common.cache2.rating_changes_cache.get_rating_changes_for_contest(
+            contest_id)
+        if not rating_changes:
+            rating_changes = await cf.contest.ratingChanges(contest_id=contest_id)
         if in_server:
             guild_handles = set(handle for discord_id, handle
-                                in cf_common.user_db.get_handles_for_guild(inter.guild.id))
+                                in await cf_common.user_db.get_handles_for_guild(inter.guild.id))
             rating_changes = [rating_change for rating_change in rating_changes
                               if rating_change.handle in guild_handles or rating_change.handle in handles]
 
@@ -1535,32 +1295,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         title = rating_changes[0].contestName
 
-        plt.clf()
-        fig = plt.figure(figsize=(12, 8))
-        plt.title(title)
-        plt.xlabel('Rank')
-        plt.ylabel('Rating Changes')
-
-        mark_size = 2e4 / len(ranks)
-        plt.xlim(xmin - xmargin, xmax + xmargin)
-        plt.ylim(ymin - ymargin, ymax + ymargin)
-        plt.scatter(ranks, delta, s=mark_size, c=color)
-
-        for handle, point in users_to_mark.items():
-            plt.annotate(handle,
-                         xy=point,
-                         xytext=(0, 0),
-                         textcoords='offset points',
-                         ha='left',
-                         va='bottom',
-                         fontsize='large')
-            plt.plot(*point,
-                     marker='o',
-                     markersize=5,
-                     color='black')
-
-        discord_file = gc.get_current_figure_as_file()
-        plt.close(fig)
+        png = await compute.submit(plot_jobs.rating_changes_by_rank, title,
+                                   (xmin - xmargin, xmax + xmargin),
+                                   (ymin - ymargin, ymax + ymargin), ranks, delta, color,
+                                   users_to_mark)
+        discord_file = gc.png_as_file(png)
 
         embed = discord_common.cf_color_embed(title=title)
         discord_common.attach_image(embed, discord_file)
@@ -1917,7 +1656,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         handles = tuple(handles.split())
 
         resource = 'codeforces.com'
-        timezone = cf_common.user_db.get_guildtz(inter.guild.id)
+        timezone = await cf_common.user_db.get_guildtz(inter.guild.id)
         timezone = pytz.timezone(timezone or 'Asia/Kolkata')
         for pattern in _PATTERNS:
             if pattern in contest_id:
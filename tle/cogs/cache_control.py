@@ -7,6 +7,7 @@ from disnake.ext import commands
 
 from tle import constants
 from tle.util import codeforces_common as cf_common
+from tle.util import cache_system2
 
 def timed_command(coro):
     @functools.wraps(coro)
@@ -56,6 +57,43 @@ class CacheControl(commands.Cog):
         count = await cf_common.cache2.rating_changes_cache.fetch_contest(contest_id)
         await inter.edit_original_message(f'Done, fetched {count} changes and recached handle ratings')
 
+    @cache.sub_command(description='Backfill rating changes in the background')
+    @commands.is_owner()
+    async def backfill(self, inter, mode: str = commands.Param(choices=['missing', 'all'],
+                                                               default='missing')):
+        """
+        Mode 'missing' fetches rating changes for finished contests that have none cached.
+        Mode 'all' clears all existing cached changes first.
+        """
+        await inter.response.defer()
+        try:
+            backfill = await cf_common.cache2.rating_changes_cache.start_backfill(
+                refetch_all=mode == 'all')
+        except cache_system2.BackfillAlreadyRunning as e:
+            return await inter.edit_original_message(str(e))
+        await inter.edit_original_message(f'Started backfill of rating changes for '
+                                          f'{backfill.total} contests, '
+                                          f'see `/cache backfillstatus` for progress')
+
+    @cache.sub_command(description='Show progress of the rating changes backfill')
+    @commands.is_owner()
+    async def backfillstatus(self, inter):
+        await inter.response.defer()
+        backfill = cf_common.cache2.rating_changes_cache.backfill
+        if backfill is None:
+            return await inter.edit_original_message('No backfill has run since startup')
+        state = 'Running' if backfill.running else 'Finished'
+        eta = backfill.eta()
+        lines = [
+            f'{state}: {backfill.done}/{backfill.total} contests done, {backfill.failed} failed',
+            f'{backfill.changes} rating changes saved',
+            f'Elapsed {backfill.elapsed():.0f}s, '
+            f'{backfill.contests_per_second() * 60:.1f} contests/min',
+        ]
+        if backfill.running and eta is not None:
+            lines.append(f'ETA {eta:.0f}s')
+        await inter.edit_original_message('\n'.join(lines))
+
     @cache.sub_command(description='Reload problemsets cache')
     @commands.is_owner()
     async def problemsets(self, inter, contest_id: int = None):
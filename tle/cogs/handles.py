@@ -28,6 +28,7 @@ from tle.util import paginator
 from tle.util import table
 from tle.util import tasks
 from tle.util import db
+from tle.util import role_sync
 from tle.util import scaper
 from tle import constants
 
@@ -343,6 +344,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.font = ImageFont.truetype(constants.NOTO_SANS_CJK_BOLD_FONT_PATH, size=26) # font for ;handle pretty
         self.converter = commands.MemberConverter()
+        self.rank_role_sync = role_sync.RankRoleSync()
 
     @commands.Cog.listener()
     @discord_common.once
@@ -373,10 +375,10 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         # To set users inactive in case the bot was dead when they left.
         to_set_inactive = []
         for guild in self.bot.guilds:
-            user_id_handle_pairs = cf_common.user_db.get_handles_for_guild(guild.id)
+            user_id_handle_pairs = await cf_common.user_db.get_handles_for_guild(guild.id)
             to_set_inactive += [(guild.id, user_id) for user_id, _ in user_id_handle_pairs
                                 if guild.get_member(user_id) is None]
-        cf_common.user_db.set_inactive(to_set_inactive)
+        await cf_common.user_db.set_inactive(to_set_inactive)
 
     @events.listener_spec(name='RatingChangesListener',
                           event_cls=events.RatingChangesUpdate,
@@ -385,17 +387,16 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         contest, changes = event.contest, event.rating_changes
         change_by_handle = {change.handle: change for change in changes}
 
-        async def update_for_guild(guild):
-            with contextlib.suppress(HandleCogError):
-                await self._update_ranks_all(guild)
-            channel_id = cf_common.user_db.get_rankup_channel(guild.id)
+        async def publish_for_guild(guild):
+            channel_id = await cf_common.user_db.get_rankup_channel(guild.id)
             channel = guild.get_channel(channel_id)
             if channel is not None:
                 with contextlib.suppress(HandleCogError):
-                    embeds = self._make_rankup_embeds(guild, contest, change_by_handle)
+                    embeds = await self._make_rankup_embeds(guild, contest, change_by_handle)
                     await channel.send(embeds = embeds)
 
-        await asyncio.gather(*(update_for_guild(guild) for guild in self.bot.guilds),
+        sync = self.rank_role_sync.sync(self.bot.guilds, reason='Codeforces rank update')
+        await asyncio.gather(sync, *(publish_for_guild(guild) for guild in self.bot.guilds),
                              return_exceptions=True)
         self.logger.info(f'All guilds updated for contest {contest.id}.')
 
@@ -421,18 +422,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
 
     @staticmethod
     async def update_member_rank_role(member, role_to_assign, *, reason):
-        """Sets the `member` to only have the rank role of `role_to_assign`. All other rank roles
-        on the member, if any, will be removed. If `role_to_assign` is None all existing rank roles
-        on the member will be removed.
-        """
-        role_names_to_remove = {rank.title for rank in cf.RATED_RANKS}
-        if role_to_assign is not None:
-            role_names_to_remove.discard(role_to_assign.name)
-        to_remove = [role for role in member.roles if role.name in role_names_to_remove]
-        if to_remove:
-            await member.remove_roles(*to_remove, reason=reason)
-        if role_to_assign is not None and role_to_assign not in member.roles:
-            await member.add_roles(role_to_assign, reason=reason)
+        await role_sync.set_rank_role(member, role_to_assign, reason=reason)
 
     @handle.sub_command(description='Set handle of a user')
     async def set(self, inter, member: disnake.Member, handle: str, resource: _CP_PLATFORMS = "codeforces.com"):
@@ -467,7 +457,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
     async def _set_account_id(self, member, inter, user):
         guild_id = inter.guild.id
         try:
-            cf_common.user_db.set_account_id(member.id, guild_id, user['id'], user['resource'], user['handle'])
+            await cf_common.user_db.set_account_id(member.id, guild_id, user['id'], user['resource'], user['handle'])
         except db.UniqueConstraintFailed:
             raise HandleCogError(f'The handle `{user["handle"]}` is already associated with another user.')
 
@@ -485,10 +475,10 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
     async def _set(self, inter, member, user):
         handle = user.handle
         try:
-            cf_common.user_db.set_handle(member.id, inter.guild.id, handle)
+            await cf_common.user_db.set_handle(member.id, inter.guild.id, handle)
         except db.UniqueConstraintFailed:
             raise HandleCogError(f'The handle `{handle}` is already associated with another user.')
-        cf_common.user_db.cache_cf_user(user)
+        await cf_common.user_db.cache_cf_user(user)
 
         roles = [role for role in inter.guild.roles if role.name == user.rank.title]
         if not roles: return
@@ -557,12 +547,12 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
                 await inter.send(f'Sorry {invoker}, can you try again?')
 
     async def _get(self, inter, member):
-        handle = cf_common.user_db.get_handle(member.id, inter.guild.id)
-        handles = cf_common.user_db.get_account_id_by_user(member.id, inter.guild.id)
+        handle = await cf_common.user_db.get_handle(member.id, inter.guild.id)
+        handles = await cf_common.user_db.get_account_id_by_user(member.id, inter.guild.id)
         if not handle and handles is None:
             raise HandleCogError(f'Handle for `{member}` not found in database')
-        user = cf_common.user_db.fetch_cf_user(handle) if handle else None
-        handles = cf_common.user_db.get_account_id_by_user(member.id, inter.guild.id)
+        user = await cf_common.user_db.fetch_cf_user(handle) if handle else None
+        handles = await cf_common.user_db.get_account_id_by_user(member.id, inter.guild.id)
         embed = _make_profile_embed(member, user,handles=handles)
         await inter.send(embed = embed)
 
@@ -590,16 +580,16 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         """
         await inter.response.defer()
 
-        user_id = cf_common.user_db.get_user_id(handle, inter.guild.id)
+        user_id = await cf_common.user_db.get_user_id(handle, inter.guild.id)
         if not user_id: return await inter.edit_original_message(
             f'Discord username for `{handle}` not found in database')
-        user = cf_common.user_db.fetch_cf_user(handle)
+        user = await cf_common.user_db.fetch_cf_user(handle)
         member = inter.guild.get_member(user_id)
         embed = _make_profile_embed(member, user)
         await inter.edit_original_message(embed=embed)
 
     async def _remove(self, member:disnake.Member):
-        rc = cf_common.user_db.remove_handle(member.id, member.guild.id)
+        rc = await cf_common.user_db.remove_handle(member.id, member.guild.id)
         if not rc:
             raise HandleCogError(f'Handle for `{member}` not found in database')
             
@@ -650,7 +640,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         await inter.response.defer()
 
         member = inter.author
-        handle = cf_common.user_db.get_handle(member.id, inter.guild.id)
+        handle = await cf_common.user_db.get_handle(member.id, inter.guild.id)
         if handle == None:
             return await inter.edit_original_message(f'{member.mention}, your CF handle is not already set.')
         await self._unmagic_handles(inter, [handle], {handle: member})
@@ -665,7 +655,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
 
         await inter.response.defer()
 
-        user_id_and_handles = cf_common.user_db.get_handles_for_guild(inter.guild.id)
+        user_id_and_handles = await cf_common.user_db.get_handles_for_guild(inter.guild.id)
 
         handles = []
         rev_lookup = {}
@@ -714,7 +704,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         """
         await inter.response.defer()
 
-        res = cf_common.user_db.get_gudgitters()
+        res = await cf_common.user_db.get_gudgitters()
         res.sort(key=lambda r: r[1], reverse=True)
 
         rankings = []
@@ -724,8 +714,8 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
             if member is None:
                 continue
             if score > 0:
-                handle = cf_common.user_db.get_handle(user_id, inter.guild.id)
-                user = cf_common.user_db.fetch_cf_user(handle)
+                handle = await cf_common.user_db.get_handle(user_id, inter.guild.id)
+                user = await cf_common.user_db.fetch_cf_user(handle)
                 if user is None:
                     continue
                 discord_handle = member.display_name
@@ -761,7 +751,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
 
         users = None
         if resource == 'codeforces.com':
-            res = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+            res = await cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
             users = [
                 (inter.guild.get_member(user_id), cf_user.handle, cf_user.rating)
                 for user_id, cf_user in res
@@ -771,7 +761,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         else:
             if not countries: return await inter.edit_original_message(
                 "Countries can currently only be specified for CodeForces users.")
-            account_ids = cf_common.user_db.get_account_ids_for_resource(inter.guild.id ,resource)
+            account_ids = await cf_common.user_db.get_account_ids_for_resource(inter.guild.id ,resource)
             members = {}
             ids = []
             for user_id, account_id, handle in account_ids:
@@ -819,7 +809,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         author_idx = None
         if resource!='codeforces.com':
             id_to_member = dict()
-            account_ids = cf_common.user_db.get_account_ids_for_resource(inter.guild.id ,resource)
+            account_ids = await cf_common.user_db.get_account_ids_for_resource(inter.guild.id ,resource)
             ids = []
             for user_id, account_id, handle in account_ids:
                 ids.append(account_id)
@@ -834,7 +824,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
                 if member == inter.author: author_idx = idx
                 rows.append((idx, member.display_name, user['handle'], user['rating']))
         else:
-            user_id_cf_user_pairs = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+            user_id_cf_user_pairs = await cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
             user_id_cf_user_pairs.sort(key=lambda p: p[1].rating if p[1].rating is not None else -1,
                                     reverse=True)
             for user_id, cf_user in user_id_cf_user_pairs:
@@ -876,11 +866,18 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         """For each member in the guild, fetches their current ratings and updates their role if
         required.
         """
-        res = cf_common.user_db.get_handles_for_guild(guild.id)
-        await self._update_ranks(guild, res)
+        result = (await self.rank_role_sync.sync([guild], reason='Codeforces rank update'))[guild.id]
+        if not result.has_handles:
+            raise HandleCogError('Handles not set for any user')
+        if result.missing_roles:
+            roles_str = ', '.join(f'`{role}`' for role in result.missing_roles)
+            plural = 's' if len(result.missing_roles) > 1 else ''
+            raise HandleCogError(f'Role{plural} for rank{plural} {roles_str} not present in the server.')
+        if result.forbidden:
+            raise HandleCogError(f'Cannot update roles for some members: Missing permission.')
     
     async def _update_stars_all(self, guild):
-        res = cf_common.user_db.get_account_ids_for_resource(guild.id, "codechef.com")
+        res = await cf_common.user_db.get_account_ids_for_resource(guild.id, "codechef.com")
         await self._update_stars(guild, res)    
 
     async def _update_stars(self, guild, res):
@@ -908,38 +905,12 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
                     ok = False
         if not ok: raise HandleCogError(f'Cannot update roles for some members: Missing permission.')
 
-    async def _update_ranks(self, guild, res):
-        member_handles = [(guild.get_member(user_id), handle) for user_id, handle in res]
-        member_handles = [(member, handle) for member, handle in member_handles if member is not None]
-        if not member_handles:
-            raise HandleCogError('Handles not set for any user')
-        members, handles = zip(*member_handles)
-        users = await cf.user.info(handles=handles)
-        for user in users:
-            cf_common.user_db.cache_cf_user(user)
-        required_roles = {user.rank.title for user in users if user.rank != cf.UNRATED_RANK}
-        rank2role = {role.name: role for role in guild.roles if role.name in required_roles}
-        missing_roles = required_roles - rank2role.keys()
-        if missing_roles:
-            roles_str = ', '.join(f'`{role}`' for role in missing_roles)
-            plural = 's' if len(missing_roles) > 1 else ''
-            raise HandleCogError(f'Role{plural} for rank{plural} {roles_str} not present in the server.')
-
-        ok = True
-        for member, user in zip(members, users):
-            role_to_assign = None if user.rank == cf.UNRATED_RANK else rank2role[user.rank.title]
-            try:
-                await self.update_member_rank_role(member, role_to_assign, reason='Codeforces rank update')
-            except disnake.Forbidden:
-                ok = False
-        if not ok: raise HandleCogError(f'Cannot update roles for some members: Missing permission.')
-
     @staticmethod
-    def _make_rankup_embeds(guild, contest, change_by_handle):
+    async def _make_rankup_embeds(guild, contest, change_by_handle):
         """Make an embed containing a list of rank changes and top rating increases for the members
         of this guild.
         """
-        user_id_handle_pairs = cf_common.user_db.get_handles_for_guild(guild.id)
+        user_id_handle_pairs = await cf_common.user_db.get_handles_for_guild(guild.id)
         member_handle_pairs = [(guild.get_member(user_id), handle)
                                for user_id, handle in user_id_handle_pairs]
 
@@ -962,7 +933,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         for member, change in member_change_pairs:
             cache = cf_common.cache2.rating_changes_cache
             if (change.oldRating == 1500
-                    and len(cache.get_rating_changes_for_handle(change.handle)) == 1):
+                    and len(await cache.get_rating_changes_for_handle(change.handle)) == 1):
                 # If this is the user's first rated contest.
                 old_role = 'Unrated'
             else:
@@ -1053,10 +1024,10 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
         if choice == 'here':
             if inter.channel.type != disnake.ChannelType.text:
                 return await inter.edit_original_message(f'This current channel is not a text channel.')
-            cf_common.user_db.set_rankup_channel(inter.guild.id, inter.channel.id)
+            await cf_common.user_db.set_rankup_channel(inter.guild.id, inter.channel.id)
             await inter.send(embed=discord_common.embed_success(f'Auto rank update publishing enabled in this channel {inter.channel.mention}.'))
         else:
-            rc = cf_common.user_db.clear_rankup_channel(inter.guild.id)
+            rc = await cf_common.user_db.clear_rankup_channel(inter.guild.id)
             if not rc: return await inter.edit_original_message('Auto rank update publishing is already disabled.')
             await inter.send(embed=discord_common.embed_success('Auto rank update publishing disabled.'))
 
@@ -1086,7 +1057,7 @@ class Handles(commands.Cog, description = "Verify and manage your CP handles"):
                                  f'{contest.name}`.')
 
         change_by_handle = {change.handle: change for change in changes}
-        rankup_embeds = self._make_rankup_embeds(inter.guild, contest, change_by_handle)
+        rankup_embeds = await self._make_rankup_embeds(inter.guild, contest, change_by_handle)
         
         await inter.edit_original_message(embeds = rankup_embeds)
 
@@ -1,4 +1,6 @@
 import asyncio
+import contextlib
+import heapq
 import random
 import functools
 import json
@@ -82,12 +84,7 @@ def _get_embed_fields_from_contests(contests, localtimezone):
     return fields
 
 
-async def _send_reminder_at(channel, role, contests, before_secs, send_time,
-                            localtimezone: pytz.timezone):
-    delay = send_time - dt.datetime.utcnow().timestamp()
-    if delay <= 0:
-        return
-    await asyncio.sleep(delay)
+async def _send_reminder(channel, role, contests, before_secs, localtimezone: pytz.timezone):
     values = discord_common.time_format(before_secs)
 
     def make(value, label):
@@ -155,6 +152,149 @@ GuildSettings = recordtype(
         ('website_disallowed_patterns', defaultdict(list))])
 
 
+# The reminder settings of a guild that matter for scheduling, with the times before a contest
+# in seconds.
+_ReminderSettings = namedtuple('_ReminderSettings', 'channel_id role_id before_secs '
+                                                    'website_allowed_patterns website_disallowed_patterns')
+
+
+def _parse_reminder_settings(settings):
+    if settings is None or any(setting is None for setting in settings):
+        return None
+    channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
+    return _ReminderSettings(int(channel_id), int(role_id),
+                             [60 * before_mins for before_mins in json.loads(before)],
+                             defaultdict(list, json.loads(website_allowed_patterns)),
+                             defaultdict(list, json.loads(website_disallowed_patterns)))
+
+
+def _contest_start_timestamp(contest):
+    return contest.start_time.replace(tzinfo=dt.timezone.utc).timestamp()
+
+
+class _ReminderScheduler:
+    """Sends the contest reminders of all guilds. Every reminder due is an entry
+    (fire time, guild id, start time, seconds before) in one heap, which a single dispatcher
+    coroutine sleeps on. The reminder settings of guilds are kept in memory, and entries are only
+    recomputed for a guild when its settings change and for a start time when a contest starting
+    then is added, moved or removed.
+
+    Entries are never removed from the heap. An entry which no longer applies is dropped when it
+    comes up.
+    """
+
+    def __init__(self, bot, logger):
+        self.bot = bot
+        self.logger = logger
+        self._settings_by_guild = {}
+        self._contests_by_start = {}
+        self._contest_key_by_id = {}
+        # guild id -> start time -> the contests starting then to remind the guild of
+        self._contests_by_guild = defaultdict(dict)
+        self._heap = []
+        self._queued = set()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+
+    async def start(self):
+        for guild_id, *settings in await cf_common.user_db.get_all_reminder_settings():
+            settings = _parse_reminder_settings(settings)
+            if settings is not None:
+                self._settings_by_guild[int(guild_id)] = settings
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def update_guild(self, guild_id):
+        """Reload the reminder settings of the guild and recompute its reminders."""
+        settings = _parse_reminder_settings(
+            await cf_common.user_db.get_reminder_settings(guild_id))
+        if settings is None:
+            self._settings_by_guild.pop(guild_id, None)
+            self._contests_by_guild.pop(guild_id, None)
+            return
+        self._settings_by_guild[guild_id] = settings
+        self._contests_by_guild.pop(guild_id, None)
+        self._plan_guild(guild_id, self._contests_by_start)
+
+    def update_contests(self, future_contests):
+        """Recompute the reminders of start times whose contests differ from the last update."""
+        contests_by_start = defaultdict(list)
+        contest_key_by_id = {}
+        for contest in future_contests:
+            start = _contest_start_timestamp(contest)
+            contests_by_start[start].append(contest)
+            contest_key_by_id[contest.id] = (start, contest.name, contest.duration, contest.url,
+                                             contest.website)
+
+        changed_starts = set()
+        for contest_id in contest_key_by_id.keys() | self._contest_key_by_id.keys():
+            old_key = self._contest_key_by_id.get(contest_id)
+            new_key = contest_key_by_id.get(contest_id)
+            if old_key != new_key:
+                changed_starts.update(key[0] for key in (old_key, new_key) if key is not None)
+        self._contests_by_start = contests_by_start
+        self._contest_key_by_id = contest_key_by_id
+
+        if changed_starts:
+            changed = {start: contests_by_start.get(start, []) for start in changed_starts}
+            for guild_id in self._settings_by_guild:
+                self._plan_guild(guild_id, changed)
+
+    def _plan_guild(self, guild_id, contests_by_start):
+        settings = self._settings_by_guild[guild_id]
+        planned = self._contests_by_guild[guild_id]
+        now = time.time()
+        for start, contests in contests_by_start.items():
+            contests = [contest for contest in contests if contest.is_desired(
+                settings.website_allowed_patterns, settings.website_disallowed_patterns)]
+            if not contests:
+                planned.pop(start, None)
+                continue
+            planned[start] = contests
+            for before_secs in settings.before_secs:
+                fire_time = start - before_secs
+                entry = (fire_time, guild_id, start, before_secs)
+                if fire_time > now and entry not in self._queued:
+                    self._queued.add(entry)
+                    heapq.heappush(self._heap, entry)
+                    if self._heap[0] is entry:
+                        self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - time.time()
+                if timeout <= 0:
+                    entry = heapq.heappop(self._heap)
+                    self._queued.discard(entry)
+                    self._fire(*entry)
+                    continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+    def _fire(self, fire_time, guild_id, start, before_secs):
+        settings = self._settings_by_guild.get(guild_id)
+        contests = self._contests_by_guild.get(guild_id, {}).get(start)
+        if settings is None or not contests or before_secs not in settings.before_secs:
+            return
+        asyncio.create_task(self._send(guild_id, settings, contests, before_secs))
+
+    async def _send(self, guild_id, settings, contests, before_secs):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        channel, role = guild.get_channel(settings.channel_id), guild.get_role(settings.role_id)
+        if channel is None or role is None:
+            return
+        localtimezone = await cf_common.user_db.get_guildtz(guild_id)
+        localtimezone = pytz.timezone(localtimezone or 'Asia/Kolkata')
+        try:
+            await _send_reminder(channel, role, contests, before_secs, localtimezone)
+        except disnake.HTTPException as e:
+            self.logger.warning(f'Sending reminder in guild {guild_id} failed: {e!r}')
+
+
 def get_default_guild_settings():
     allowed_patterns = copy.deepcopy(_WEBSITE_ALLOWED_PATTERNS)
     disallowed_patterns = copy.deepcopy(_WEBSITE_DISALLOWED_PATTERNS)
@@ -171,22 +311,35 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         self.contest_cache = None
         self.active_contests = None
         self.finished_contests = None
-        self.start_time_map = defaultdict(list)
-        self.task_map = defaultdict(list)
 
         self.member_converter = commands.MemberConverter()
         self.role_converter = commands.RoleConverter()
 
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.scheduler = _ReminderScheduler(bot, self.logger)
 
     @commands.Cog.listener()
     @discord_common.once
     async def on_ready(self):
-        asyncio.create_task(self._update_task())
+        asyncio.create_task(self._start())
+
+    async def _start(self):
+        await cf_common.wait_for_initialize()
+        await self.scheduler.start()
+        await self._update_task()
 
     async def _update_task(self):
         self.logger.info(f'Updating reminder tasks.')
-        self._generate_contest_cache()
+        try:
+            await self._update_contests()
+        except (clist.ClistApiError, OSError, ValueError, KeyError) as e:
+            # Tried again next time, the contests of the last successful update are kept.
+            self.logger.warning(f'Updating contests failed: {e!r}')
+        await asyncio.sleep(_CONTEST_REFRESH_PERIOD)
+        asyncio.create_task(self._update_task())
+
+    async def _update_contests(self):
+        await self._generate_contest_cache()
         contest_cache = self.contest_cache
         current_time = dt.datetime.utcnow()
 
@@ -211,15 +364,10 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         self.future_contests.sort(key=lambda contest: contest.start_time)
         # Keep most recent _FINISHED_LIMIT
         self.finished_contests = self.finished_contests[:_FINISHED_CONTESTS_LIMIT]
-        self.start_time_map.clear()
-        for contest in self.future_contests:
-            self.start_time_map[time.mktime(contest.start_time.timetuple())].append(contest)
-        self._reschedule_all_tasks()
-        await asyncio.sleep(_CONTEST_REFRESH_PERIOD)
-        asyncio.create_task(self._update_task())
+        self.scheduler.update_contests(self.future_contests)
 
-    def _generate_contest_cache(self):
-        clist.cache(forced=False)
+    async def _generate_contest_cache(self):
+        await clist.cache(forced=False)
         db_file = Path(constants.CONTESTS_DB_FILE_PATH)
         with db_file.open() as f:
             data = json.load(f)
@@ -229,16 +377,6 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
                 _WEBSITE_ALLOWED_PATTERNS,
                 _WEBSITE_DISALLOWED_PATTERNS)]
 
-    def get_guild_contests(self, contests, guild_id):
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
-        if not settings: return []
-        _, _, _, website_allowed_patterns, website_disallowed_patterns = settings
-        website_allowed_patterns = json.loads(website_allowed_patterns) if settings else _WEBSITE_ALLOWED_PATTERNS
-        website_disallowed_patterns = json.loads(website_disallowed_patterns) if settings else _WEBSITE_DISALLOWED_PATTERNS
-        contests = [contest for contest in contests if contest.is_desired(
-            website_allowed_patterns, website_disallowed_patterns)]
-        return contests
-
     def get_all_contests(self, contests, guild_id, resources=None):
         website_allowed_patterns = _WEBSITE_ALLOWED_PATTERNS
         website_disallowed_patterns = _WEBSITE_DISALLOWED_PATTERNS
@@ -246,47 +384,6 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             website_allowed_patterns, website_disallowed_patterns, resources)]
         return contests
 
-    def _reschedule_all_tasks(self):
-        for guild in self.bot.guilds:
-            self._reschedule_tasks(guild.id)
-
-    def _reschedule_tasks(self, guild_id):
-        for task in self.task_map[guild_id]:
-            task.cancel()
-        self.task_map[guild_id].clear()
-        if not self.start_time_map:
-            return
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
-        if settings is None or any(setting is None for setting in settings):
-            return
-        channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
-
-        channel_id, role_id, before = int(channel_id), int(role_id), json.loads(before)
-        website_allowed_patterns = json.loads(website_allowed_patterns)
-        website_disallowed_patterns = json.loads(website_disallowed_patterns)
-
-        localtimezone = cf_common.user_db.get_guildtz(guild_id)
-        localtimezone = pytz.timezone(localtimezone or 'Asia/Kolkata')
-
-        guild = self.bot.get_guild(guild_id)
-        channel, role = guild.get_channel(channel_id), guild.get_role(role_id)
-        for start_time, contests in self.start_time_map.items():
-            contests = self.get_guild_contests(contests, guild_id)
-            if not contests:
-                continue
-            for before_mins in before:
-                before_secs = 60 * before_mins
-                task = asyncio.create_task(
-                    _send_reminder_at(
-                        channel,
-                        role,
-                        contests,
-                        before_secs,
-                        start_time -
-                        before_secs, localtimezone)
-                )
-                self.task_map[guild_id].append(task)
-
     @staticmethod
     def _make_contest_pages(contests, title, localtimezone):
         pages = []
@@ -305,7 +402,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         if len(contests) == 0:
             return await inter.edit_original_message(embed=discord_common.embed_neutral(empty_msg))
 
-        zone = cf_common.user_db.get_guildtz(inter.guild.id)
+        zone = await cf_common.user_db.get_guildtz(inter.guild.id)
         zone = pytz.timezone(zone or 'Asia/Kolkata')
 
         pages = self._make_contest_pages(contests, title, zone)
@@ -352,14 +449,14 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
         before = [before]
         _, _, _, default_allowed_patterns, default_disallowed_patterns = get_default_guild_settings()
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.set_reminder_settings(
             inter.guild.id, inter.channel.id, role.id, json.dumps(before),
                 json.dumps(default_allowed_patterns),
                 json.dumps(default_disallowed_patterns)
             )
         message = f'Contest reminder has successfully been enabled in this channel {inter.channel.mention}.\nType `/remind settings` to show current settings.'
         await inter.edit_original_message(embed=discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self.scheduler.update_guild(inter.guild.id)
 
     @remind.sub_command(description='Set contest reminder in a specified channel')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -379,51 +476,40 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
         before = [before]
         _, _, _, default_allowed_patterns, default_disallowed_patterns = get_default_guild_settings()
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.set_reminder_settings(
             inter.guild.id, channel.id, role.id, json.dumps(before),
                 json.dumps(default_allowed_patterns),
                 json.dumps(default_disallowed_patterns)
             )
         message = f'Contest reminder has successfully been enabled in channel {channel.mention}.\nType `/remind settings` to show current settings.'
         await inter.edit_original_message(embed=discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self.scheduler.update_guild(inter.guild.id)
 
-    def _set_guild_setting(
+    async def _set_guild_setting(
             self,
             guild_id,
             websites,
             allowed_patterns,
             disallowed_patterns):
-        # load settings
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
-        channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
-        channel_id, role_id, before = int(channel_id), int(role_id), json.loads(before)
-        website_allowed_patterns = json.loads(website_allowed_patterns)
-        website_disallowed_patterns = json.loads(website_disallowed_patterns)
-        # modify settings
         supported_websites, unsupported_websites = [], []
         for website in websites:
             if website not in _SUPPORTED_WEBSITES:
                 unsupported_websites.append(website)
                 continue
-            website_allowed_patterns[website] = allowed_patterns[website]
-            website_disallowed_patterns[website] = disallowed_patterns[website]
             supported_websites.append(website)
-        # save settings
-        cf_common.user_db.set_reminder_settings(
-            guild_id, channel_id, role_id, json.dumps(before),
-                json.dumps(website_allowed_patterns),
-                json.dumps(website_disallowed_patterns)
-            )
+        await cf_common.user_db.set_reminder_website_patterns(
+            guild_id,
+            {website: allowed_patterns[website] for website in supported_websites},
+            {website: disallowed_patterns[website] for website in supported_websites})
         return supported_websites, unsupported_websites
 
     async def subscribe(self, guild_id, websites):
         """Start contest reminders from websites."""
-        self._set_guild_setting(guild_id, websites, _WEBSITE_ALLOWED_PATTERNS, _WEBSITE_DISALLOWED_PATTERNS)
+        await self._set_guild_setting(guild_id, websites, _WEBSITE_ALLOWED_PATTERNS, _WEBSITE_DISALLOWED_PATTERNS)
 
     async def unsubscribe(self, guild_id, websites):
         """Stop contest reminders from websites."""
-        self._set_guild_setting(guild_id, websites, defaultdict(list), defaultdict(lambda: ['']))
+        await self._set_guild_setting(guild_id, websites, defaultdict(list), defaultdict(lambda: ['']))
 
     @remind.sub_command_group(description='Configure contest reminder settings')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -435,7 +521,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
     async def general_settings(self, inter, channel: disnake.TextChannel = None, role: disnake.Role = None, before: commands.Range[0, ...] = None):
         await inter.response.defer(ephemeral = True)
 
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral('Contest reminder hasn\'t been set.\nYou may want to set a reminder by typing `/remind here` or `/remind inchannel`.'))
 
@@ -445,20 +531,18 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         before = [before] if before else json.loads(old_before)
         if not await self._verify_reminder_settings(inter, channel, role): return
 
-        cf_common.user_db.set_reminder_settings(
-            inter.guild.id, channel.id, role.id, json.dumps(before),
-            website_allowed_patterns, website_disallowed_patterns
-        )
+        await cf_common.user_db.update_reminder_settings(
+            inter.guild.id, channel.id, role.id, json.dumps(before))
         message = f'Contest reminder has successfully been updated!\nType `/remind settings` to show new settings.'
         await inter.edit_original_message(embed = discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self.scheduler.update_guild(inter.guild.id)
 
     @config.sub_command(description='Change websites for contest reminder')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
     async def websites(self, inter):
         await inter.response.defer(ephemeral = True)
 
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral(
                 'You have to set a contest reminder for your server in advance.\n'
@@ -483,21 +567,21 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             await self.unsubscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self.subscribe(inter.guild.id, select.values)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self.scheduler.update_guild(inter.guild.id)
         select.callback = select_callback
 
         select_all = disnake.ui.Button(label = 'Select all', style = disnake.ButtonStyle.blurple)
         async def select_all_callback(_):
             await self.subscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self.scheduler.update_guild(inter.guild.id)
         select_all.callback = select_all_callback
 
         unselect_all = disnake.ui.Button(label = 'Unselect all', style = disnake.ButtonStyle.red)
         async def unselect_all_callback(_):
             await self.unsubscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self.scheduler.update_guild(inter.guild.id)
         unselect_all.callback = unselect_all_callback
 
         view = disnake.ui.View()
@@ -509,7 +593,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         await inter.edit_original_message(content = content, view = view)
 
     async def _settings(self, inter):
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral('Contest reminder hasn\'t been set.\nYou may want to set a reminder by typing `/remind here` or `/remind inchannel`.'), view = None)
         channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
@@ -552,9 +636,9 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
     async def disable(self, inter):
         await inter.response.defer()
 
-        cf_common.user_db.clear_reminder_settings(inter.guild.id)
+        await cf_common.user_db.clear_reminder_settings(inter.guild.id)
         await inter.edit_original_message(embed=discord_common.embed_success('Reminder settings cleared'))
-        self._reschedule_tasks(inter.guild.id)
+        await self.scheduler.update_guild(inter.guild.id)
 
     @commands.slash_command(description='Set the server\'s timezone', usage=' <timezone>')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -574,7 +658,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             desc += 'Examples of valid timezones:\n'
             desc += '```\n' + '\n'.join(random.sample(pytz.all_timezones, 5)) + '\n```'
             return await inter.edit_original_message(embed=discord_common.embed_alert(desc))
-        cf_common.user_db.set_guildtz(inter.guild.id, str(pytz.timezone(timezone)))
+        await cf_common.user_db.set_guildtz(inter.guild.id, str(pytz.timezone(timezone)))
         await inter.edit_original_message(embed=discord_common.embed_success(
             f'Succesfully set the server timezone to {timezone}'))
 
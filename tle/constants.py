@@ -7,9 +7,14 @@ ASSETS_DIR = os.path.join(DATA_DIR, 'assets')
 DB_DIR = os.path.join(DATA_DIR, 'db')
 MISC_DIR = os.path.join(DATA_DIR, 'misc')
 TEMP_DIR = os.path.join(DATA_DIR, 'temp')
+RANKLISTS_DIR = os.path.join(DATA_DIR, 'ranklists')
 
 USER_DB_FILE_PATH = os.path.join(DB_DIR, 'user.db')
 CACHE_DB_FILE_PATH = os.path.join(DB_DIR, 'cache.db')
+CLIST_CACHE_DB_FILE_PATH = os.path.join(DB_DIR, 'clist_cache.db')
+SUBMISSION_CACHE_DB_FILE_PATH = os.path.join(DB_DIR, 'submission_cache.db')
+RATED_LIST_HANDLES_FILE_PATH = os.path.join(DB_DIR, 'rated_list_handles.npy')
+RATED_LIST_RATINGS_FILE_PATH = os.path.join(DB_DIR, 'rated_list_ratings.npy')
 
 FONTS_DIR = os.path.join(ASSETS_DIR, 'fonts')
 
@@ -1,17 +1,23 @@
 import asyncio
+import bisect
 import logging
+import os
 import time
-from aiocache import cached
+import weakref
+import numpy as np
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from disnake.ext import commands
 
+from tle import constants
 from tle.util import codeforces_common as cf_common
 from tle.util import codeforces_api as cf
+from tle.util import compute
 from tle.util import events
 from tle.util import tasks
 from tle.util import paginator
-from tle.util.ranklist import Ranklist
+from tle.util.ranklist import Ranklist, RanklistArchive
+from tle.util.ranklist.rating_calculator import predict_rating_changes
 
 logger = logging.getLogger(__name__)
 CONTEST_BLACKLIST = {1308, 1309, 1431, 1432, 1522, 1531}
@@ -38,6 +44,8 @@ class ContestCache:
     _EXCEPTION_CONTEST_RELOAD_DELAY = 5 * 60
     _ACTIVE_CONTEST_RELOAD_DELAY = 5 * 60
     _ACTIVATE_BEFORE = 20 * 60
+    # Larger changes rebuild the contest lists instead of patching them.
+    _MAX_CHANGES_IN_PLACE = 100
 
     _RUNNING_PHASES = ('CODING', 'PENDING_SYSTEM_TEST', 'SYSTEM_TEST')
 
@@ -80,15 +88,15 @@ class ContestCache:
         except KeyError:
             raise ContestNotFound(contest_id)
 
-    def get_problemset(self, contest_id):
-        return self.cache_master.conn.get_problemset_from_contest(contest_id)
+    async def get_problemset(self, contest_id):
+        return await self.cache_master.conn.get_problemset_from_contest(contest_id)
 
     def get_contests_in_phase(self, phase):
         return self.contests_by_phase[phase]
 
     async def _try_disk(self):
         async with self.reload_lock:
-            contests = self.cache_master.conn.fetch_contests()
+            contests = await self.cache_master.conn.fetch_contests()
             if not contests:
                 self.logger.info('Contest cache on disk is empty.')
                 return
@@ -116,25 +124,29 @@ class ContestCache:
 
     async def _update(self, contests, from_api=True):
         self.logger.info(f'{len(contests)} contests fetched from {"API" if from_api else "disk"}')
-        contests.sort(key=lambda contest: (contest.startTimeSeconds, contest.id))
 
-        if from_api:
-            rc = self.cache_master.conn.cache_contests(contests)
-            self.logger.info(f'{rc} contests stored in database')
+        contest_ids = {contest.id for contest in contests}
+        added = [contest for contest in contests if contest.id not in self.contest_by_id]
+        updated = [contest for contest in contests
+                   if contest.id in self.contest_by_id and self.contest_by_id[contest.id] != contest]
+        removed = [contest for contest in self.contests if contest.id not in contest_ids]
 
-        contests_by_phase = {phase: [] for phase in cf.Contest.PHASES}
-        contests_by_phase['_RUNNING'] = []
-        contest_by_id = {}
-        for contest in contests:
-            contests_by_phase[contest.phase].append(contest)
-            contest_by_id[contest.id] = contest
-            if contest.phase in self._RUNNING_PHASES:
-                contests_by_phase['_RUNNING'].append(contest)
+        if from_api and (added or updated):
+            rc = await self.cache_master.conn.cache_contests(added + updated)
+            self.logger.info(f'{rc} new or changed contests stored in database')
+
+        if len(added) + len(updated) + len(removed) > self._MAX_CHANGES_IN_PLACE:
+            self._rebuild_indexes(contests)
+        else:
+            for contest in removed + [self.contest_by_id[contest.id] for contest in updated]:
+                self._unindex(contest)
+            for contest in added + updated:
+                self._index(contest)
 
         now = time.time()
         delay = self._NORMAL_CONTEST_RELOAD_DELAY
 
-        for contest in contests_by_phase['BEFORE']:
+        for contest in self.contests_by_phase['BEFORE']:
             at = contest.startTimeSeconds - self._ACTIVATE_BEFORE
             if at > now:
                 # Reload at _ACTIVATE_BEFORE before contest to monitor contest delays.
@@ -144,18 +156,195 @@ class ContestCache:
                 # Reload at contest start, or after _ACTIVE_CONTEST_RELOAD_DELAY, whichever comes first.
                 delay = min(contest.startTimeSeconds - now, self._ACTIVE_CONTEST_RELOAD_DELAY)
 
-        if contests_by_phase['_RUNNING']:
+        if self.contests_by_phase['_RUNNING']:
             # If any contest is running, reload at an increased rate to detect FINISHED
             delay = min(delay, self._ACTIVE_CONTEST_RELOAD_DELAY)
 
+        self.contests_last_cache = time.time()
+
+        if added or updated or removed:
+            self.logger.info(f'{len(added)} contests added, {len(updated)} changed and '
+                             f'{len(removed)} removed')
+            cf_common.event_sys.dispatch(events.ContestListChange, added=added, updated=updated,
+                                         removed=removed)
+
+        return delay
+
+    def _rebuild_indexes(self, contests):
+        contests = sorted(contests, key=_contest_sort_key)
+        contests_by_phase = {phase: [] for phase in cf.Contest.PHASES}
+        contests_by_phase['_RUNNING'] = []
+        contest_by_id = {}
+        for contest in contests:
+            contests_by_phase[contest.phase].append(contest)
+            contest_by_id[contest.id] = contest
+            if contest.phase in self._RUNNING_PHASES:
+                contests_by_phase['_RUNNING'].append(contest)
+
         self.contests = contests
         self.contests_by_phase = contests_by_phase
         self.contest_by_id = contest_by_id
-        self.contests_last_cache = time.time()
 
-        cf_common.event_sys.dispatch(events.ContestListRefresh, self.contests.copy())
+    def _phase_lists(self, contest):
+        lists = [self.contests, self.contests_by_phase[contest.phase]]
+        if contest.phase in self._RUNNING_PHASES:
+            lists.append(self.contests_by_phase['_RUNNING'])
+        return lists
 
-        return delay
+    def _index(self, contest):
+        for contests in self._phase_lists(contest):
+            contests.insert(_bisect_contests(contests, contest), contest)
+        self.contest_by_id[contest.id] = contest
+
+    def _unindex(self, contest):
+        for contests in self._phase_lists(contest):
+            del contests[_bisect_contests(contests, contest)]
+        del self.contest_by_id[contest.id]
+
+
+def _contest_sort_key(contest):
+    return contest.startTimeSeconds, contest.id
+
+
+def _bisect_contests(contests, contest):
+    """Returns the position of the contest in a list of contests sorted by `_contest_sort_key`,
+    or where it would be inserted."""
+    key = _contest_sort_key(contest)
+    lo, hi = 0, len(contests)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _contest_sort_key(contests[mid]) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class _ContestListChanges:
+    """Collects the contest list changes dispatched between runs of a task. Waiting on the event
+    directly would miss changes dispatched while the task is running, so every change is recorded
+    by a listener and the next wait returns all of them merged into one event."""
+
+    def __init__(self, name):
+        self._added = {}
+        self._updated = {}
+        self._removed = {}
+        self._changed = asyncio.Event()
+        self.listener = events.Listener(name, events.ContestListChange, self._on_change)
+
+    async def _on_change(self, event):
+        for contest in event.added:
+            self._removed.pop(contest.id, None)
+            self._added[contest.id] = contest
+        for contest in event.updated:
+            if contest.id in self._added:
+                self._added[contest.id] = contest
+            else:
+                self._updated[contest.id] = contest
+        for contest in event.removed:
+            if self._added.pop(contest.id, None) is None:
+                self._updated.pop(contest.id, None)
+                self._removed[contest.id] = contest
+        self._changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+        self._changed.clear()
+        event = events.ContestListChange(added=list(self._added.values()),
+                                         updated=list(self._updated.values()),
+                                         removed=list(self._removed.values()))
+        self._added, self._updated, self._removed = {}, {}, {}
+        return event
+
+
+def _finished_contests_to_check(contest_cache, monitored_contests, event):
+    """Returns the finished contests to check for monitoring after the contest list changed.
+    Contests that finished before were checked when they did, so only the monitored contests and
+    those in the change are returned. Without an event, i.e. when manually triggered, all finished
+    contests are returned."""
+    if event is None:
+        return list(contest_cache.contests_by_phase['FINISHED'])
+    contests = {}
+    for contest in monitored_contests + event.added + event.updated:
+        contest = contest_cache.contest_by_id.get(contest.id)
+        if contest is not None and contest.phase == 'FINISHED':
+            contests[contest.id] = contest
+    return sorted(contests.values(), key=_contest_sort_key)
+
+
+class ProblemIndex:
+    """An index over the problems of the problem cache for picking recommendations. Problems are
+    ordered by the start time of their contest and referred to by their position in that order.
+    Problems are bucketed by rating and by contest, and the tags, whether the problem is
+    nonstandard and the contest start time are computed once per problem.
+    """
+
+    def __init__(self, problems, contest_by_id):
+        start_time = {problem.contestId: contest_by_id[problem.contestId].startTimeSeconds
+                      for problem in problems}
+        self.problems = sorted(problems, key=lambda problem: start_time[problem.contestId])
+        self.start_times = [start_time[problem.contestId] for problem in self.problems]
+
+        self.position_by_name = {}
+        self.positions_by_rating = defaultdict(set)
+        self.positions_by_contest = defaultdict(set)
+        self.nonstandard_positions = set()
+        self.bit_by_tag = {}
+        self.tag_bits = []
+        for pos, problem in enumerate(self.problems):
+            self.position_by_name[problem.name] = pos
+            self.positions_by_rating[problem.rating].add(pos)
+            self.positions_by_contest[problem.contestId].add(pos)
+            contest = contest_by_id[problem.contestId]
+            if (cf_common.is_nonstandard_contest(contest) or
+                    any('*special' in tag for tag in problem.tags)):
+                self.nonstandard_positions.add(pos)
+            bits = 0
+            for tag in problem.tags:
+                bits |= self.bit_by_tag.setdefault(tag, 1 << len(self.bit_by_tag))
+            self.tag_bits.append(bits)
+        self.ratings = sorted(self.positions_by_rating)
+
+    def _tag_mask(self, query_tag):
+        """Bitmask of the problem tags which contain the query tag, as in `Problem.tag_matches`."""
+        mask = 0
+        for tag, bit in self.bit_by_tag.items():
+            if query_tag in tag:
+                mask |= bit
+        return mask
+
+    def select(self, *, rating_low, rating_high, contest_ids=None, tags=None,
+               excluded_names=(), excluded_contest_ids=(), exclude_nonstandard=False,
+               newest_first=False):
+        """Returns the problems with rating in [rating_low, rating_high] which pass the given
+        filters. Problems are sorted by contest start time, oldest first unless `newest_first`.
+        """
+        if contest_ids is None:
+            lo = bisect.bisect_left(self.ratings, rating_low)
+            hi = bisect.bisect_right(self.ratings, rating_high)
+            candidates = set().union(*(self.positions_by_rating[rating]
+                                       for rating in self.ratings[lo:hi]))
+        else:
+            candidates = {pos for contest_id in contest_ids
+                          for pos in self.positions_by_contest.get(contest_id, ())
+                          if rating_low <= self.problems[pos].rating <= rating_high}
+
+        candidates -= {self.position_by_name[name] for name in excluded_names
+                       if name in self.position_by_name}
+        for contest_id in excluded_contest_ids:
+            candidates -= self.positions_by_contest.get(contest_id, set())
+        if exclude_nonstandard:
+            candidates -= self.nonstandard_positions
+        if tags:
+            masks = [self._tag_mask(tag) for tag in tags]
+            candidates = {pos for pos in candidates
+                          if all(self.tag_bits[pos] & mask for mask in masks)}
+
+        if newest_first:
+            positions = sorted(candidates, key=lambda pos: (-self.start_times[pos], pos))
+        else:
+            positions = sorted(candidates)
+        return [self.problems[pos] for pos in positions]
 
 
 class ProblemCache:
@@ -166,6 +355,7 @@ class ProblemCache:
 
         self.problems = []
         self.problem_by_name = {}
+        self.index = ProblemIndex([], {})
         self.problems_last_cache = 0
 
         self.reload_lock = asyncio.Lock()
@@ -193,12 +383,13 @@ class ProblemCache:
 
     async def _try_disk(self):
         async with self.reload_lock:
-            problems = self.cache_master.conn.fetch_problems()
+            problems = await self.cache_master.conn.fetch_problems()
             if not problems:
                 self.logger.info('Problem cache on disk is empty.')
                 return
             self.problems = problems
             self.problem_by_name = {problem.name: problem for problem in problems}
+            self._build_index()
             self.logger.info(f'{len(self.problems)} problems fetched from disk')
 
     @tasks.task_spec(name='ProblemCacheUpdate',
@@ -234,11 +425,18 @@ class ProblemCache:
 
         self.problems = list(problem_by_name.values())
         self.problem_by_name = problem_by_name
+        self._build_index()
         self.problems_last_cache = time.time()
 
-        rc = self.cache_master.conn.cache_problems(self.problems)
+        rc = await self.cache_master.conn.cache_problems(self.problems)
         self.logger.info(f'{rc} problems stored in database')
 
+    def _build_index(self):
+        contest_by_id = self.cache_master.contest_cache.contest_by_id
+        # Problems from disk may belong to contests no longer in the contest cache.
+        problems = [problem for problem in self.problems if problem.contestId in contest_by_id]
+        self.index = ProblemIndex(problems, contest_by_id)
+
 
 class ProblemsetCacheError(CacheError):
     pass
@@ -257,12 +455,15 @@ class ProblemsetCache:
         self.problems = []
         # problem -> list of contests in which it appears
         self.problem_to_contests = defaultdict(list)
+        # contest id -> {problem index -> whether the problem is rated} for saved problems
+        self.coverage = {}
         self.cache_master = cache_master
         self.update_lock = asyncio.Lock()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def run(self):
-        if self.cache_master.conn.problemset_empty():
+        self.coverage = await self.cache_master.conn.get_problemset_coverage()
+        if not self.coverage:
             self.logger.warning('Problemset cache on disk is empty. This must be populated '
                                 'manually before use.')
         self._update_task.start()
@@ -272,27 +473,29 @@ class ProblemsetCache:
         async with self.update_lock:
             contest = self.cache_master.contest_cache.get_contest(contest_id)
             problemset, _ = await self._fetch_problemsets([contest], force_fetch=True)
-            self.cache_master.conn.clear_problemset(contest_id)
-            self._save_problems(problemset)
+            await self.cache_master.conn.clear_problemset(contest_id)
+            self.coverage.pop(contest_id, None)
+            await self._save_problems(problemset)
             return len(problemset)
 
     async def update_for_all(self):
         """Update problemsets for all finished contests. Intended for manual trigger."""
         async with self.update_lock:
-            contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
+            contests = list(self.cache_master.contest_cache.contests_by_phase['FINISHED'])
             problemsets, _ = await self._fetch_problemsets(contests, force_fetch=True)
-            self.cache_master.conn.clear_problemset()
-            self._save_problems(problemsets)
+            await self.cache_master.conn.clear_problemset()
+            self.coverage = {}
+            await self._save_problems(problemsets)
             return len(problemsets)
 
     @tasks.task_spec(name='ProblemsetCacheUpdate',
                      waiter=tasks.Waiter.fixed_delay(_RELOAD_DELAY))
     async def _update_task(self, _):
         async with self.update_lock:
-            contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
+            contests = list(self.cache_master.contest_cache.contests_by_phase['FINISHED'])
             new_problems, updated_problems = await self._fetch_problemsets(contests)
-            self._save_problems(new_problems + updated_problems)
-            self._update_from_disk()
+            await self._save_problems(new_problems + updated_problems)
+            await self._update_from_disk()
             self.logger.info(f'{len(new_problems)} new problems saved and {len(updated_problems)} '
                              'saved problems updated.')
 
@@ -309,19 +512,26 @@ class ProblemsetCache:
                 if now > contest.end_time + self._MONITOR_PERIOD_SINCE_CONTEST_END:
                     # Contest too old, we do not want to check it.
                     continue
-                problemset = self.cache_master.conn.fetch_problemset(contest.id)
-                if not problemset:
+                rated_by_index = self.coverage.get(contest.id)
+                if not rated_by_index:
                     new_contest_ids.append(contest.id)
                     continue
-                rated_problem_idx = {prob.index for prob in problemset if prob.rating is not None}
-                if len(rated_problem_idx) < len(problemset):
+                rated_problem_idx = {index for index, rated in rated_by_index.items() if rated}
+                if len(rated_problem_idx) < len(rated_by_index):
                     contests_to_refetch.append((contest.id, rated_problem_idx))
 
+        with cf.request_priority(cf.Priority.BACKGROUND):
+            new_problemsets, refetched_problemsets = await asyncio.gather(
+                asyncio.gather(*(self._fetch_for_contest(contest_id)
+                                 for contest_id in new_contest_ids)),
+                asyncio.gather(*(self._fetch_for_contest(contest_id)
+                                 for contest_id, _ in contests_to_refetch)))
+
         new_problems, updated_problems = [], []
-        for contest_id in new_contest_ids:
-            new_problems += await self._fetch_for_contest(contest_id)
-        for contest_id, rated_problem_idx in contests_to_refetch:
-            updated_problems += [prob for prob in await self._fetch_for_contest(contest_id)
+        for problemset in new_problemsets:
+            new_problems += problemset
+        for (_, rated_problem_idx), problemset in zip(contests_to_refetch, refetched_problemsets):
+            updated_problems += [prob for prob in problemset
                                  if prob.rating is not None and prob.index not in rated_problem_idx]
 
         return new_problems, updated_problems
@@ -335,18 +545,21 @@ class ProblemsetCache:
             problemset = []
         return problemset
 
-    def _save_problems(self, problems):
-        rc = self.cache_master.conn.cache_problemset(problems)
+    async def _save_problems(self, problems):
+        rc = await self.cache_master.conn.cache_problemset(problems)
+        for problem in problems:
+            rated_by_index = self.coverage.setdefault(problem.contestId, {})
+            rated_by_index[problem.index] = problem.rating is not None
         self.logger.info(f'Saved {rc} problems to database.')
 
-    def get_problemset(self, contest_id):
-        problemset = self.cache_master.conn.fetch_problemset(contest_id)
+    async def get_problemset(self, contest_id):
+        problemset = await self.cache_master.conn.fetch_problemset(contest_id)
         if not problemset:
             raise ProblemsetNotCached(contest_id)
         return problemset
 
-    def _update_from_disk(self):
-        self.problems = self.cache_master.conn.fetch_problems2()
+    async def _update_from_disk(self):
+        self.problems = await self.cache_master.conn.fetch_problems2()
         self.problem_to_contests = defaultdict(list)
         for problem in self.problems:
             try:
@@ -357,6 +570,49 @@ class ProblemsetCache:
                 pass
 
 
+class RatingChangesCacheError(CacheError):
+    pass
+
+
+class BackfillAlreadyRunning(RatingChangesCacheError):
+    def __init__(self, backfill):
+        super().__init__(f'A backfill of rating changes is already running, '
+                         f'{backfill.done}/{backfill.total} contests done')
+        self.backfill = backfill
+
+
+class RatingChangesBackfill:
+    """Progress of a backfill of rating changes."""
+
+    def __init__(self, *, total, done=0):
+        self.total = total
+        self.done = done
+        # Contests done by an earlier run of an interrupted backfill do not count towards the
+        # throughput.
+        self.resumed = done
+        self.failed = 0
+        self.changes = 0
+        self.start_time = time.time()
+        self.end_time = None
+        self.task = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def elapsed(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def contests_per_second(self):
+        elapsed = self.elapsed()
+        return (self.done - self.resumed) / elapsed if elapsed > 0 else 0
+
+    def eta(self):
+        """Estimated seconds until the backfill is done, or None if unknown."""
+        rate = self.contests_per_second()
+        return (self.total - self.done) / rate if rate > 0 else None
+
+
 class RatingChangesCache:
     _RATED_DELAY = 36 * 60 * 60
     _RELOAD_DELAY = 10 * 60
@@ -366,10 +622,16 @@ class RatingChangesCache:
         self.cache_master = cache_master
         self.monitored_contests = []
         self.handle_rating_cache = {}
+        self.backfill = None
+        self.contest_changes = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def run(self):
-        self._refresh_handle_cache()
+        self.contest_changes = _ContestListChanges('RatingChangesCacheContestListListener')
+        cf_common.event_sys.add_listener(self.contest_changes.listener)
+        self.handle_rating_cache = {handle.lower(): rating for handle, rating
+                                    in await self.cache_master.conn.get_latest_ratings()}
+        self.logger.info(f'Ratings for {len(self.handle_rating_cache)} handles cached')
         if not self.handle_rating_cache:
             self.logger.warning('Rating changes cache on disk is empty. This must be populated '
                                 'manually before use.')
@@ -379,37 +641,109 @@ class RatingChangesCache:
         """Fetch rating changes for a particular contest. Intended for manual trigger."""
         contest = self.cache_master.contest_cache.contest_by_id[contest_id]
         changes = await self._fetch([contest])
-        self.cache_master.conn.clear_rating_changes(contest_id=contest_id)
-        self._save_changes(changes)
+        cleared_handles = [change.handle
+                           for change in await self.get_rating_changes_for_contest(contest_id)]
+        await self.cache_master.conn.clear_rating_changes(contest_id=contest_id)
+        await self._refresh_handle_cache(cleared_handles)
+        await self._save_changes(changes)
         return len(changes)
 
     async def fetch_all_contests(self):
         """Fetch rating changes for all contests. Intended for manual trigger."""
-        self.cache_master.conn.clear_rating_changes()
-        return await self.fetch_missing_contests()
+        backfill = await self.start_backfill(refetch_all=True)
+        return await backfill.task
 
     async def fetch_missing_contests(self):
         """Fetch rating changes for contests which are not saved in database. Intended for
         manual trigger."""
-        contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
-        contests = [
-            contest for contest in contests if not self.has_rating_changes_saved(contest.id)]
-        total_changes = 0
-        for contests_chunk in paginator.chunkify(contests, _CONTESTS_PER_CHUNK):
-            contests_chunk = await self._fetch(contests_chunk)
-            self._save_changes(contests_chunk)
-            total_changes += len(contests_chunk)
-        return total_changes
-
-    def is_newly_finished_without_rating_changes(self, contest):
+        backfill = await self.start_backfill()
+        return await backfill.task
+
+    async def start_backfill(self, *, refetch_all=False):
+        """Start fetching rating changes for all finished contests without any saved, in the
+        background. If `refetch_all` is set, all saved rating changes are cleared first. Progress
+        is checkpointed after every chunk of contests, so that an interrupted backfill can be
+        resumed. Returns the progress of the new backfill."""
+        if self.backfill is not None and self.backfill.running:
+            raise BackfillAlreadyRunning(self.backfill)
+        if refetch_all:
+            await self.cache_master.conn.clear_rating_changes()
+            self.handle_rating_cache = {}
+        contest_ids = await self.cache_master.conn.get_finished_contests_without_rating_changes()
+        contest_ids = [contest_id for contest_id in contest_ids
+                       if contest_id not in CONTEST_BLACKLIST]
+        await self.cache_master.conn.start_rating_change_backfill(contest_ids)
+        return self._start_backfill(contest_ids, total=len(contest_ids))
+
+    async def resume_backfill(self):
+        """Resume the backfill interrupted by the last shutdown, if any. The contest cache must be
+        loaded."""
+        backfill = await self.cache_master.conn.get_rating_change_backfill()
+        if not backfill:
+            return
+        pending_ids = [contest_id for contest_id, fetched in backfill if not fetched]
+        self.logger.info(f'Resuming backfill of rating changes, '
+                         f'{len(pending_ids)} of {len(backfill)} contests remaining')
+        self._start_backfill(pending_ids, total=len(backfill))
+
+    def _start_backfill(self, contest_ids, *, total):
+        self.backfill = RatingChangesBackfill(total=total, done=total - len(contest_ids))
+        self.backfill.task = asyncio.create_task(self._backfill(contest_ids))
+        self.backfill.task.add_done_callback(self._backfill_done)
+        return self.backfill
+
+    def _backfill_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.backfill.end_time = time.time()
+            self.logger.error('Backfill of rating changes failed, it will be resumed on restart',
+                              exc_info=task.exception())
+
+    async def _backfill(self, contest_ids):
+        backfill = self.backfill
+        contest_by_id = self.cache_master.contest_cache.contest_by_id
+        # Contests which are no longer known have nothing to fetch.
+        unknown_ids = [contest_id for contest_id in contest_ids if contest_id not in contest_by_id]
+        if unknown_ids:
+            await self.cache_master.conn.save_rating_changes([], backfilled_contest_ids=unknown_ids)
+            backfill.done += len(unknown_ids)
+        contests = [contest_by_id[contest_id] for contest_id in contest_ids
+                    if contest_id in contest_by_id]
+
+        for contests_chunk in paginator.chunkify(contests, self._CONTESTS_PER_CHUNK):
+            # Requests are spaced out by the API rate limiter, at background priority so that
+            # commands are served first.
+            with cf.request_priority(cf.Priority.BACKGROUND):
+                all_changes = await asyncio.gather(*(self._fetch_for_contest(contest)
+                                                     for contest in contests_chunk))
+            contest_changes_pairs = [(contest, changes)
+                                     for contest, changes in zip(contests_chunk, all_changes)
+                                     if changes]
+            # Contests whose fetch failed transiently are left unmarked and retried when the
+            # backfill is resumed.
+            fetched_ids = [contest.id for contest, changes in zip(contests_chunk, all_changes)
+                           if changes is not None]
+            await self._save_changes(contest_changes_pairs, backfilled_contest_ids=fetched_ids)
+            backfill.done += len(contests_chunk)
+            backfill.failed += len(contests_chunk) - len(fetched_ids)
+            backfill.changes += sum(len(changes) for _, changes in contest_changes_pairs)
+
+        if backfill.failed:
+            self.logger.warning(f'Backfill of rating changes failed for {backfill.failed} contests')
+        else:
+            await self.cache_master.conn.finish_rating_change_backfill()
+        backfill.end_time = time.time()
+        self.logger.info(f'Backfill of rating changes done, {backfill.changes} changes fetched '
+                         f'for {backfill.total} contests')
+        return backfill.changes
+
+    async def is_newly_finished_without_rating_changes(self, contest):
         now = time.time()
         return (contest.phase == 'FINISHED' and
                 now - contest.end_time < self._RATED_DELAY and
-                not self.has_rating_changes_saved(contest.id))
+                not await self.has_rating_changes_saved(contest.id))
 
-    @tasks.task_spec(name='RatingChangesCacheUpdate',
-                     waiter=tasks.Waiter.for_event(events.ContestListRefresh))
-    async def _update_task(self, _):
+    @tasks.task_spec(name='RatingChangesCacheUpdate')
+    async def _update_task(self, event):
         # Some notes:
         # A hack phase is tagged as FINISHED with empty list of rating changes. After the hack
         # phase, the phase changes to systest then again FINISHED. Since we cannot differentiate
@@ -417,13 +751,14 @@ class RatingChangesCache:
         # A contest also has empty list if it is unrated. We assume that is the case if
         # _RATED_DELAY time has passed since the contest end.
 
+        contests = _finished_contests_to_check(self.cache_master.contest_cache,
+                                               self.monitored_contests, event)
         to_monitor = [
-            contest for contest in
-            self.cache_master.contest_cache.contests_by_phase['FINISHED'] 
-            if self.is_newly_finished_without_rating_changes(contest)
+            contest for contest in contests
+            if await self.is_newly_finished_without_rating_changes(contest)
             and not _is_blacklisted(contest)
-            ]
-                 
+        ]
+
         cur_ids = {contest.id for contest in self.monitored_contests}
         new_ids = {contest.id for contest in to_monitor}
         if new_ids != cur_ids:
@@ -434,12 +769,16 @@ class RatingChangesCache:
             else:
                 self.monitored_contests = []
 
+    @_update_task.waiter(run_first=True)
+    async def _update_task_waiter(self):
+        return await self.contest_changes.wait()
+
     @tasks.task_spec(name='RatingChangesCacheUpdate.MonitorNewlyFinishedContests',
                      waiter=tasks.Waiter.fixed_delay(_RELOAD_DELAY))
     async def _monitor_task(self, _):
         self.monitored_contests = [
             contest for contest in self.monitored_contests
-            if self.is_newly_finished_without_rating_changes(contest)
+            if await self.is_newly_finished_without_rating_changes(contest)
             and not _is_blacklisted(contest)
         ]
 
@@ -452,55 +791,70 @@ class RatingChangesCache:
         # Sort by the rating update time of the first change in the list of changes, assuming
         # every change in the list has the same time.
         contest_changes_pairs.sort(key=lambda pair: pair[1][0].ratingUpdateTimeSeconds)
-        self._save_changes(contest_changes_pairs)
+        await self._save_changes(contest_changes_pairs)
         for contest, changes in contest_changes_pairs:
             cf_common.event_sys.dispatch(events.RatingChangesUpdate, contest=contest,
                                          rating_changes=changes)
 
     async def _fetch(self, contests):
-        all_changes = []
-        for contest in contests:
-            try:
-                changes = await cf.contest.ratingChanges(contest_id=contest.id)
-                self.logger.info(f'{len(changes)} rating changes fetched for contest {contest.id}')
-                if changes:
-                    all_changes.append((contest, changes))
-            except cf.CodeforcesApiError as er:
-                self.logger.warning(f'Fetch rating changes failed for contest {contest.id}, ignoring. {er!r}')
-                pass
-        return all_changes
+        with cf.request_priority(cf.Priority.BACKGROUND):
+            all_changes = await asyncio.gather(*(self._fetch_for_contest(contest)
+                                                 for contest in contests))
+        return [(contest, changes) for contest, changes in zip(contests, all_changes) if changes]
+
+    async def _fetch_for_contest(self, contest):
+        """Returns the rating changes of the contest, an empty list if the API reports that
+        there are none to fetch, or None if the fetch failed and may succeed when retried."""
+        try:
+            changes = await cf.contest.ratingChanges(contest_id=contest.id)
+            self.logger.info(f'{len(changes)} rating changes fetched for contest {contest.id}')
+        except cf.CallLimitExceededError as er:
+            self.logger.warning(f'Fetch rating changes failed for contest {contest.id}, ignoring. {er!r}')
+            changes = None
+        except cf.TrueApiError as er:
+            # Permanent, e.g. rating changes unavailable. Retrying would fail the same way.
+            self.logger.warning(f'No rating changes for contest {contest.id}. {er!r}')
+            changes = []
+        except cf.CodeforcesApiError as er:
+            # Transient, e.g. a network failure or a response which is not JSON.
+            self.logger.warning(f'Fetch rating changes failed for contest {contest.id}, ignoring. {er!r}')
+            changes = None
+        return changes
 
-    def _save_changes(self, contest_changes_pairs):
+    async def _save_changes(self, contest_changes_pairs, *, backfilled_contest_ids=()):
         flattened = [change for _, changes in contest_changes_pairs for change in changes]
-        if not flattened:
+        if not flattened and not backfilled_contest_ids:
             return
-        rc = self.cache_master.conn.save_rating_changes(flattened)
+        rc = await self.cache_master.conn.save_rating_changes(
+            flattened, backfilled_contest_ids=backfilled_contest_ids)
         self.logger.info(f'Saved {rc} changes to database.')
-        self._refresh_handle_cache()
+        await self._refresh_handle_cache({change.handle for change in flattened})
 
-    def _refresh_handle_cache(self):
-        changes = self.cache_master.conn.get_all_rating_changes()
-        handle_rating_cache = {}
-        for change in changes:
-            handle_rating_cache[change.handle] = change.newRating
-        self.handle_rating_cache = handle_rating_cache
-        self.logger.info(f'Ratings for {len(handle_rating_cache)} handles cached')
+    async def _refresh_handle_cache(self, handles):
+        """Reload the current ratings of the given handles from the database."""
+        handles = set(handles)
+        latest_ratings = await self.cache_master.conn.get_latest_ratings(handles)
+        for handle in handles:
+            self.handle_rating_cache.pop(handle.lower(), None)
+        for handle, rating in latest_ratings:
+            self.handle_rating_cache[handle.lower()] = rating
+        self.logger.info(f'Ratings for {len(latest_ratings)} handles updated')
 
-    def get_users_with_more_than_n_contests(self, time_cutoff, n):
-        return self.cache_master.conn.get_users_with_more_than_n_contests(time_cutoff, n)
+    async def get_users_with_more_than_n_contests(self, time_cutoff, n):
+        return await self.cache_master.conn.get_users_with_more_than_n_contests(time_cutoff, n)
 
-    def get_rating_changes_for_contest(self, contest_id):
-        return self.cache_master.conn.get_rating_changes_for_contest(contest_id)
+    async def get_rating_changes_for_contest(self, contest_id):
+        return await self.cache_master.conn.get_rating_changes_for_contest(contest_id)
 
-    def has_rating_changes_saved(self, contest_id):
-        return self.cache_master.conn.has_rating_changes_saved(contest_id)
+    async def has_rating_changes_saved(self, contest_id):
+        return await self.cache_master.conn.has_rating_changes_saved(contest_id)
 
-    def get_rating_changes_for_handle(self, handle):
-        return self.cache_master.conn.get_rating_changes_for_handle(handle)
+    async def get_rating_changes_for_handle(self, handle):
+        return await self.cache_master.conn.get_rating_changes_for_handle(handle)
 
     def get_current_rating(self, handle, default_if_absent=False):
-        return self.handle_rating_cache.get(handle,
-                                            cf.DEFAULT_RATING if default_if_absent else None)
+        default = cf.DEFAULT_RATING if default_if_absent else None
+        return self.handle_rating_cache.get(handle.lower(), default)
 
     def get_all_ratings(self):
         return list(self.handle_rating_cache.values())
@@ -517,14 +871,26 @@ class RanklistNotMonitored(RanklistCacheError):
 
 class RanklistCache:
     _RELOAD_DELAY = 2 * 60
+    _PREDICTION_TIMEOUT = 90
+    # Memory budget for ranklists of finished contests kept around for repeated requests.
+    _FINISHED_RANKLISTS_MAX_SIZE = 128 * 1024 * 1024
 
     def __init__(self, cache_master):
         self.cache_master = cache_master
         self.monitored_contests = []
         self.ranklist_by_contest = {}
+        # Ranklists with final rating changes, least recently used first.
+        self.finished_ranklists = OrderedDict()
+        self.finished_ranklists_size = 0
+        self._finished_fetches = {}
+        self.archive = RanklistArchive(constants.RANKLISTS_DIR)
+        self.contest_changes = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def run(self):
+        self.contest_changes = _ContestListChanges('RanklistCacheContestListListener')
+        cf_common.event_sys.add_listener(self.contest_changes.listener)
+        cf_common.event_sys.add_listener(self._on_rating_changes)
         self._update_task.start()
 
     def get_ranklist(self, contest):
@@ -533,17 +899,17 @@ class RanklistCache:
         except KeyError:
             raise RanklistNotMonitored(contest)
 
-    @tasks.task_spec(name='RanklistCacheUpdate',
-                     waiter=tasks.Waiter.for_event(events.ContestListRefresh))
-    async def _update_task(self, _):
-        contests_by_phase = self.cache_master.contest_cache.contests_by_phase
-        running_contests = contests_by_phase['_RUNNING']
+    @tasks.task_spec(name='RanklistCacheUpdate')
+    async def _update_task(self, event):
+        contest_cache = self.cache_master.contest_cache
+        running_contests = list(contest_cache.contests_by_phase['_RUNNING'])
 
         rating_cache = self.cache_master.rating_changes_cache
+        contests = _finished_contests_to_check(contest_cache, self.monitored_contests, event)
         finished_contests = [
-            contest for contest in contests_by_phase['FINISHED']
+            contest for contest in contests
             if not _is_blacklisted(contest)
-            and rating_cache.is_newly_finished_without_rating_changes(contest)
+            and await rating_cache.is_newly_finished_without_rating_changes(contest)
         ]
 
         to_monitor = running_contests + finished_contests
@@ -557,6 +923,10 @@ class RanklistCache:
             else:
                 self.ranklist_by_contest = {}
 
+    @_update_task.waiter(run_first=True)
+    async def _update_task_waiter(self):
+        return await self.contest_changes.wait()
+
     @tasks.task_spec(name='RanklistCacheUpdate.MonitorActiveContests',
                      waiter=tasks.Waiter.fixed_delay(_RELOAD_DELAY))
     async def _monitor_task(self, _):
@@ -564,7 +934,7 @@ class RanklistCache:
         self.monitored_contests = [
             contest for contest in self.monitored_contests
             if not _is_blacklisted(contest) and (contest.phase != 'FINISHED'
-                or cache.is_newly_finished_without_rating_changes(contest))
+                or await cache.is_newly_finished_without_rating_changes(contest))
         ]
 
         if not self.monitored_contests:
@@ -578,16 +948,113 @@ class RanklistCache:
         for contest_id, ranklist in ranklist_by_contest.items():
             self.ranklist_by_contest[contest_id] = ranklist
 
-    async def generate_ranklist(self, contest_id, *, fetch_changes=False, predict_changes=False):
+    @events.listener_spec(name='RanklistCacheRatingChangesListener',
+                          event_cls=events.RatingChangesUpdate)
+    async def _on_rating_changes(self, event):
+        self._evict_finished(event.contest.id)
+        self.archive.remove(event.contest.id)
+        # A fetch in flight may have started before the rating changes were out.
+        self._finished_fetches.pop(event.contest.id, None)
+
+    def _evict_finished(self, contest_id):
+        ranklist = self.finished_ranklists.pop(contest_id, None)
+        if ranklist is not None:
+            self.finished_ranklists_size -= ranklist.estimated_size()
+
+    def _keep_finished(self, contest_id, ranklist):
+        self._evict_finished(contest_id)
+        size = ranklist.estimated_size()
+        if size > self._FINISHED_RANKLISTS_MAX_SIZE:
+            return
+        while self.finished_ranklists_size + size > self._FINISHED_RANKLISTS_MAX_SIZE:
+            _, evicted = self.finished_ranklists.popitem(last=False)
+            self.finished_ranklists_size -= evicted.estimated_size()
+        self.finished_ranklists[contest_id] = ranklist
+        self.finished_ranklists_size += size
+
+    async def generate_ranklist(self, contest_id, *, fetch_changes=False, predict_changes=False,
+                                previous=None):
+        """Fetch the ranklist of a contest with final or predicted rating changes. When
+        predicting, `previous` may be an earlier ranklist of the same contest whose prediction is
+        reused as far as possible.
+
+        With final rating changes, concurrent calls for a contest share one fetch and ranklists of
+        finished contests are kept until memory runs short or the rating changes are updated."""
         assert fetch_changes ^ predict_changes
+        if predict_changes:
+            return await self._generate_ranklist(contest_id, predict_changes=True,
+                                                 previous=previous)
+
+        ranklist = self.finished_ranklists.get(contest_id)
+        if ranklist is not None:
+            self.finished_ranklists.move_to_end(contest_id)
+            return ranklist
+        fetch = self._finished_fetches.get(contest_id)
+        if fetch is None:
+            fetch = asyncio.create_task(self._fetch_finished(contest_id))
+            self._finished_fetches[contest_id] = fetch
+        # Waiters being cancelled must not cancel the fetch for the others.
+        return await asyncio.shield(fetch)
+
+    async def _fetch_finished(self, contest_id):
+        fetch = asyncio.current_task()
+        try:
+            ranklist = await self._load_archived(contest_id)
+            if ranklist is None:
+                ranklist = await self._generate_ranklist(contest_id, fetch_changes=True)
+                if await self._is_final(ranklist):
+                    await self._archive(ranklist)
+        finally:
+            invalidated = self._finished_fetches.get(contest_id) is not fetch
+            if not invalidated:
+                del self._finished_fetches[contest_id]
+        if ranklist.contest.phase == 'FINISHED' and not invalidated:
+            self._keep_finished(contest_id, ranklist)
+        return ranklist
+
+    async def _is_final(self, ranklist):
+        """Whether the ranklist will not change anymore. Until rating changes are out for a newly
+        finished contest, it is not known whether the contest is rated."""
+        contest = ranklist.contest
+        if contest.phase != 'FINISHED':
+            return False
+        rating_cache = self.cache_master.rating_changes_cache
+        return (ranklist.is_rated
+                or not await rating_cache.is_newly_finished_without_rating_changes(contest))
+
+    async def _load_archived(self, contest_id):
+        contest = self.cache_master.contest_cache.contest_by_id.get(contest_id)
+        if contest is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            ranklist = await loop.run_in_executor(None, self.archive.load, contest)
+        except Exception as e:
+            self.logger.warning(f'Archived ranklist for contest {contest_id} is unreadable, '
+                                f'removing it. {e!r}')
+            self.archive.remove(contest_id)
+            return None
+        if ranklist is not None:
+            self.logger.info(f'Ranklist loaded from archive for contest {contest_id}')
+        return ranklist
 
+    async def _archive(self, ranklist):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.archive.save, ranklist)
+        except OSError as e:
+            self.logger.warning(f'Ranklist archive failed for contest {ranklist.contest.id}. '
+                                f'{e!r}')
+
+    async def _generate_ranklist(self, contest_id, *, fetch_changes=False, predict_changes=False,
+                                 previous=None):
         contest, problems, standings = await cf.contest.standings(contest_id=contest_id,
                                                                   show_unofficial=True)
         now = time.time()
 
         # Exclude PRACTICE and MANAGER
-        standings = [row for row in standings
-                     if row.party.participantType in ('CONTESTANT', 'OUT_OF_COMPETITION', 'VIRTUAL')]
+        standings = standings.filter_participant_types(
+            ('CONTESTANT', 'OUT_OF_COMPETITION', 'VIRTUAL'))
         if fetch_changes:
             # Fetch final rating changes from CF.
             # For older contests.
@@ -606,23 +1073,29 @@ class RanklistCache:
         elif predict_changes:
             # Rating changes have not been applied yet, predict rating changes.
             # For running/recent contests.
-            _, _, standings_official = await cf.contest.standings(contest_id=contest_id)
+            # The official standings (showUnofficial=False) are the contestant rows, no need to
+            # fetch them again.
+            standings_official = standings.filter_participant_types(('CONTESTANT',))
 
-            has_teams = any(row.party.teamId is not None for row in standings_official)
+            has_teams = standings_official.has_teams()
             if cf_common.is_nonstandard_contest(contest) or has_teams:
                 # The contest is not rated
                 ranklist = Ranklist(contest, problems, standings, now, is_rated=False)
             else:
-                current_rating = await CacheSystem.getUsersEffectiveRating(activeOnly=False)
-                current_rating = {row.party.members[0].handle: current_rating.get(row.party.members[0].handle, 1500)
-                                  for row in standings_official}
+                handles = [handle for handle in standings_official.first_handles()
+                           if handle is not None]
+                ratings = await self.cache_master.rated_list_cache.get_ratings(handles)
+                current_rating = dict(zip(handles, ratings.tolist()))
                 if 'Educational' in contest.name:
                     # For some reason educational contests return all contestants in ranklist even
                     # when unofficial contestants are not requested.
                     current_rating = {handle: rating
                                       for handle, rating in current_rating.items() if rating < 2100}
                 ranklist = Ranklist(contest, problems, standings, now, is_rated=True)
-                ranklist.predict(current_rating)
+                job = ranklist.prepare_prediction(current_rating, previous=previous)
+                if job is not None:
+                    ranklist.finish_prediction(*await compute.submit(
+                        predict_rating_changes, *job, timeout=self._PREDICTION_TIMEOUT))
 
         return ranklist
 
@@ -631,66 +1104,226 @@ class RanklistCache:
         contest, problems, standings = await cf.contest.standings(contest_id=contest_id,
                                                                   show_unofficial=True)
         # Exclude PRACTICE, MANAGER and OUR_OF_COMPETITION
-        standings = [row for row in standings
-                     if row.party.participantType == 'CONTESTANT' or
-                        row.party.members[0].handle in handles]
-        standings.sort(key=lambda row: row.rank)
-        standings = [row._replace(rank=i + 1) for i, row in enumerate(standings)]
+        first_handles = standings.first_handles()
+        contestant = cf.Party.PARTICIPANT_TYPES.index('CONTESTANT')
+        rows = [i for i, handle in enumerate(first_handles)
+                if standings.participant_type[i] == contestant or handle in handles]
+        rows.sort(key=lambda i: standings.rank[i])
+        standings = standings.select(rows)
+        standings.rank = np.arange(1, len(rows) + 1)
         now = time.time()
         rating_changes = await cf.contest.ratingChanges(contest_id=contest_id)
         current_official_rating = {rating_change.handle : rating_change.oldRating
                                     for rating_change in rating_changes}
 
         # TODO: assert that none of the given handles are in the official standings.
-        handles = [row.party.members[0].handle for row in standings
-                   if row.party.members[0].handle in handles and
-                      row.party.participantType == 'VIRTUAL']
-        current_vc_rating = {handle: cf_common.user_db.get_vc_rating(handle_to_member_id.get(handle))
+        handles = [handle for i, handle in enumerate(standings.first_handles())
+                   if handle in handles and standings.participant_type_of(i) == 'VIRTUAL']
+        current_vc_rating = {handle: await cf_common.user_db.get_vc_rating(handle_to_member_id.get(handle))
                                 for handle in handles}
         ranklist = Ranklist(contest, problems, standings, now, is_rated=True)
-        delta_by_handle = {}
-        for handle in handles:
-            mixed_ratings = current_official_rating.copy()
-            mixed_ratings[handle] = current_vc_rating.get(handle)
-            ranklist.predict(mixed_ratings)
-            delta_by_handle[handle] = ranklist.delta_by_handle.get(handle, 0)
-
-        ranklist.delta_by_handle = delta_by_handle
+        # Each virtual participant is rated as if they had been the only one in the contest.
+        ranklist.predict_joining(current_official_rating, current_vc_rating)
         return ranklist
 
     async def _fetch(self, contests):
-        ranklist_by_contest = {}
-        for contest in contests:
-            try:
-                ranklist = await self.generate_ranklist(contest.id, predict_changes=True)
-                ranklist_by_contest[contest.id] = ranklist
-                self.logger.info(f'Ranklist fetched for contest {contest.id}')
-            except cf.CodeforcesApiError as er:
-                self.logger.warning(f'Ranklist fetch failed for contest {contest.id}. {er!r}')
+        with cf.request_priority(cf.Priority.BACKGROUND):
+            ranklists = await asyncio.gather(*(self._fetch_for_contest(contest)
+                                               for contest in contests))
+        return {contest.id: ranklist for contest, ranklist in zip(contests, ranklists)
+                if ranklist is not None}
+
+    async def _fetch_for_contest(self, contest):
+        try:
+            ranklist = await self.generate_ranklist(
+                contest.id, predict_changes=True,
+                previous=self.ranklist_by_contest.get(contest.id))
+            self.logger.info(f'Ranklist fetched for contest {contest.id}')
+            return ranklist
+        except (cf.CodeforcesApiError, compute.ComputeError) as er:
+            self.logger.warning(f'Ranklist fetch failed for contest {contest.id}. {er!r}')
+            return None
+
+
+class SubmissionCache:
+    """Stores the submissions of every handle queried so far. Only submissions newer than those
+    already stored as final are fetched from the API. The verdict of a submission can change
+    until system testing and rejudges are done, so a submission is final only once its contest
+    has been finished for a while."""
+    _INITIAL_FETCH_COUNT = 16
+    _MAX_INCREMENTAL_FETCH_COUNT = 4096
+    _PENDING_VERDICTS = (None, 'TESTING')
+    _SETTLE_TIME = 3 * 24 * 60 * 60
+
+    def __init__(self, cache_master):
+        self.cache_master = cache_master
+        # Dropped once no request for the handle holds or waits for the lock.
+        self.locks = weakref.WeakValueDictionary()
+        self.logger = logging.getLogger(self.__class__.__name__)
 
-        return ranklist_by_contest
+    async def get_submissions(self, handle):
+        """Returns all submissions of the handle, most recent first, like `cf.user.status`."""
+        lock = self.locks.get(handle.lower())
+        if lock is None:
+            lock = self.locks[handle.lower()] = asyncio.Lock()
+        async with lock:
+            conn = self.cache_master.submission_conn
+            watermark = await conn.get_submission_watermark(handle)
+            submissions = await self._fetch_newer(handle, watermark)
+            new_submissions = [sub for sub in submissions
+                               if watermark is None or sub.id > watermark]
+            # Submissions which are not final are stored, but the watermark is kept below them so
+            # that they are fetched again.
+            now = time.time()
+            pending_ids = [sub.id for sub in new_submissions if not self._is_final(sub, now)]
+            if pending_ids:
+                new_watermark = min(pending_ids) - 1
+            else:
+                new_watermark = max([sub.id for sub in new_submissions] + [watermark or 0])
+            if new_submissions or new_watermark != watermark:
+                await conn.save_submissions(handle, new_submissions, new_watermark,
+                                      replace_after=watermark)
+                self.logger.info(f'Saved {len(new_submissions)} new submissions of {handle}')
+            return await conn.fetch_submissions(handle)
+
+    def _is_final(self, submission, now):
+        """Whether the verdict of the submission can no longer change. If the contest is not
+        known, e.g. for gym contests, the time of the submission is used instead."""
+        if submission.verdict in self._PENDING_VERDICTS:
+            return False
+        contest = self.cache_master.contest_cache.contest_by_id.get(submission.contestId)
+        if contest is None:
+            return submission.creationTimeSeconds < now - self._SETTLE_TIME
+        return contest.phase == 'FINISHED' and contest.end_time < now - self._SETTLE_TIME
+
+    async def _fetch_newer(self, handle, watermark):
+        """Fetches a prefix of the submission list which contains every submission with id greater
+        than the watermark."""
+        if watermark is None:
+            return await cf.user.status(handle=handle)
+        count = self._INITIAL_FETCH_COUNT
+        while count <= self._MAX_INCREMENTAL_FETCH_COUNT:
+            submissions = await cf.user.status(handle=handle, from_=1, count=count)
+            if len(submissions) < count or submissions[-1].id <= watermark:
+                return submissions
+            count *= 4
+        return await cf.user.status(handle=handle)
+
+
+class RatedListCache:
+    """The current ratings of all rated users, from user.ratedList. The handles are kept sorted in
+    a fixed-width byte array, so that the position of a handle identifies it, next to an array of
+    ratings. Both are saved to disk as .npy files which are memory mapped on startup. Lookups are
+    served from the current data even when it is stale, while a refresh runs in the background.
+    """
+    _RELOAD_DELAY = 30 * 60
+
+    def __init__(self, cache_master):
+        self.cache_master = cache_master
+        self.handles = None
+        self.ratings = None
+        self.last_update = 0
+        self._refresh_task = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def run(self):
+        try:
+            self._load()
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Could not load rated list from disk, {e!r}')
+        if self.handles is None:
+            self.logger.info('Rated list not on disk, fetching in the background.')
+        else:
+            self.logger.info(f'Rated list of {len(self.handles)} users loaded from disk.')
+        if time.time() - self.last_update > self._RELOAD_DELAY:
+            self._refresh()
+
+    async def get_rating(self, handle, default=None):
+        """The current rating of a user, or `default` if the user is not rated."""
+        return (await self.get_ratings([handle], default)).tolist()[0]
+
+    async def get_ratings(self, handles, default=cf.DEFAULT_RATING):
+        """An array of the current ratings of the given users, with `default` for users who are
+        not rated."""
+        if self.handles is None:
+            # Nothing to serve yet, wait for the first fetch.
+            await asyncio.shield(self._refresh())
+        elif time.time() - self.last_update > self._RELOAD_DELAY:
+            self._refresh()
+        return _lookup_ratings(self.handles, self.ratings, handles, default)
+
+    def _refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        return self._refresh_task
+
+    def _refresh_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.warning('Refresh of rated list failed', exc_info=task.exception())
+
+    async def _fetch(self):
+        rating_by_handle = await cf.user.ratedList(activeOnly=False)
+        loop = asyncio.get_running_loop()
+        # Sorting and saving hundreds of thousands of handles takes a while.
+        self.handles, self.ratings = await loop.run_in_executor(
+            None, _save_rated_list, rating_by_handle)
+        self.last_update = time.time()
+        self.logger.info(f'Rated list of {len(self.handles)} users fetched.')
+
+    def _load(self):
+        handles = np.load(constants.RATED_LIST_HANDLES_FILE_PATH, mmap_mode='r')
+        ratings = np.load(constants.RATED_LIST_RATINGS_FILE_PATH, mmap_mode='r')
+        if len(handles) != len(ratings):
+            raise ValueError('Rated list handles and ratings do not match')
+        self.handles, self.ratings = handles, ratings
+        self.last_update = min(os.path.getmtime(constants.RATED_LIST_HANDLES_FILE_PATH),
+                               os.path.getmtime(constants.RATED_LIST_RATINGS_FILE_PATH))
+
+
+def _save_rated_list(rating_by_handle):
+    handles = np.array([handle.encode() for handle in rating_by_handle], dtype=np.bytes_)
+    ratings = np.fromiter(rating_by_handle.values(), dtype=np.int32, count=len(rating_by_handle))
+    order = np.argsort(handles)
+    handles, ratings = handles[order], ratings[order]
+    for path, array in ((constants.RATED_LIST_RATINGS_FILE_PATH, ratings),
+                        (constants.RATED_LIST_HANDLES_FILE_PATH, handles)):
+        # Written under another name first, so that a snapshot is never left half written.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    return handles, ratings
+
+
+def _lookup_ratings(sorted_handles, ratings, handles, default):
+    keys = np.array([handle.encode() for handle in handles], dtype=np.bytes_)
+    if not len(sorted_handles) or not len(keys):
+        return np.full(len(keys), default)
+    pos = np.minimum(np.searchsorted(sorted_handles, keys), len(sorted_handles) - 1)
+    return np.where(sorted_handles[pos] == keys, ratings[pos], default)
 
 
 class CacheSystem:
-    def __init__(self, conn):
+    def __init__(self, conn, submission_conn):
         self.conn = conn
+        self.submission_conn = submission_conn
         self.contest_cache = ContestCache(self)
         self.problem_cache = ProblemCache(self)
         self.rating_changes_cache = RatingChangesCache(self)
         self.ranklist_cache = RanklistCache(self)
         self.problemset_cache = ProblemsetCache(self)
+        self.submission_cache = SubmissionCache(self)
+        self.rated_list_cache = RatedListCache(self)
 
     async def run(self):
+        await self.rated_list_cache.run()
         await self.rating_changes_cache.run()
         await self.ranklist_cache.run()
         await self.contest_cache.run()
         await self.problem_cache.run()
         await self.problemset_cache.run()
-
-    @staticmethod
-    @cached(ttl=30 * 60)
-    async def getUsersEffectiveRating(*, activeOnly=None):
-        """ Returns a dictionary mapping user handle to his effective rating for all the users.
-        """
-        return await cf.user.ratedList(activeOnly=activeOnly)
+        await self.rating_changes_cache.resume_backfill()
 
@@ -2,7 +2,7 @@ import logging
 import os
 import datetime as dt
 from tle.util.codeforces_api import RatingChange, make_from_dict, Contest as CfContest
-import requests
+import aiohttp
 import json
 
 from tle import constants
@@ -13,11 +13,25 @@ import functools
 import time
 import asyncio
 from urllib.parse import urlencode
-from collections import namedtuple, deque
+from collections import namedtuple, deque, OrderedDict
 
 logger = logging.getLogger(__name__)
 URL_BASE = 'https://clist.by/api/v2/'
 _CLIST_API_TIME_DIFFERENCE = 30 * 60  # seconds
+_CONNECTION_LIMIT = 8
+_REQUEST_TIMEOUT = 30  # seconds
+_MAX_RETRY_AFTER = 60  # seconds
+_STATISTICS_PAGE_SIZE = 1000
+_MAX_CONCURRENT_PAGES = 4
+
+# Cached endpoints, with the time a response is fresh for and the time after that in which the
+# stale response is still served while it is fetched again, in seconds.
+_CACHE_TTL_BY_ENDPOINT = {
+    'account': (30 * 60, 6 * 60 * 60),
+    'statistics': (5 * 60, 30 * 60),
+}
+_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_CACHE_MEMORY_MAX_BYTES = 32 * 1024 * 1024
 
 
 class ClistApiError(commands.CommandError):
@@ -45,30 +59,174 @@ class HandleNotFoundError(TrueApiError):
         self.handle = handle
 
 class CallLimitExceededError(TrueApiError):
-    def __init__(self, comment=None):
+    def __init__(self, comment=None, retry_after=None):
         super().__init__(message='Clist API call limit exceeded')
         self.comment = comment
+        self.retry_after = retry_after
+
+
+# Shared by all requests, so that once the call limit is hit no request is made until it is over.
+_backoff_until = 0
+
 
 def ratelimit(f):
     tries = 4
     @functools.wraps(f)
     async def wrapped(*args, **kwargs):
+        global _backoff_until
         for i in range(tries):
+            delay = _backoff_until - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
             try:
                 return await f(*args, **kwargs)
-            except (CallLimitExceededError, ClientError, ClistApiError) as e:
+            except ClistApiError as e:
                 logger.info(f'Try {i+1}/{tries} at query failed.')
-                if i < tries - 1:
-                    await asyncio.sleep(2 + i/2)
-                    logger.info(f'Retrying...')
-                else:
+                if i == tries - 1:
                     logger.info(f'Aborting.')
                     raise e
+                if isinstance(e, CallLimitExceededError):
+                    delay = e.retry_after if e.retry_after is not None else 2 ** (i + 2)
+                    if delay > _MAX_RETRY_AFTER:
+                        logger.info(f'Call limit exceeded for {delay} seconds, aborting.')
+                        raise e
+                    _backoff_until = max(_backoff_until, time.time() + delay)
+                else:
+                    await asyncio.sleep(2 + i/2)
+                logger.info(f'Retrying...')
     return wrapped
 
 
-@ratelimit
+class ResponseCache:
+    """Responses of the cached clist endpoints, stored in the clist cache database and keyed by the
+    endpoint and the normalized query parameters. The JSON of the most recently used responses is
+    also kept in memory. Every request gets a newly decoded response, as callers modify them.
+
+    A response younger than the TTL of its endpoint is served as is. A somewhat older one is still
+    served, but fetched again in the background. Older responses are fetched again before
+    answering. Concurrent requests for the same response share one fetch.
+    """
+
+    def __init__(self, cache_db, *, max_bytes=_CACHE_MAX_BYTES,
+                 memory_max_bytes=_CACHE_MEMORY_MAX_BYTES):
+        self.cache_db = cache_db
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._fetches = {}
+
+    @staticmethod
+    def _key(path, data):
+        params = {}
+        for name, value in (data or {}).items():
+            value = str(value)
+            if name.endswith('__in'):
+                # The same ids in any order are the same query.
+                value = ','.join(sorted(value.split(','), key=lambda id_: (len(id_), id_)))
+            params[name] = value
+        return json.dumps([path, sorted(params.items())])
+
+    async def query(self, path, data, fetch):
+        """The response of `fetch(path, data)`, from the cache if possible."""
+        ttl, stale_ttl = _CACHE_TTL_BY_ENDPOINT[path]
+        key = self._key(path, data)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        else:
+            entry = await self.cache_db.get_clist_response(key)
+            if entry is not None:
+                self._remember(key, *entry)
+
+        if entry is not None:
+            fetch_time, text = entry
+            age = time.time() - fetch_time
+            if age < ttl:
+                return json.loads(text)
+            if age < ttl + stale_ttl:
+                self._fetch(key, path, data, fetch)
+                return json.loads(text)
+        return json.loads(await self._fetch(key, path, data, fetch))
+
+    def _fetch(self, key, path, data, fetch):
+        """Returns the task fetching the JSON of the response."""
+        task = self._fetches.get(key)
+        if task is None:
+            task = self._fetches[key] = asyncio.create_task(self._do_fetch(key, path, data, fetch))
+            task.add_done_callback(functools.partial(self._fetch_done, key))
+        return task
+
+    def _fetch_done(self, key, task):
+        del self._fetches[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here for fetches in the background, which nobody awaits.
+            logger.warning(f'Clist fetch for {key} failed: {task.exception()!r}')
+
+    async def _do_fetch(self, key, path, data, fetch):
+        response = await fetch(path, data)
+        fetch_time = time.time()
+        text = json.dumps(response)
+        self._remember(key, fetch_time, text)
+        await self.cache_db.save_clist_response(key, path, text, fetch_time,
+                                                max_bytes=self.max_bytes)
+        return text
+
+    def _remember(self, key, fetch_time, text):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[1])
+        self._memory[key] = fetch_time, text
+        self._memory_bytes += len(text)
+        while self._memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+            self._memory_bytes -= len(self._memory.popitem(last=False)[1][1])
+
+
+_session = None
+_response_cache = None
+
+
+async def initialize(cache_db=None):
+    global _session
+    global _response_cache
+    connector = aiohttp.TCPConnector(limit=_CONNECTION_LIMIT)
+    _session = aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=_REQUEST_TIMEOUT))
+    if cache_db is not None:
+        _response_cache = ResponseCache(cache_db)
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _get(url):
+    if _session is None:
+        logger.error('Request to Clist API made before initialize')
+        raise ClientError
+    try:
+        async with _session.get(url) as resp:
+            if resp.status == 429:
+                raise CallLimitExceededError(retry_after=_retry_after(resp))
+            if resp.status != 200:
+                raise ClistApiError
+            return await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # ValueError if the body of the response is not valid JSON.
+        logger.error(f'Request to Clist API encountered error: {e!r}')
+        raise ClientError from e
+
+
 async def _query_clist_api(path, data):
+    if _response_cache is None or path not in _CACHE_TTL_BY_ENDPOINT:
+        return await _fetch_clist_api(path, data)
+    return await _response_cache.query(path, data, _fetch_clist_api)
+
+
+@ratelimit
+async def _fetch_clist_api(path, data):
     url = URL_BASE + path
     clist_token = os.getenv('CLIST_API_TOKEN')
     if data is None:
@@ -76,39 +234,22 @@ async def _query_clist_api(path, data):
     else:
         url += '?'+ str(urlencode(data))
         url+='&'+clist_token
-    print("Calling Clist : "+url)
-    try:
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            if resp.status_code == 429:
-                raise CallLimitExceededError
-            else:
-                raise ClistApiError
-        return resp.json()
-    except Exception as e:
-        logger.error(f'Request to Clist API encountered error: {e!r}')
-        raise ClientError from e
+    logger.info(f'Calling Clist: {path} {data}')
+    return await _get(url)
 
 
-def _query_api():
+@ratelimit
+async def _query_api():
     clist_token = os.getenv('CLIST_API_TOKEN')
     contests_start_time = dt.datetime.utcnow() - dt.timedelta(days=2)
     contests_start_time_string = contests_start_time.strftime(
         "%Y-%m-%dT%H%%3A%M%%3A%S")
     url = URL_BASE +'/contest?limit=200&start__gte=' + \
         contests_start_time_string + '&' + clist_token
-
-    try:
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            raise ClistApiError
-        return resp.json()['objects']
-    except Exception as e:
-        logger.error(f'Request to Clist API encountered error: {e!r}')
-        raise ClientError from e
+    return (await _get(url))['objects']
 
 
-def cache(forced=False):
+async def cache(forced=False):
     
     current_time_stamp = dt.datetime.utcnow().timestamp()
     db_file = Path(constants.CONTESTS_DB_FILE_PATH)
@@ -126,7 +267,7 @@ def cache(forced=False):
             last_time_stamp < _CLIST_API_TIME_DIFFERENCE:
         return
 
-    contests = _query_api()
+    contests = await _query_api()
     db = {}
     db['querytime'] = current_time_stamp
     db['objects'] = contests
@@ -161,22 +302,39 @@ async def statistics(account_id=None, contest_id=None, order_by=None, account_id
                 ids += ','
         params['account_id__in']=ids
     if resource!=None: params['resource'] = resource
-    results = []
-    offset = 0
-    while True:
-        params['offset'] = offset
-        resp = await _query_clist_api('statistics', params)
-        if resp==None or 'objects' not in resp:
-            if offset==0:
-                raise ClientError
-            else:
+
+    # The first page tells how many results there are, the remaining pages are fetched together.
+    resp = await _query_clist_api('statistics', {**params, 'offset': 0, 'total_count': True})
+    if resp==None or 'objects' not in resp:
+        raise ClientError
+    results = resp['objects']
+    if len(results) < _STATISTICS_PAGE_SIZE:
+        return results
+    total_count = (resp.get('meta') or {}).get('total_count')
+    if total_count is None:
+        # Unknown count, fetch one page after another.
+        offset = _STATISTICS_PAGE_SIZE
+        while True:
+            resp = await _query_clist_api('statistics', {**params, 'offset': offset})
+            if resp==None or 'objects' not in resp:
                 break
-        else:
-            objects = resp['objects']
-            results += objects
-            if(len(objects)<1000):
+            results += resp['objects']
+            if len(resp['objects']) < _STATISTICS_PAGE_SIZE:
                 break
-        offset+=1000
+            offset += _STATISTICS_PAGE_SIZE
+        return results
+
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_PAGES)
+    async def fetch_page(offset):
+        async with semaphore:
+            return await _query_clist_api('statistics', {**params, 'offset': offset})
+
+    pages = await asyncio.gather(*(fetch_page(offset) for offset in
+                                   range(_STATISTICS_PAGE_SIZE, total_count, _STATISTICS_PAGE_SIZE)))
+    for resp in pages:
+        if resp==None or 'objects' not in resp:
+            break
+        results += resp['objects']
     return results
 
 class Contest(CfContest):
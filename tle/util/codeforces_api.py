@@ -1,12 +1,22 @@
+import array
 import asyncio
+import codecs
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
 import logging
+import re
+import sys
 import time
 import os
-import requests
 import functools
 from collections import namedtuple, deque
+from enum import IntEnum
 
 import aiohttp
+import numpy as np
 
 from disnake.ext import commands
 
@@ -17,6 +27,8 @@ GYM_BASE_URL = 'https://codeforces.com/gym/'
 PROFILE_BASE_URL = 'https://codeforces.com/profile/'
 ACMSGURU_BASE_URL = 'https://codeforces.com/problemsets/acmsguru/'
 GYM_ID_THRESHOLD = 100000
+# The rating of a user before their first rated contest.
+DEFAULT_RATING = 1500
 
 logger = logging.getLogger(__name__)
 
@@ -156,6 +168,310 @@ def make_from_dict(namedtuple_cls, dict_):
     return namedtuple_cls._make(field_vals)
 
 
+_PROBLEM_RESULT_TYPES = ('PRELIMINARY', 'FINAL')
+
+
+class Standings:
+    """The rows of contest standings, stored column by column in NumPy arrays instead of as one
+    `RanklistRow` per row. Handles and team names are interned in the `names` table, rows refer
+    to them by index. Optional integer fields use -1 for None.
+
+    Members of row i are `member_ids[member_offsets[i]:member_offsets[i + 1]]`, problem result
+    columns have one column per problem. `row(i)` builds the `RanklistRow` for a single row.
+    """
+
+    COLUMNS = ('rank', 'points', 'penalty', 'participant_type', 'team_id', 'team_name_id', 'ghost',
+               'room', 'start_time', 'member_offsets', 'member_ids', 'result_points',
+               'result_penalty', 'result_rejected_count', 'result_type', 'result_best_time')
+
+    def __init__(self, contest_id, names, columns):
+        self.contest_id = contest_id
+        self.names = names
+        self.rank = columns['rank']
+        self.points = columns['points']
+        self.penalty = columns['penalty']
+        self.participant_type = columns['participant_type']
+        self.team_id = columns['team_id']
+        self.team_name_id = columns['team_name_id']
+        self.ghost = columns['ghost']
+        self.room = columns['room']
+        self.start_time = columns['start_time']
+        self.member_offsets = columns['member_offsets']
+        self.member_ids = columns['member_ids']
+        self.result_points = columns['result_points']
+        self.result_penalty = columns['result_penalty']
+        self.result_rejected_count = columns['result_rejected_count']
+        self.result_type = columns['result_type']
+        self.result_best_time = columns['result_best_time']
+        self._party_keys = None
+        self._index_by_key = None
+
+    def __len__(self):
+        return len(self.rank)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def estimated_size(self):
+        """Rough number of bytes held by the standings, counting the lookup indexes built on first
+        use whether or not they have been built yet."""
+        size = sum(column.nbytes for column in self.columns().values())
+        size += sum(sys.getsizeof(name) + 8 for name in self.names)
+        # The party keys and the dict from party key to row.
+        size += 8 * len(self) + 100 * len(self)
+        return size
+
+    def columns(self):
+        """The column arrays by name, as passed to the constructor."""
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def select(self, indices):
+        """Returns the standings made of the rows at the given indices, in that order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        # The member columns are not indexed by row, they are rebuilt below.
+        columns = {name: column[indices] for name, column in self.columns().items()
+                   if name not in ('member_offsets', 'member_ids')}
+        starts = self.member_offsets[:-1][indices]
+        counts = self.member_offsets[1:][indices] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        columns['member_offsets'] = offsets
+        columns['member_ids'] = self.member_ids[positions]
+        return Standings(self.contest_id, self.names, columns)
+
+    def filter_participant_types(self, participant_types):
+        codes = [Party.PARTICIPANT_TYPES.index(type_) for type_ in participant_types]
+        return self.select(np.flatnonzero(np.isin(self.participant_type, codes)))
+
+    def participant_type_of(self, i):
+        code = self.participant_type[i]
+        return Party.PARTICIPANT_TYPES[code] if code >= 0 else None
+
+    def first_handles(self):
+        """The handle of the first member of every row."""
+        names = self.names
+        handles = [None] * len(self)
+        # Ghosts have no members.
+        rows = np.flatnonzero(self.member_offsets[1:] > self.member_offsets[:-1])
+        for i, name_id in zip(rows.tolist(), self.member_ids[self.member_offsets[rows]].tolist()):
+            handles[i] = names[name_id]
+        return handles
+
+    def has_teams(self):
+        return bool((self.team_id != -1).any())
+
+    def party_keys(self):
+        """The key identifying the party of every row: the team name for ghosts, otherwise the
+        team id for teams and the handle for individual participants."""
+        if self._party_keys is None:
+            names = self.names
+            keys = self.first_handles()
+            for i in np.flatnonzero(self.ghost).tolist():
+                name_id = self.team_name_id[i]
+                keys[i] = None if name_id == -1 else names[name_id]
+            for i in np.flatnonzero((self.team_id > 0) & ~self.ghost).tolist():
+                keys[i] = int(self.team_id[i])
+            self._party_keys = keys
+        return self._party_keys
+
+    def find(self, key):
+        """Returns the index of the row of the party with the given key, ignoring case. If
+        several rows have the same key the last one is returned."""
+        if self._index_by_key is None:
+            self._index_by_key = {key.lower() if type(key) == str else key: i
+                                  for i, key in enumerate(self.party_keys())}
+        return self._index_by_key[key.lower() if type(key) == str else key]
+
+    def row(self, i):
+        def optional(value):
+            value = int(value)
+            return None if value == -1 else value
+
+        names = self.names
+        members = [Member(names[name_id]) for name_id in
+                   self.member_ids[self.member_offsets[i]:self.member_offsets[i + 1]].tolist()]
+        party = Party(self.contest_id, members, self.participant_type_of(i),
+                      optional(self.team_id[i]),
+                      None if self.team_name_id[i] == -1 else names[self.team_name_id[i]],
+                      bool(self.ghost[i]), optional(self.room[i]), optional(self.start_time[i]))
+        problem_results = [
+            ProblemResult(float(points), optional(penalty), int(rejected_count),
+                          _PROBLEM_RESULT_TYPES[type_] if type_ >= 0 else None,
+                          optional(best_time))
+            for points, penalty, rejected_count, type_, best_time in zip(
+                self.result_points[i], self.result_penalty[i], self.result_rejected_count[i],
+                self.result_type[i], self.result_best_time[i])]
+        return RanklistRow(party, int(self.rank[i]), float(self.points[i]),
+                           optional(self.penalty[i]), problem_results)
+
+
+class _StandingsBuilder:
+    """Accumulates decoded standings rows into typed arrays."""
+
+    _TYPECODES = {'rank': 'q', 'points': 'd', 'penalty': 'q', 'participant_type': 'b',
+                  'team_id': 'q', 'team_name_id': 'q', 'ghost': 'b', 'room': 'q',
+                  'start_time': 'q', 'member_offsets': 'q', 'member_ids': 'q',
+                  'result_points': 'd', 'result_penalty': 'q', 'result_rejected_count': 'q',
+                  'result_type': 'b', 'result_best_time': 'q'}
+    _DTYPES = {'q': np.int64, 'd': np.float64, 'b': np.int8}
+
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.columns = {name: array.array(typecode) for name, typecode in self._TYPECODES.items()}
+        self.columns['member_offsets'].append(0)
+        self.num_rows = 0
+        self.participant_type_codes = {type_: code
+                                       for code, type_ in enumerate(Party.PARTICIPANT_TYPES)}
+        self.result_type_codes = {type_: code for code, type_ in enumerate(_PROBLEM_RESULT_TYPES)}
+
+    def _intern(self, name):
+        try:
+            return self.name_ids[name]
+        except KeyError:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            return name_id
+
+    def append(self, row):
+        def optional(value):
+            return -1 if value is None else value
+
+        columns = self.columns
+        party = row['party']
+        columns['rank'].append(row['rank'])
+        columns['points'].append(row['points'])
+        columns['penalty'].append(optional(row.get('penalty')))
+        columns['participant_type'].append(
+            self.participant_type_codes.get(party.get('participantType'), -1))
+        columns['team_id'].append(optional(party.get('teamId')))
+        team_name = party.get('teamName')
+        columns['team_name_id'].append(-1 if team_name is None else self._intern(team_name))
+        columns['ghost'].append(bool(party.get('ghost')))
+        columns['room'].append(optional(party.get('room')))
+        columns['start_time'].append(optional(party.get('startTimeSeconds')))
+        member_ids = columns['member_ids']
+        for member in party['members']:
+            member_ids.append(self._intern(member['handle']))
+        columns['member_offsets'].append(len(member_ids))
+        for result in row['problemResults']:
+            columns['result_points'].append(result['points'])
+            columns['result_penalty'].append(optional(result.get('penalty')))
+            columns['result_rejected_count'].append(result.get('rejectedAttemptCount', 0))
+            columns['result_type'].append(self.result_type_codes.get(result.get('type'), -1))
+            columns['result_best_time'].append(optional(result.get('bestSubmissionTimeSeconds')))
+        self.num_rows += 1
+
+    def build(self, contest_id, num_problems):
+        columns = {name: np.frombuffer(column, dtype=self._DTYPES[column.typecode])
+                   for name, column in self.columns.items()}
+        columns['ghost'] = columns['ghost'].astype(bool)
+        for name in ('result_points', 'result_penalty', 'result_rejected_count', 'result_type',
+                     'result_best_time'):
+            columns[name] = columns[name].reshape(self.num_rows, num_problems)
+        return Standings(contest_id, self.names, columns)
+
+
+class _JsonStream:
+    """Decodes a JSON document from an aiohttp stream piece by piece, so that large arrays can be
+    consumed one element at a time without holding the whole document in memory."""
+
+    _CHUNK_SIZE = 64 * 1024
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, content):
+        self.content = content
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    async def _read_more(self):
+        if self.eof:
+            raise json.JSONDecodeError('Unexpected end of data', self.buf, len(self.buf))
+        chunk = await self.content.read(self._CHUNK_SIZE)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    async def _next_char(self):
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            self.pos = self._WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            await self._read_more()
+
+    async def _expect(self, chars):
+        char = await self._next_char()
+        if char not in chars:
+            raise json.JSONDecodeError(f'Expected one of {chars!r}', self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    async def value(self):
+        """Decodes the next complete value."""
+        await self._next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                await self._read_more()
+                continue
+            if end == len(self.buf) and not self.eof:
+                # A number at the end of the buffer may continue in the next chunk.
+                await self._read_more()
+                continue
+            self.pos = end
+            return value
+
+    async def object_keys(self):
+        """Iterates over the keys of the next object. The value of every key must be consumed
+        before moving on to the next key."""
+        await self._expect('{')
+        if await self._next_char() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = await self.value()
+            await self._expect(':')
+            yield key
+            if await self._expect(',}') == '}':
+                return
+
+    async def array_items(self):
+        """Iterates over the elements of the next array, decoding one element at a time."""
+        await self._expect('[')
+        if await self._next_char() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield await self.value()
+            if await self._expect(',]') == ']':
+                return
+
+
+async def _decode_standings(content):
+    stream = _JsonStream(content)
+    builder = _StandingsBuilder()
+    result = {}
+    async for key in stream.object_keys():
+        if key != 'result':
+            await stream.value()
+            continue
+        async for result_key in stream.object_keys():
+            if result_key == 'rows':
+                async for row in stream.array_items():
+                    builder.append(row)
+            else:
+                result[result_key] = await stream.value()
+    return result, builder
+
+
 # Error classes
 
 class CodeforcesApiError(commands.CommandError):
@@ -204,6 +520,127 @@ class RatingChangesUnavailableError(TrueApiError):
         super().__init__(comment, f'Rating changes unavailable for contest with ID `{contest_id}`')
 
 
+# Request scheduling
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# Codeforces documents a limit of one API call per two seconds. A small burst is allowed on top of
+# that, a CallLimitExceededError is still retried by cf_ratelimit if we do hit the limit.
+_CALLS_PER_SECOND = 0.5
+_BURST_SIZE = 3
+_MAX_IN_FLIGHT = 4
+# One token of the bucket and one request in flight are kept for interactive requests, so that a
+# command is not stuck behind background traffic which has used up the bucket.
+_INTERACTIVE_RESERVE = 1
+
+_request_priority = contextvars.ContextVar('cf_request_priority', default=Priority.INTERACTIVE)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Context manager that sets the priority of API requests made within it, including those made
+    by tasks created within it."""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class RequestScheduler:
+    """Hands out slots to make API requests. The call rate is limited by a token bucket, waiting
+    requests are served in order of priority and the number of requests in flight is bounded.
+    Requests below `Priority.INTERACTIVE` may not use the last `reserve` tokens of the bucket or
+    the last `reserve` requests in flight, which are left for interactive requests."""
+
+    def __init__(self, rate, burst, max_in_flight, reserve=0):
+        if not 0 <= reserve < min(burst, max_in_flight):
+            raise ValueError('The reserve must leave room for background requests')
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.reserve = reserve
+        self.in_flight = 0
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._waiting = []  # Heap of (priority, sequence number, future).
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority=Priority.INTERACTIVE):
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def throttle(self):
+        """Empty the token bucket, for when the API reports that the call limit was exceeded."""
+        self._refill()
+        self._tokens = min(self._tokens, 0)
+
+    async def _acquire(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted right as we got cancelled, give it back.
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wakeup.set()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            # Requests cancelled while waiting are dropped.
+            while self._waiting and self._waiting[0][2].done():
+                heapq.heappop(self._waiting)
+            if not self._waiting:
+                await self._wakeup.wait()
+                continue
+            priority = self._waiting[0][0]
+            reserve = 0 if priority == Priority.INTERACTIVE else self.reserve
+            if self.in_flight >= self.max_in_flight - reserve:
+                await self._wakeup.wait()
+                continue
+            self._refill()
+            if self._tokens < 1 + reserve:
+                # Woken up early if an interactive request comes in meanwhile.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(),
+                                           (1 + reserve - self._tokens) / self.rate)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            self._tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+
+_scheduler = RequestScheduler(_CALLS_PER_SECOND, _BURST_SIZE, _MAX_IN_FLIGHT,
+                              _INTERACTIVE_RESERVE)
+
+
 # Codeforces API query methods
 
 _session = None
@@ -240,25 +677,36 @@ def cf_ratelimit(f):
 
 
 @cf_ratelimit
-async def _query_api(path, data=None):
+async def _query_api(path, data=None, *, decode=None):
+    """Queries the API and returns the result. If `decode` is given, the body of a successful
+    response is streamed to `decode(content)` instead of being loaded as a whole."""
     url = API_BASE_URL + path
-    try:
-        logger.info(f'Querying CF API at {url} with {data}')
-        # Explicitly state encoding (though aiohttp accepts gzip by default)
-        headers = {'Accept-Encoding': 'gzip'}
-        async with _session.post(url, data=data, headers=headers) as resp:
-            try:
-                respjson = await resp.json()
-            except aiohttp.ContentTypeError:
-                raise CodeforcesApiError
-            if resp.status == 200:
-                return respjson['result']
-            comment = f'HTTP Error {resp.status}, {respjson.get("comment")}'
-    except aiohttp.ClientError as e:
-        logger.error(f'Request to CF API encountered error: {e!r}')
-        raise ClientError from e
+    async with _scheduler.slot(_request_priority.get()):
+        try:
+            logger.info(f'Querying CF API at {url} with {data}')
+            # Explicitly state encoding (though aiohttp accepts gzip by default)
+            headers = {'Accept-Encoding': 'gzip'}
+            async with _session.post(url, data=data, headers=headers) as resp:
+                if decode is not None and resp.status == 200:
+                    if resp.content_type != 'application/json':
+                        raise CodeforcesApiError
+                    try:
+                        return await decode(resp.content)
+                    except (ValueError, KeyError) as e:
+                        raise CodeforcesApiError from e
+                try:
+                    respjson = await resp.json()
+                except aiohttp.ContentTypeError:
+                    raise CodeforcesApiError
+                if resp.status == 200:
+                    return respjson['result']
+                comment = f'HTTP Error {resp.status}, {respjson.get("comment")}'
+        except aiohttp.ClientError as e:
+            logger.error(f'Request to CF API encountered error: {e!r}')
+            raise ClientError from e
     logger.warning(f'Query to CF API failed: {comment}')
     if 'limit exceeded' in comment:
+        _scheduler.throttle()
         raise CallLimitExceededError(comment)
     raise TrueApiError(comment)
 
@@ -284,10 +732,10 @@ def proxy_ratelimit(f):
 async def _query_proxy(url):
     try:
         logger.info(f'Querying RatingList from Proxy API.')
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            raise CodeforcesApiError
-        resp = resp.json()
+        async with _session.get(url) as resp:
+            if resp.status != 200:
+                raise CodeforcesApiError
+            resp = await resp.json(content_type=None)
         logger.info(f'Fetched RatingList from Proxy API.')
         return {user_dict['handle']: user_dict['rating'] for user_dict in resp}
     except Exception as e:
@@ -332,21 +780,16 @@ class contest:
         if show_unofficial is not None:
             params['showUnofficial'] = _bool_to_str(show_unofficial)
         try:
-            resp = await _query_api('contest.standings', params)
+            # The rows are decoded as they arrive, straight into columnar storage.
+            resp, builder = await _query_api('contest.standings', params,
+                                             decode=_decode_standings)
         except TrueApiError as e:
             if 'not found' in e.comment:
                 raise ContestNotFoundError(e.comment, contest_id)
             raise
         contest_ = make_from_dict(Contest, resp['contest'])
         problems = [make_from_dict(Problem, problem_dict) for problem_dict in resp['problems']]
-        for row in resp['rows']:
-            row['party']['members'] = [make_from_dict(Member, member)
-                                       for member in row['party']['members']]
-            row['party'] = make_from_dict(Party, row['party'])
-            row['problemResults'] = [make_from_dict(ProblemResult, problem_result)
-                                     for problem_result in row['problemResults']]
-        ranklist = [make_from_dict(RanklistRow, row_dict) for row_dict in resp['rows']]
-        return contest_, problems, ranklist
+        return contest_, problems, builder.build(contest_.id, len(problems))
 
 
 class problemset:
@@ -471,29 +914,52 @@ class user:
         return [make_from_dict(Submission, submission_dict) for submission_dict in resp]
 
 
+async def _bisect_user_info(handles, failed=False):
+    """Returns the (handle, user) pairs of the handles which are found, and the handles which are
+    not. Every failed query reveals one missing handle. A chunk failing again without it is split
+    in halves, so that many missing handles take about logarithmically many queries each rather
+    than a query of the whole chunk each. `failed` tells if the handles are what is left of a
+    failed query.
+    """
+    if not handles:
+        return [], []
+    try:
+        return list(zip(handles, await user.info(handles=handles))), []
+    except HandleNotFoundError as e:
+        missing = e.handle
+        rest = [handle for handle in handles if handle.lower() != missing.lower()]
+        if len(rest) == len(handles):
+            # Not one of the handles asked for, retrying would not help.
+            raise
+    if not failed or len(rest) <= 1:
+        found, not_found = await _bisect_user_info(rest, failed=True)
+    else:
+        mid = len(rest) // 2
+        results = await asyncio.gather(_bisect_user_info(rest[:mid]),
+                                       _bisect_user_info(rest[mid:]))
+        found = [pair for found, _ in results for pair in found]
+        not_found = [handle for _, not_found in results for handle in not_found]
+    missing = [handle for handle in handles if handle.lower() == missing.lower()]
+    return found, missing + not_found
+
+
 async def _needs_fixing(handles):
     to_fix = []
-    chunks = user_info_chunkify(handles)
-    for handle_chunk in chunks:
-        while handle_chunk:
-            try:
-                cf_users = await user.info(handles=handle_chunk)
-
-                # Users could still have changed capitalization
-                for handle, cf_user in zip(handle_chunk, cf_users):
-                    assert handle.lower() == cf_user.handle.lower()
-                    if handle != cf_user.handle:
-                        to_fix.append(handle)
-                break
-            except HandleNotFoundError as e:
-                to_fix.append(e.handle)
-                handle_chunk.remove(e.handle)
+    results = await asyncio.gather(*(_bisect_user_info(handle_chunk)
+                                     for handle_chunk in user_info_chunkify(handles)))
+    for found, not_found in results:
+        to_fix += not_found
+        # Users could still have changed capitalization
+        for handle, cf_user in found:
+            assert handle.lower() == cf_user.handle.lower()
+            if handle != cf_user.handle:
+                to_fix.append(handle)
     return to_fix
 
 
 async def _resolve_redirect(handle):
     url = 'http://codeforces.com/profile/' + handle
-    async with _session.head(url) as r:
+    async with _scheduler.slot(_request_priority.get()), _session.head(url) as r:
         if r.status == 200:
             return handle
         if r.status == 302:
@@ -507,16 +973,16 @@ async def _resolve_redirect(handle):
 
 
 async def _resolve_handle_mapping(handles_to_fix):
-    redirections = {}
-    failed = []
-    for handle in handles_to_fix:
-        new_handle = await _resolve_redirect(handle)
-        if not new_handle:
-            redirections[handle] = None
-        else:
-            cf_user, = await user.info(handles=[new_handle])
-            redirections[handle] = cf_user
-    return redirections
+    new_handles = await asyncio.gather(*(_resolve_redirect(handle) for handle in handles_to_fix))
+    new_handle_by_handle = {handle: new_handle
+                            for handle, new_handle in zip(handles_to_fix, new_handles) if new_handle}
+    results = await asyncio.gather(
+        *(_bisect_user_info(handle_chunk) for handle_chunk in
+          user_info_chunkify(list(set(new_handle_by_handle.values())))))
+    user_by_new_handle = {new_handle: cf_user
+                          for found, _ in results for new_handle, cf_user in found}
+    return {handle: user_by_new_handle.get(new_handle_by_handle.get(handle))
+            for handle in handles_to_fix}
 
 
 async def resolve_redirects(handles):
@@ -1,3 +1,4 @@
+import asyncio
 import functools
 import json
 import logging
@@ -14,6 +15,7 @@ from tle import constants
 from tle.util import cache_system2
 from tle.util import codeforces_api as cf
 from tle.util import clist_api as clist
+from tle.util import compute
 from tle.util import db
 from tle.util import events
 
@@ -29,17 +31,33 @@ cache2 = None
 event_sys = events.EventSystem()
 
 _contest_id_to_writers_map = None
+_writer_to_contest_ids_map = None
 
 _initialize_done = False
+_initialized = None
 
 active_groups = defaultdict(set)
 
 
+def _initialized_event():
+    # Created on first use, inside the running event loop.
+    global _initialized
+    if _initialized is None:
+        _initialized = asyncio.Event()
+    return _initialized
+
+
+async def wait_for_initialize():
+    """Wait until `initialize` is done. The on_ready listeners of cogs may run before it is."""
+    await _initialized_event().wait()
+
+
 async def initialize(nodb):
     global cache2
     global user_db
     global event_sys
     global _contest_id_to_writers_map
+    global _writer_to_contest_ids_map
     global _initialize_done
 
     if _initialize_done:
@@ -52,22 +70,38 @@ async def initialize(nodb):
     if nodb:
         user_db = db.DummyUserDbConn()
     else:
-        user_db = db.UserDbConn(constants.USER_DB_FILE_PATH)
-    
-    cache_db = db.CacheDbConn(constants.CACHE_DB_FILE_PATH)
-
-    cache2 = cache_system2.CacheSystem(cache_db)
+        user_db = db.AsyncDbConn(db.UserDbConn, constants.USER_DB_FILE_PATH)
+        await user_db.open()
+
+    cache_db = db.AsyncDbConn(db.CacheDbConn, constants.CACHE_DB_FILE_PATH)
+    await cache_db.open()
+    clist_cache_db = db.AsyncDbConn(db.ClistCacheDbConn, constants.CLIST_CACHE_DB_FILE_PATH)
+    await clist_cache_db.open()
+    await clist.initialize(clist_cache_db)
+    submission_cache_db = db.AsyncDbConn(db.SubmissionCacheDbConn,
+                                         constants.SUBMISSION_CACHE_DB_FILE_PATH)
+    await submission_cache_db.open()
+
+    cache2 = cache_system2.CacheSystem(cache_db, submission_cache_db)
     await cache2.run()
 
+    # Last, spawning the workers takes a few seconds.
+    await compute.initialize()
+
     try:
         with open(constants.CONTEST_WRITERS_JSON_FILE_PATH) as f:
             data = json.load(f)
         _contest_id_to_writers_map = {contest['id']: [s.lower() for s in contest['writers']] for contest in data}
+        _writer_to_contest_ids_map = defaultdict(set)
+        for contest_id, writers in _contest_id_to_writers_map.items():
+            for writer in writers:
+                _writer_to_contest_ids_map[writer].add(contest_id)
         logger.info('Contest writers loaded from JSON file')
     except FileNotFoundError:
         logger.warning('JSON file containing contest writers not found')
 
     _initialize_done = True
+    _initialized_event().set()
 
 
 # algmyr's guard idea:
@@ -101,6 +135,13 @@ def is_contest_writer(contest_id, handle):
     return writers and handle.lower() in writers
 
 
+def get_contests_written_by(handles):
+    """Returns the ids of the contests of which any of the given handles is a writer."""
+    if _writer_to_contest_ids_map is None:
+        return set()
+    return set().union(*(_writer_to_contest_ids_map.get(handle.lower(), ()) for handle in handles))
+
+
 _NONSTANDARD_CONTEST_INDICATORS = [
     'wild', 'fools', 'surprise', 'unknown', 'friday', 'q#', 'testing',
     'marathon', 'kotlin', 'onsite', 'experimental', 'abbyy']
@@ -125,7 +166,8 @@ async def get_visited_contests(handles : [str]):
     """ Returns a set of contest ids of contests that any of the given handles
         has at least one non-CE submission.
     """
-    user_submissions = [await cf.user.status(handle=handle) for handle in handles]
+    user_submissions = await asyncio.gather(*(cache2.submission_cache.get_submissions(handle)
+                                              for handle in handles))
     problem_to_contests = cache2.problemset_cache.problem_to_contests
 
     contest_ids = []
@@ -257,11 +299,11 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
         handles.remove('+server')
         if resource=='codeforces.com':
             guild_handles = {handle for discord_id, handle
-                                in user_db.get_handles_for_guild(inter.guild.id)}
+                                in await user_db.get_handles_for_guild(inter.guild.id)}
             handles.update(guild_handles)
         else:
             guild_account_ids = {account_id for user_id, account_id, handle 
-            in user_db.get_account_ids_for_resource(inter.guild.id, resource=resource)}
+            in await user_db.get_account_ids_for_resource(inter.guild.id, resource=resource)}
             account_ids.update(guild_account_ids)
     if len(account_ids)==0 and (len(handles) < mincnt or (maxcnt and maxcnt < len(handles))):
         raise HandleCountOutOfBoundsError(mincnt, maxcnt)
@@ -276,20 +318,20 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             for member in inter.guild.members:
                 if role in member.roles:
                     if resource=='codeforces.com':
-                        handle = user_db.get_handle(member.id, inter.guild.id)
+                        handle = await user_db.get_handle(member.id, inter.guild.id)
                         if handle is not None:
                             resolved_handles.add(handle)
                     else:
-                        account_id = user_db.get_account_id(member.id, inter.guild.id, resource=resource)
+                        account_id = await user_db.get_account_id(member.id, inter.guild.id, resource=resource)
                         if account_id is not None:
                             account_ids.add(account_id)
         elif handle.startswith('+'):
             list_name = handle[1:]
             if resource=='codeforces.com':
-                list_handles = set(user_db.get_list_handles(list_name=list_name, resource=resource))
+                list_handles = set(await user_db.get_list_handles(list_name=list_name, resource=resource))
                 resolved_handles.update(list_handles)
             else:
-                list_account_ids = set(user_db.get_list_account_ids(list_name=list_name, resource=resource))
+                list_account_ids = set(await user_db.get_list_account_ids(list_name=list_name, resource=resource))
                 account_ids.update(list_account_ids)
         elif handle.startswith('!'):
             # ! denotes Discord user
@@ -299,12 +341,12 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             except commands.errors.CommandError:
                 raise FindMemberFailedError(member_identifier)
             if resource=='codeforces.com':
-                handle = user_db.get_handle(member.id, inter.guild.id)
+                handle = await user_db.get_handle(member.id, inter.guild.id)
                 if handle is None:
                     raise HandleNotRegisteredError(member)
                 resolved_handles.add(handle)
             else:
-                account_id = user_db.get_account_id(member.id, inter.guild.id, resource=resource)
+                account_id = await user_db.get_account_id(member.id, inter.guild.id, resource=resource)
                 if account_id is None:
                     raise HandleNotRegisteredError(member, resource=resource)
                 else:
@@ -313,7 +355,7 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             if resource=='codeforces.com':
                 resolved_handles.add(handle)
             else:
-                account_id = user_db.get_account_id_from_handle(handle=handle, resource=resource)
+                account_id = await user_db.get_account_id_from_handle(handle=handle, resource=resource)
                 if account_id is None:
                     resolved_handles.add(handle)
                 else:
@@ -330,10 +372,10 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
                     account_ids.add(int(user['id']))
         return list(account_ids)
 
-def members_to_handles(members: [disnake.Member], guild_id):
+async def members_to_handles(members: [disnake.Member], guild_id):
     handles = []
     for member in members:
-        handle = user_db.get_handle(member.id, guild_id)
+        handle = await user_db.get_handle(member.id, guild_id)
         if handle is None:
             raise HandleNotRegisteredError(member)
         handles.append(handle)
@@ -378,6 +420,7 @@ class SubFilter:
         self.notags = []
         self.contests = []
         self.indices = []
+        self._compiled = None
 
     def parse(self, args):
         args = list(set(args))
@@ -422,6 +465,7 @@ class SubFilter:
                 rest.append(arg)
 
         self.types = self.types or ['CONTESTANT', 'OUT_OF_COMPETITION', 'VIRTUAL', 'PRACTICE']
+        self._compile()
         return rest
 
     @staticmethod
@@ -429,45 +473,92 @@ class SubFilter:
         """Filters and keeps only solved submissions. If a problem is solved multiple times the first
         accepted submission is kept. The unique id for a problem is (problem name, contest start time).
         """
-        submissions.sort(key=lambda sub: sub.creationTimeSeconds)
+        accepted = [sub for sub in submissions if sub.verdict == 'OK']
+        accepted.sort(key=lambda sub: sub.creationTimeSeconds)
+        contest_by_id = cache2.contest_cache.contest_by_id
         problems = set()
         solved_subs = []
 
-        for submission in submissions:
+        for submission in accepted:
             problem = submission.problem
-            contest = cache2.contest_cache.contest_by_id.get(problem.contestId, None)
-            if submission.verdict == 'OK':
-                # Assume (name, contest start time) is a unique identifier for problems
-                problem_key = (problem.name, contest.startTimeSeconds if contest else 0)
-                if problem_key not in problems:
-                    solved_subs.append(submission)
-                    problems.add(problem_key)
+            contest = contest_by_id.get(problem.contestId)
+            # Assume (name, contest start time) is a unique identifier for problems
+            problem_key = (problem.name, contest.startTimeSeconds if contest else 0)
+            if problem_key not in problems:
+                solved_subs.append(submission)
+                problems.add(problem_key)
         return solved_subs
 
+    def _settings(self):
+        return (self.team, self.rated, self.dlo, self.dhi, self.rlo, self.rhi, tuple(self.types),
+                tuple(self.tags), tuple(self.notags), tuple(self.contests), tuple(self.indices))
+
+    def _contest_facts(self, contest_id):
+        """Returns whether problems of the contest may pass the filter, and whether they must
+        also be checked for the *special tag."""
+        contest = cache2.contest_cache.contest_by_id.get(contest_id)
+        if self.contests and not (contest and contest.matches(self.contests)):
+            return False, False
+        if self.rated:
+            ok = (contest is not None and contest.id < cf.GYM_ID_THRESHOLD and
+                  not is_nonstandard_contest(contest))
+            return ok, ok
+        # acmsguru and gym allowed
+        if not contest or contest.id >= cf.GYM_ID_THRESHOLD:
+            return True, False
+        ok = not is_nonstandard_contest(contest)
+        return ok, ok
+
+    def _compile(self):
+        """Returns the checks of the filter as a list of predicates, cheapest and most selective
+        first. Checks that let every submission pass are left out."""
+        settings = self._settings()
+        if self._compiled is not None and self._compiled[0] == settings:
+            return self._compiled[1]
+
+        facts_by_contest = {}
+
+        def contest_facts(contest_id):
+            try:
+                return facts_by_contest[contest_id]
+            except KeyError:
+                facts = facts_by_contest[contest_id] = self._contest_facts(contest_id)
+                return facts
+
+        checks = []
+        dlo, dhi = self.dlo, self.dhi
+        if dlo > 0 or dhi < 10**10:
+            checks.append(lambda sub: dlo <= sub.creationTimeSeconds < dhi)
+        types = frozenset(self.types)
+        if not types.issuperset(cf.Party.PARTICIPANT_TYPES):
+            checks.append(lambda sub: sub.author.participantType in types)
+        if not self.team:
+            checks.append(lambda sub: len(sub.author.members) == 1)
+        checks.append(lambda sub: contest_facts(sub.problem.contestId)[0])
+        if self.rated:
+            rlo, rhi = self.rlo, self.rhi
+            checks.append(lambda sub: sub.problem.rating and rlo <= sub.problem.rating <= rhi)
+        if self.indices:
+            indices = frozenset(index.lower() for index in self.indices)
+            checks.append(lambda sub: sub.problem.index.lower() in indices)
+        checks.append(lambda sub: (not contest_facts(sub.problem.contestId)[1] or
+                                   not any('*special' in tag for tag in sub.problem.tags)))
+        if self.tags:
+            tags = self.tags
+            checks.append(lambda sub: sub.problem.tag_matches(tags))
+        if self.notags:
+            notags = self.notags
+            checks.append(lambda sub: sub.problem.tag_matches_or(notags) is None)
+
+        self._compiled = settings, checks
+        return checks
+
     def filter_subs(self, submissions):
         submissions = SubFilter.filter_solved(submissions)
-        filtered_subs = []
-        for submission in submissions:
-            problem = submission.problem
-            contest = cache2.contest_cache.contest_by_id.get(problem.contestId, None)
-            type_ok = submission.author.participantType in self.types
-            date_ok = self.dlo <= submission.creationTimeSeconds < self.dhi
-            tag_ok = not self.tags or problem.tag_matches(self.tags)
-            notag_ok = not self.notags or problem.tag_matches_or(self.notags) == None
-            index_ok = not self.indices or any(index.lower() == problem.index.lower() for index in self.indices)
-            contest_ok = not self.contests or (contest and contest.matches(self.contests))
-            team_ok = self.team or len(submission.author.members) == 1
-            if self.rated:
-                problem_ok = contest and contest.id < cf.GYM_ID_THRESHOLD and not is_nonstandard_problem(problem)
-                rating_ok = problem.rating and self.rlo <= problem.rating <= self.rhi
-            else:
-                # acmsguru and gym allowed
-                problem_ok = (not contest or contest.id >= cf.GYM_ID_THRESHOLD
-                              or not is_nonstandard_problem(problem))
-                rating_ok = True
-            if type_ok and date_ok and rating_ok and tag_ok and notag_ok and team_ok and problem_ok and contest_ok and index_ok:
-                filtered_subs.append(submission)
-        return filtered_subs
+        # Each check only looks at the submissions that passed the ones before.
+        for check in self._compile():
+            submissions = [sub for sub in submissions if check(sub)]
+        return submissions
 
     def filter_rating_changes(self, rating_changes):
         rating_changes = [change for change in rating_changes
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from disnake.ext import commands
+
+_WORKERS = 2
+_MAX_PENDING = 16
+_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+
+class ComputeError(commands.CommandError):
+    pass
+
+
+class ComputeBusyError(ComputeError):
+    def __init__(self):
+        super().__init__('The bot is busy with other heavy commands, please try again later.')
+
+
+class ComputeTimeoutError(ComputeError):
+    def __init__(self, timeout):
+        super().__init__(f'The command took longer than {timeout} seconds and was abandoned.')
+        self.timeout = timeout
+
+
+class ComputeWorkerError(ComputeError):
+    def __init__(self):
+        super().__init__('A worker for heavy commands crashed, please try again.')
+
+
+def _warm_up():
+    # Runs once in every worker, so that the first jobs do not pay for these imports.
+    from tle.util import graph_common as gc
+    gc.setup_style()
+    import pandas  # noqa: F401
+
+
+def _ping():
+    pass
+
+
+class ComputeExecutor:
+    """Runs CPU heavy jobs in a pool of worker processes, so that they do not hold up the event
+    loop and with it every shard of the bot. A job is a module level function taking and returning
+    plain picklable data, such as arrays to plot and the PNG bytes of the plot.
+
+    At most `max_pending` jobs may be queued or running at a time, beyond that new jobs are
+    refused. A job that outlives its timeout is abandoned by its caller, but keeps its worker and
+    its place in the queue until it finishes. If a worker dies, e.g. killed for running out of
+    memory, the pool is replaced and the jobs it held fail.
+    """
+
+    def __init__(self, *, workers=_WORKERS, max_pending=_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool = None
+
+    async def start(self):
+        self._pool = self._new_pool()
+        # Start every worker now instead of on the first jobs.
+        await asyncio.gather(*(self.submit(_ping) for _ in range(self.workers)))
+        logger.info(f'Compute executor started with {self.workers} workers')
+
+    def _new_pool(self):
+        # Workers are spawned rather than forked from a process running threads and an event
+        # loop.
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_warm_up)
+
+    def _replace_broken_pool(self, pool):
+        # Every job of a broken pool fails at once, only the first one replaces it.
+        if self._pool is not pool:
+            return
+        logger.warning('Compute pool broken, starting a new one')
+        pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+    async def submit(self, func, *args, timeout=_TIMEOUT):
+        """Run `func(*args)` in a worker and return the result."""
+        if self.pending >= self.max_pending:
+            raise ComputeBusyError()
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            future = pool.submit(func, *args)
+        except BrokenProcessPool:
+            self._replace_broken_pool(pool)
+            raise ComputeWorkerError()
+        self.pending += 1
+        # Done callbacks are called from a thread of the pool.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._job_done))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f'Compute job {func.__name__} timed out after {timeout} seconds')
+            raise ComputeTimeoutError(timeout)
+        except BrokenProcessPool:
+            logger.warning(f'Compute job {func.__name__} lost its worker')
+            self._replace_broken_pool(pool)
+            raise ComputeWorkerError()
+
+    def _job_done(self):
+        self.pending -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+
+
+async def initialize():
+    global _executor
+    _executor = ComputeExecutor()
+    await _executor.start()
+
+
+async def submit(func, *args, timeout=_TIMEOUT):
+    """Run `func(*args)` on the compute executor and return the result."""
+    if _executor is None:
+        # Not running in the bot, e.g. from a script.
+        return func(*args)
+    return await _executor.submit(func, *args, timeout=timeout)
@@ -1,2 +1,5 @@
 from .cache_db_conn import *
 from .user_db_conn import *
+from .clist_cache_db_conn import *
+from .submission_cache_db_conn import *
+from .async_db_conn import *
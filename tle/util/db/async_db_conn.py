@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import pathname2url
+
+_READERS = 3
+
+# Methods of the connection classes whose names start with these only read from the database.
+_READ_ONLY_PREFIXES = ('get_', 'fetch_', 'has_', 'check_', 'is_', 'problemset_empty',
+                       'howgud', 'gitlog')
+
+
+def is_read_only(method_name):
+    return method_name.startswith(_READ_ONLY_PREFIXES)
+
+
+def connect_read_only(db_file):
+    """A plain connection to an existing database which can only read."""
+    return sqlite3.connect(f'file:{pathname2url(os.path.abspath(db_file))}?mode=ro', uri=True)
+
+
+class AsyncDbConn:
+    """Async facade over a database connection class such as `UserDbConn` or `CacheDbConn`.
+
+    The database is opened in WAL mode. Every method of the wrapped class is exposed as a coroutine
+    function. Methods that write are run by one dedicated writer thread, which owns the only
+    connection that writes. Read-only methods are spread over a pool of reader threads, each
+    with its own read-only connection from `conn_cls.read_only`, so that long reads neither block
+    the event loop nor wait on writes.
+
+    Consecutive calls may run on different connections, so a write that depends on what was just
+    read must be one method of the connection class, which the writer runs as a whole.
+    """
+
+    def __init__(self, conn_cls, db_file, *, readers=_READERS):
+        self.conn_cls = conn_cls
+        self.db_file = db_file
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._reader_executor = ThreadPoolExecutor(max_workers=readers,
+                                                   thread_name_prefix='db-reader')
+        self._reader_local = threading.local()
+        self._writer = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def open(self):
+        """Open the writer connection. Must be called before the facade is used."""
+        loop = asyncio.get_running_loop()
+        self._writer = await loop.run_in_executor(self._writer_executor, self._open_writer)
+        uploader = getattr(self._writer, 'uploader', None)
+        if uploader is not None:
+            # Snapshots for uploads must be taken by the thread owning the connection.
+            uploader.bind(loop, self._writer_executor)
+
+    def _open_writer(self):
+        conn = self.conn_cls(self.db_file)
+        conn.conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _reader(self):
+        try:
+            return self._reader_local.conn
+        except AttributeError:
+            # Opened after the writer, so the tables exist and WAL mode is set.
+            conn = self._reader_local.conn = self.conn_cls.read_only(self.db_file)
+            return conn
+
+    @staticmethod
+    def _call(conn, name, args, kwargs):
+        result = getattr(conn, name)(*args, **kwargs)
+        if isinstance(result, types.GeneratorType):
+            # Cursors may not leave the thread that owns the connection.
+            result = list(result)
+        return result
+
+    async def read(self, name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._reader_executor,
+            lambda: self._call(self._reader(), name, args, kwargs))
+
+    async def write(self, name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._writer_executor,
+            lambda: self._call(self._writer, name, args, kwargs))
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not callable(getattr(self.conn_cls, name, None)):
+            raise AttributeError(name)
+        method = self.read if is_read_only(name) else self.write
+        return functools.partial(method, name)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer_executor, self._writer.close)
+        self._writer_executor.shutdown()
+        self._reader_executor.shutdown()
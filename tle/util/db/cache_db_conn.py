@@ -4,25 +4,42 @@ import sqlite3
 from tle.util import codeforces_api as cf
 
 from os import environ
-from tle import constants
 from firebase_admin import storage
+from tle.util.db.snapshot_uploader import SnapshotUploader
+from tle.util.db.async_db_conn import connect_read_only
 
 bucket = None
 STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
 if STORAGE_BUCKET!='None':
     bucket = storage.bucket()
 
+# Stays below SQLite's limit on the number of parameters in a query.
+_MAX_PARAMS_PER_QUERY = 500
+
+
+def _chunks(items):
+    items = list(items)
+    return [items[i:i + _MAX_PARAMS_PER_QUERY]
+            for i in range(0, len(items), _MAX_PARAMS_PER_QUERY)]
+
+
 class CacheDbConn:
     def __init__(self, db_file):
         self.conn = sqlite3.connect(db_file)
+        self.uploader = SnapshotUploader(self.conn, bucket, 'tle_cache.db')
         self.create_tables()
 
+    @classmethod
+    def read_only(cls, db_file):
+        """A connection for the read-only methods only, which neither creates the tables nor
+        uploads."""
+        self = cls.__new__(cls)
+        self.conn = connect_read_only(db_file)
+        return self
+
     # update the data in firebase
     def update(self):
-        if bucket==None:
-            return
-        blob = bucket.blob('tle_cache.db')
-        blob.upload_from_filename(constants.CACHE_DB_FILE_PATH)
+        self.uploader.mark_dirty()
 
     def create_tables(self):
         # Table for contests from the contest.list endpoint.
@@ -54,22 +71,80 @@ class CacheDbConn:
             ')'
         )
 
+        # Every handle appearing in table rating_change, with a stable integer id that other tables
+        # refer to instead of repeating the handle. Handles are unique ignoring case, the stored
+        # casing is the latest seen.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS handle ('
+            'id      INTEGER PRIMARY KEY,'
+            'handle  TEXT NOT NULL COLLATE NOCASE UNIQUE'
+            ')'
+        )
+
         # Table for rating changes fetched from contest.ratingChanges endpoint for every contest.
+        rating_change_columns = [column for _, column, *_
+                                 in self.conn.execute('PRAGMA table_info(rating_change)')]
+        migrate = 'handle' in rating_change_columns
+        if migrate:
+            # Database from before handles were interned. It is migrated in one transaction, so
+            # that an interrupted migration leaves it as it was.
+            self.conn.execute('BEGIN')
+            self.conn.execute('ALTER TABLE rating_change RENAME TO rating_change_with_handle')
+            self.conn.execute('DROP INDEX IF EXISTS ix_rating_change_handle')
+            self.conn.execute('DROP TABLE IF EXISTS handle_latest_rating')
         self.conn.execute(
             'CREATE TABLE IF NOT EXISTS rating_change ('
             'contest_id           INTEGER NOT NULL,'
-            'handle               TEXT NOT NULL,'
+            'handle_id            INTEGER NOT NULL,'
             'rank                 INTEGER,'
             'rating_update_time   INTEGER,'
             'old_rating           INTEGER,'
             'new_rating           INTEGER,'
-            'UNIQUE (contest_id, handle)'
+            'UNIQUE (contest_id, handle_id)'
             ')'
         )
+        if migrate:
+            self.conn.execute('INSERT OR IGNORE INTO handle (handle) '
+                              'SELECT DISTINCT handle FROM rating_change_with_handle')
+            self.conn.execute('INSERT OR REPLACE INTO rating_change '
+                              '(contest_id, handle_id, rank, rating_update_time, old_rating, '
+                              'new_rating) '
+                              'SELECT contest_id, h.id, rank, rating_update_time, old_rating, '
+                              'new_rating '
+                              'FROM rating_change_with_handle r '
+                              'JOIN handle h ON h.handle = r.handle')
+            self.conn.execute('DROP TABLE rating_change_with_handle')
+            self.conn.commit()
         self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_contest_id '
                           'ON rating_change (contest_id)')
-        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_handle '
-                          'ON rating_change (handle)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_handle_id '
+                          'ON rating_change (handle_id)')
+
+        # The rating of every handle after its latest rating change, kept in sync with table
+        # rating_change so that current ratings can be loaded without scanning every change.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS handle_latest_rating ('
+            'handle_id           INTEGER NOT NULL,'
+            'rating              INTEGER,'
+            'rating_update_time  INTEGER,'
+            'PRIMARY KEY (handle_id)'
+            ')'
+        )
+        if (self.conn.execute('SELECT 1 FROM handle_latest_rating').fetchone() is None and
+                self.conn.execute('SELECT 1 FROM rating_change').fetchone() is not None):
+            # Database from before the table existed.
+            self._rebuild_latest_ratings()
+            self.conn.commit()
+
+        # Contests to be processed by the running backfill of rating changes, if any. A contest is
+        # marked as fetched in the same transaction that saves its rating changes.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS rating_change_backfill ('
+            'contest_id  INTEGER NOT NULL,'
+            'fetched     INTEGER NOT NULL DEFAULT 0,'
+            'PRIMARY KEY (contest_id)'
+            ')'
+        )
 
         # Table for problems fetched from contest.standings endpoint for every contest.
         # This is separate from table problem as it contains the same problem twice if it
@@ -90,6 +165,12 @@ class CacheDbConn:
         self.conn.execute('CREATE INDEX IF NOT EXISTS ix_problem2_contest_id '
                           'ON problem2 (contest_id)')
 
+        # Submissions used to be stored here, they have a database of their own now.
+        self.conn.execute('DROP TABLE IF EXISTS submission')
+        self.conn.execute('DROP TABLE IF EXISTS submission_watermark')
+        # Responses of the clist API used to be stored here, they have a database of their own now.
+        self.conn.execute('DROP TABLE IF EXISTS clist_response')
+
     def cache_contests(self, contests):
         query = ('INSERT OR REPLACE INTO contest '
                  '(id, name, start_time, duration, type, phase, prepared_by) '
@@ -130,17 +211,33 @@ class CacheDbConn:
         res = self.conn.execute(query).fetchall()
         return list(map(self._unsquish_tags, res))
 
-    def save_rating_changes(self, changes):
+    def save_rating_changes(self, changes, *, backfilled_contest_ids=()):
+        """Save rating changes. The contests in `backfilled_contest_ids` are marked as fetched by
+        the running backfill in the same transaction."""
         change_tuples = [(change.contestId,
                           change.handle,
                           change.rank,
                           change.ratingUpdateTimeSeconds,
                           change.oldRating,
                           change.newRating) for change in changes]
+        self.conn.executemany('INSERT INTO handle (handle) VALUES (?) '
+                              'ON CONFLICT (handle) DO UPDATE SET handle = excluded.handle '
+                              'WHERE handle <> excluded.handle COLLATE BINARY',
+                              [(handle,) for _, handle, *_ in change_tuples])
         query = ('INSERT OR REPLACE INTO rating_change '
-                 '(contest_id, handle, rank, rating_update_time, old_rating, new_rating) '
-                 'VALUES (?, ?, ?, ?, ?, ?)')
+                 '(contest_id, handle_id, rank, rating_update_time, old_rating, new_rating) '
+                 'VALUES (?, (SELECT id FROM handle WHERE handle = ?), ?, ?, ?, ?)')
         rc = self.conn.executemany(query, change_tuples).rowcount
+        query = ('INSERT INTO handle_latest_rating (handle_id, rating, rating_update_time) '
+                 'VALUES ((SELECT id FROM handle WHERE handle = ?), ?, ?) '
+                 'ON CONFLICT (handle_id) DO UPDATE '
+                 'SET rating = excluded.rating, rating_update_time = excluded.rating_update_time '
+                 'WHERE excluded.rating_update_time >= handle_latest_rating.rating_update_time')
+        self.conn.executemany(query, [(handle, new_rating, update_time)
+                                      for _, handle, _, update_time, _, new_rating
+                                      in change_tuples])
+        self.conn.executemany('UPDATE rating_change_backfill SET fetched = 1 WHERE contest_id = ?',
+                              [(contest_id,) for contest_id in backfilled_contest_ids])
         self.conn.commit()
         self.update()
         return rc
@@ -149,15 +246,83 @@ class CacheDbConn:
         if contest_id is None:
             query = 'DELETE FROM rating_change'
             self.conn.execute(query)
+            self.conn.execute('DELETE FROM handle_latest_rating')
         else:
+            query = 'SELECT handle_id FROM rating_change WHERE contest_id = ?'
+            handle_ids = [handle_id for handle_id, in self.conn.execute(query, (contest_id,))]
             query = 'DELETE FROM rating_change WHERE contest_id = ?'
             self.conn.execute(query, (contest_id,))
+            self._rebuild_latest_ratings(handle_ids)
+        self.conn.commit()
+        self.update()
+
+    def _rebuild_latest_ratings(self, handle_ids=None):
+        """Recompute the latest ratings of the given handles, or of all handles if `handle_ids` is
+        None, from table rating_change. Does not commit."""
+        # SQLite takes the bare column new_rating from the row with the maximum update time.
+        query = ('INSERT INTO handle_latest_rating (handle_id, rating, rating_update_time) '
+                 'SELECT handle_id, new_rating, MAX(rating_update_time) '
+                 'FROM rating_change ')
+        if handle_ids is None:
+            self.conn.execute('DELETE FROM handle_latest_rating')
+            self.conn.execute(query + 'GROUP BY handle_id')
+            return
+        for chunk in _chunks(handle_ids):
+            placeholders = ', '.join('?' * len(chunk))
+            self.conn.execute(
+                f'DELETE FROM handle_latest_rating WHERE handle_id IN ({placeholders})', chunk)
+            self.conn.execute(query + f'WHERE handle_id IN ({placeholders}) GROUP BY handle_id',
+                              chunk)
+
+    def get_latest_ratings(self, handles=None):
+        """Return (handle, rating) pairs with the current rating of the given handles, or of all
+        handles if `handles` is None. Handles without rating changes are left out."""
+        query = ('SELECT h.handle, l.rating '
+                 'FROM handle_latest_rating l '
+                 'JOIN handle h ON h.id = l.handle_id')
+        if handles is None:
+            return self.conn.execute(query).fetchall()
+        res = []
+        for chunk in _chunks(handles):
+            placeholders = ', '.join('?' * len(chunk))
+            res += self.conn.execute(f'{query} WHERE h.handle IN ({placeholders})',
+                                     chunk).fetchall()
+        return res
+
+    def get_finished_contests_without_rating_changes(self):
+        query = ('SELECT id '
+                 'FROM contest c '
+                 "WHERE phase = 'FINISHED' AND NOT EXISTS ("
+                 '    SELECT 1 FROM rating_change r WHERE r.contest_id = c.id'
+                 ') '
+                 'ORDER BY start_time')
+        return [contest_id for contest_id, in self.conn.execute(query)]
+
+    def start_rating_change_backfill(self, contest_ids):
+        self.conn.execute('DELETE FROM rating_change_backfill')
+        self.conn.executemany('INSERT INTO rating_change_backfill (contest_id) VALUES (?)',
+                              [(contest_id,) for contest_id in contest_ids])
+        self.conn.commit()
+        self.update()
+
+    def get_rating_change_backfill(self):
+        """Returns the ids of the contests of the running backfill, with whether they have been
+        fetched."""
+        query = ('SELECT contest_id, fetched '
+                 'FROM rating_change_backfill '
+                 'ORDER BY contest_id')
+        return [(contest_id, bool(fetched)) for contest_id, fetched in self.conn.execute(query)]
+
+    def finish_rating_change_backfill(self):
+        self.conn.execute('DELETE FROM rating_change_backfill')
         self.conn.commit()
         self.update()
 
     def get_users_with_more_than_n_contests(self, time_cutoff, n):
-        query = ('SELECT handle, COUNT(*) AS num_contests '
-                 'FROM rating_change GROUP BY handle HAVING num_contests >= ? '
+        query = ('SELECT h.handle '
+                 'FROM rating_change r '
+                 'JOIN handle h ON h.id = r.handle_id '
+                 'GROUP BY r.handle_id HAVING COUNT(*) >= ? '
                  'AND MAX(rating_update_time) >= ?')
         res = self.conn.execute(query, (n, time_cutoff,)).fetchall()
         return [user[0] for user in res]
@@ -165,6 +330,7 @@ class CacheDbConn:
     def get_all_rating_changes(self):
         query = ('SELECT contest_id, name, handle, rank, rating_update_time, old_rating, new_rating '
                  'FROM rating_change r '
+                 'JOIN handle h ON h.id = r.handle_id '
                  'LEFT JOIN contest c '
                  'ON r.contest_id = c.id '
                  'ORDER BY rating_update_time')
@@ -174,6 +340,7 @@ class CacheDbConn:
     def get_rating_changes_for_contest(self, contest_id):
         query = ('SELECT contest_id, name, handle, rank, rating_update_time, old_rating, new_rating '
                  'FROM rating_change r '
+                 'JOIN handle h ON h.id = r.handle_id '
                  'LEFT JOIN contest c '
                  'ON r.contest_id = c.id '
                  'WHERE r.contest_id = ?')
@@ -190,9 +357,10 @@ class CacheDbConn:
     def get_rating_changes_for_handle(self, handle):
         query = ('SELECT contest_id, name, handle, rank, rating_update_time, old_rating, new_rating '
                  'FROM rating_change r '
+                 'JOIN handle h ON h.id = r.handle_id '
                  'LEFT JOIN contest c '
                  'ON r.contest_id = c.id '
-                 'WHERE r.handle = ?')
+                 'WHERE h.handle = ?')
         res = self.conn.execute(query, (handle,)).fetchall()
         return [cf.RatingChange._make(change) for change in res]
 
@@ -226,10 +394,24 @@ class CacheDbConn:
         res = self.conn.execute(query, (contest_id,)).fetchall()
         return list(map(self._unsquish_tags, res))
 
+    def get_problemset_coverage(self):
+        """Returns, for every contest with saved problems, a dict from problem index to whether the
+        problem has a rating."""
+        query = ('SELECT contest_id, GROUP_CONCAT([index]), '
+                 '    GROUP_CONCAT(CASE WHEN rating IS NOT NULL THEN [index] END) '
+                 'FROM problem2 '
+                 'GROUP BY contest_id')
+        coverage = {}
+        for contest_id, indices, rated_indices in self.conn.execute(query):
+            rated_indices = set(rated_indices.split(',')) if rated_indices else set()
+            coverage[contest_id] = {index: index in rated_indices for index in indices.split(',')}
+        return coverage
+
     def problemset_empty(self):
         query = 'SELECT 1 FROM problem2'
         res = self.conn.execute(query).fetchone()
         return res is None
 
     def close(self):
+        self.uploader.close()
         self.conn.close()
@@ -0,0 +1,70 @@
+import sqlite3
+
+from tle.util.db.async_db_conn import connect_read_only
+
+
+class ClistCacheDbConn:
+    """Responses of the clist API, by endpoint and normalized query parameters. They are kept in
+    a database of their own, which is not uploaded, since they can always be fetched again."""
+
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.create_tables()
+        # The total size of the stored responses, kept up to date by the connection that writes.
+        self.total_size, = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM clist_response').fetchone()
+
+    @classmethod
+    def read_only(cls, db_file):
+        """A connection for the read-only methods only, which neither creates the tables nor
+        tracks the total size."""
+        self = cls.__new__(cls)
+        self.conn = connect_read_only(db_file)
+        return self
+
+    def create_tables(self):
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS clist_response ('
+            'key         TEXT NOT NULL,'
+            'endpoint    TEXT NOT NULL,'
+            'response    TEXT NOT NULL,'
+            'fetch_time  REAL NOT NULL,'
+            'size        INTEGER NOT NULL,'
+            'PRIMARY KEY (key)'
+            ')'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_clist_response_fetch_time '
+                          'ON clist_response (fetch_time)')
+        self.conn.commit()
+
+    def get_clist_response(self, key):
+        """Returns the (fetch time, JSON text) of the stored response, or None."""
+        query = ('SELECT fetch_time, response '
+                 'FROM clist_response '
+                 'WHERE key = ?')
+        return self.conn.execute(query, (key,)).fetchone()
+
+    def save_clist_response(self, key, endpoint, response, fetch_time, *, max_bytes):
+        """Store a response. If the stored responses then take up more than `max_bytes`, evict the
+        least recently fetched ones until they fit."""
+        replaced = self.conn.execute('SELECT size FROM clist_response WHERE key = ?',
+                                     (key,)).fetchone()
+        self.conn.execute('INSERT OR REPLACE INTO clist_response '
+                          '(key, endpoint, response, fetch_time, size) '
+                          'VALUES (?, ?, ?, ?, ?)',
+                          (key, endpoint, response, fetch_time, len(response)))
+        self.total_size += len(response) - (replaced[0] if replaced else 0)
+        if self.total_size > max_bytes:
+            self.conn.execute('DELETE FROM clist_response WHERE key IN ('
+                              '    SELECT key FROM ('
+                              '        SELECT key, '
+                              '               SUM(size) OVER (ORDER BY fetch_time DESC) AS total '
+                              '        FROM clist_response'
+                              '    ) WHERE total > ?'
+                              ')', (max_bytes,))
+            self.total_size, = self.conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM clist_response').fetchone()
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
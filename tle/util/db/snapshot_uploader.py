@@ -0,0 +1,143 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sqlite3
+
+from tle import constants
+
+_UPLOAD_DELAY = 60
+
+
+class SnapshotUploader:
+    """Uploads a SQLite database to Firebase storage. Uploads are debounced: the first change
+    schedules an upload `delay` seconds later and all changes made in the meantime are covered by
+    that upload. A consistent snapshot is taken with SQLite's online backup API on the thread that
+    owns the connection, and the snapshot is uploaded from a thread of its own. A snapshot is only
+    taken once the previous one is uploaded, so uploads never overlap.
+    """
+
+    def __init__(self, conn, bucket, blob_name, *, delay=_UPLOAD_DELAY):
+        self.conn = conn
+        self.bucket = bucket
+        self.blob_name = blob_name
+        self.delay = delay
+        self.snapshot_path = os.path.join(constants.TEMP_DIR, f'{blob_name}.snapshot')
+        self.loop = None
+        self.snapshot_executor = None
+        self.upload_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='snapshot-upload')
+        self._dirty = False
+        self._closed = False
+        self._scheduled = None
+        self._flush_tasks = set()
+        self._upload = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def bind(self, loop, snapshot_executor):
+        """For a connection owned by a thread other than the event loop's, schedule uploads on
+        `loop` and take snapshots on `snapshot_executor`, which must run on the owning thread."""
+        self.loop = loop
+        self.snapshot_executor = snapshot_executor
+
+    def mark_dirty(self):
+        """Record that the database changed, scheduling an upload if none is pending."""
+        if self.bucket is None:
+            return
+        self._dirty = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._schedule)
+            return
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not running in the bot, e.g. from a script. Upload right away.
+            self.flush_now()
+            return
+        self._schedule()
+
+    def flush_now(self):
+        """Upload the current state synchronously if there are changes not yet uploaded, once the
+        upload in progress, if any, is done. Must be called from the thread owning the
+        connection."""
+        self._wait_for_upload()
+        if self.bucket is None or not self._dirty:
+            return
+        self._dirty = False
+        self._snapshot()
+        self._upload_snapshot()
+
+    def close(self):
+        """Upload the changes not yet uploaded and stop scheduling uploads. Must be called from the
+        thread owning the connection, before the connection is closed."""
+        self._closed = True
+        if self.loop is not None and not self.loop.is_closed():
+            # The timer belongs to the event loop, which may be running on another thread.
+            self.loop.call_soon_threadsafe(self._cancel_scheduled)
+        self.flush_now()
+        self.upload_executor.shutdown()
+
+    def _cancel_scheduled(self):
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+
+    def _schedule(self):
+        if self._scheduled is None and not self._closed:
+            self._scheduled = self.loop.call_later(self.delay, self._start_flush)
+
+    def _start_flush(self):
+        self._scheduled = None
+        # The loop only keeps weak references to tasks.
+        task = asyncio.create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        if self.snapshot_executor is None:
+            upload = self._start_upload()
+        else:
+            upload = await self.loop.run_in_executor(self.snapshot_executor, self._start_upload)
+        if upload is False:
+            # The previous upload is still in progress, its snapshot must not be overwritten.
+            self._schedule()
+        elif upload is not None:
+            asyncio.wrap_future(upload).add_done_callback(self._upload_done)
+
+    def _start_upload(self):
+        """Take a snapshot and start uploading it. Returns the future of the upload, None if there
+        is nothing to upload, or False if the previous upload is still in progress. Runs on the
+        thread owning the connection."""
+        if self._closed or not self._dirty:
+            return None
+        if self._upload is not None and not self._upload.done():
+            return False
+        self._dirty = False
+        self._snapshot()
+        self._upload = self.upload_executor.submit(self._upload_snapshot)
+        return self._upload
+
+    def _wait_for_upload(self):
+        if self._upload is not None:
+            concurrent.futures.wait([self._upload])
+
+    def _snapshot(self):
+        target = sqlite3.connect(self.snapshot_path)
+        try:
+            self.conn.backup(target)
+        finally:
+            target.close()
+
+    def _upload_snapshot(self):
+        blob = self.bucket.blob(self.blob_name)
+        blob.upload_from_filename(self.snapshot_path)
+
+    def _upload_done(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.logger.warning(f'Upload of {self.blob_name} failed, retrying later.',
+                                exc_info=future.exception())
+            self.mark_dirty()
+        else:
+            self.logger.info(f'Uploaded snapshot of {self.blob_name}')
@@ -0,0 +1,134 @@
+import json
+import sqlite3
+
+from tle.util import codeforces_api as cf
+from tle.util.db.async_db_conn import connect_read_only
+
+
+class SubmissionCacheDbConn:
+    """Submissions of the handles queried so far. They are kept in a database of their own, which
+    is not uploaded, since they can always be fetched again."""
+
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.create_tables()
+
+    @classmethod
+    def read_only(cls, db_file):
+        """A connection for the read-only methods only, which does not create the tables."""
+        self = cls.__new__(cls)
+        self.conn = connect_read_only(db_file)
+        return self
+
+    def create_tables(self):
+        # Submissions fetched from the user.status endpoint, one row per handle and submission.
+        # Members of the authoring party are stored as a ';' separated list of handles.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS submission ('
+            'handle                TEXT NOT NULL COLLATE NOCASE,'
+            'id                    INTEGER NOT NULL,'
+            'contest_id            INTEGER,'
+            'problem_contest_id    INTEGER,'
+            'problemset_name       TEXT,'
+            '[index]               TEXT,'
+            'problem_name          TEXT,'
+            'problem_type          TEXT,'
+            'points                REAL,'
+            'rating                INTEGER,'
+            'tags                  TEXT,'
+            'members               TEXT,'
+            'participant_type      TEXT,'
+            'team_id               INTEGER,'
+            'team_name             TEXT,'
+            'ghost                 INTEGER,'
+            'room                  INTEGER,'
+            'start_time            INTEGER,'
+            'programming_language  TEXT,'
+            'verdict               TEXT,'
+            'creation_time         INTEGER,'
+            'relative_time         INTEGER,'
+            'PRIMARY KEY (handle, id)'
+            ')'
+        )
+        # For every handle in table submission, the id up to which its stored submissions are
+        # known to be complete and final.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS submission_watermark ('
+            'handle    TEXT NOT NULL COLLATE NOCASE,'
+            'max_id    INTEGER NOT NULL,'
+            'PRIMARY KEY (handle)'
+            ')'
+        )
+        self.conn.commit()
+
+    def get_submission_watermark(self, handle):
+        query = ('SELECT max_id '
+                 'FROM submission_watermark '
+                 'WHERE handle = ?')
+        res = self.conn.execute(query, (handle,)).fetchone()
+        return res[0] if res else None
+
+    @staticmethod
+    def _squish_submission(handle, submission):
+        problem, author = submission.problem, submission.author
+        return (handle, submission.id, submission.contestId, problem.contestId,
+                problem.problemsetName, problem.index, problem.name, problem.type, problem.points,
+                problem.rating, json.dumps(problem.tags),
+                ';'.join(member.handle for member in author.members), author.participantType,
+                author.teamId, author.teamName, author.ghost, author.room, author.startTimeSeconds,
+                submission.programmingLanguage, submission.verdict, submission.creationTimeSeconds,
+                submission.relativeTimeSeconds)
+
+    def save_submissions(self, handle, submissions, watermark, *, replace_after):
+        """Replace the stored submissions of `handle` with id greater than `replace_after` by the
+        given submissions and set the watermark of the handle. If `replace_after` is None all
+        stored submissions of the handle are replaced.
+        """
+        if replace_after is None:
+            self.conn.execute('DELETE FROM submission WHERE handle = ?', (handle,))
+        else:
+            self.conn.execute('DELETE FROM submission WHERE handle = ? AND id > ?',
+                              (handle, replace_after))
+        query = ('INSERT OR REPLACE INTO submission '
+                 '(handle, id, contest_id, problem_contest_id, problemset_name, [index], '
+                 ' problem_name, problem_type, points, rating, tags, members, participant_type, '
+                 ' team_id, team_name, ghost, room, start_time, programming_language, verdict, '
+                 ' creation_time, relative_time) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+        rc = self.conn.executemany(
+            query, [self._squish_submission(handle, sub) for sub in submissions]).rowcount
+        self.conn.execute('INSERT OR REPLACE INTO submission_watermark (handle, max_id) '
+                          'VALUES (?, ?)', (handle, watermark))
+        self.conn.commit()
+        return rc
+
+    def fetch_submissions(self, handle):
+        query = ('SELECT id, contest_id, problem_contest_id, problemset_name, [index], '
+                 '    problem_name, problem_type, points, rating, tags, members, participant_type, '
+                 '    team_id, team_name, ghost, room, start_time, programming_language, verdict, '
+                 '    creation_time, relative_time '
+                 'FROM submission '
+                 'WHERE handle = ? '
+                 'ORDER BY id DESC')
+        res = self.conn.execute(query, (handle,)).fetchall()
+        # Most submissions share a few distinct tag lists, decode each of them once.
+        tags_by_json = {}
+        submissions = []
+        for (id_, contest_id, problem_contest_id, problemset_name, index, problem_name,
+             problem_type, points, rating, tags, members, participant_type, team_id, team_name,
+             ghost, room, start_time, programming_language, verdict, creation_time,
+             relative_time) in res:
+            if tags not in tags_by_json:
+                tags_by_json[tags] = json.loads(tags)
+            problem = cf.Problem(problem_contest_id, problemset_name, index, problem_name,
+                                 problem_type, points, rating, tags_by_json[tags])
+            members = [cf.Member(member) for member in members.split(';')] if members else []
+            author = cf.Party(contest_id, members, participant_type, team_id, team_name,
+                              None if ghost is None else bool(ghost), room, start_time)
+            submissions.append(cf.Submission(id_, contest_id, problem, author,
+                                             programming_language, verdict, creation_time,
+                                             relative_time))
+        return submissions
+
+    def close(self):
+        self.conn.close()
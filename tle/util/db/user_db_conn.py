@@ -1,3 +1,4 @@
+import json
 import sqlite3
 from enum import IntEnum
 from collections import namedtuple
@@ -9,7 +10,8 @@ from tle.util import codeforces_api as cf
 
 from os import environ
 from firebase_admin import storage
-from tle import constants
+from tle.util.db.snapshot_uploader import SnapshotUploader
+from tle.util.db.async_db_conn import connect_read_only
 
 bucket = None
 STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
@@ -68,15 +70,22 @@ def namedtuple_factory(cursor, row):
 class UserDbConn:
     def __init__(self, dbfile):
         self.conn = sqlite3.connect(dbfile)
+        self.uploader = SnapshotUploader(self.conn, bucket, 'tle.db')
         self.conn.row_factory = namedtuple_factory
         self.create_tables()
+
+    @classmethod
+    def read_only(cls, dbfile):
+        """A connection for the read-only methods only, which neither creates the tables nor
+        uploads."""
+        self = cls.__new__(cls)
+        self.conn = connect_read_only(dbfile)
+        self.conn.row_factory = namedtuple_factory
+        return self
     
     # update the data in firebase
     def update(self):
-        if bucket==None:
-            return
-        blob = bucket.blob('tle.db')
-        blob.upload_from_filename(constants.USER_DB_FILE_PATH)
+        self.uploader.mark_dirty()
 
     def create_tables(self):
         self.conn.execute(
@@ -368,6 +377,16 @@ class UserDbConn:
             res = self.conn.execute(query, user).rowcount
         return res
 
+    def cache_cf_users(self, users):
+        query = ('INSERT OR REPLACE INTO cf_user_cache '
+                 '(handle, first_name, last_name, country, city, organization, contribution, '
+                 '    rating, maxRating, last_online_time, registration_time, friend_of_count, title_photo) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+        res = None
+        with self.conn:
+            res = self.conn.executemany(query, users).rowcount
+        return res
+
     def fetch_cf_user(self, handle):
         query = ('SELECT handle, first_name, last_name, country, city, organization, contribution, '
                  '    rating, maxRating, last_online_time, registration_time, friend_of_count, title_photo '
@@ -546,6 +565,13 @@ class UserDbConn:
         '''
         return self.conn.execute(query, (guild_id,)).fetchone()
 
+    def get_all_reminder_settings(self):
+        query = '''
+            SELECT guild_id, channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns
+            FROM reminder
+        '''
+        return self.conn.execute(query).fetchall()
+
     def set_reminder_settings(self, guild_id, channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns):
         query = '''
             INSERT OR REPLACE INTO reminder (guild_id, channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns)
@@ -555,6 +581,33 @@ class UserDbConn:
         self.conn.commit()
         self.update()
 
+    def update_reminder_settings(self, guild_id, channel_id, role_id, before):
+        query = '''
+            UPDATE reminder SET channel_id = ?, role_id = ?, before = ? WHERE guild_id = ?
+        '''
+        self.conn.execute(query, (channel_id, role_id, before, guild_id))
+        self.conn.commit()
+        self.update()
+
+    def set_reminder_website_patterns(self, guild_id, allowed_patterns, disallowed_patterns):
+        """Replace the allowed and disallowed patterns of the websites in `allowed_patterns` and
+        `disallowed_patterns`, which map websites to patterns, keeping those of other websites.
+        The guild must have reminder settings."""
+        _, _, _, website_allowed_patterns, website_disallowed_patterns = \
+            self.get_reminder_settings(guild_id)
+        website_allowed_patterns = json.loads(website_allowed_patterns)
+        website_disallowed_patterns = json.loads(website_disallowed_patterns)
+        website_allowed_patterns.update(allowed_patterns)
+        website_disallowed_patterns.update(disallowed_patterns)
+        query = '''
+            UPDATE reminder SET website_allowed_patterns = ?, website_disallowed_patterns = ?
+            WHERE guild_id = ?
+        '''
+        self.conn.execute(query, (json.dumps(website_allowed_patterns),
+                                  json.dumps(website_disallowed_patterns), guild_id))
+        self.conn.commit()
+        self.update()
+
     def clear_reminder_settings(self, guild_id):
         query = '''DELETE FROM reminder WHERE guild_id = ?'''
         self.conn.execute(query, (guild_id,))
@@ -604,6 +657,9 @@ class UserDbConn:
         return self.conn.execute(query, (userid, userid)).fetchone()
 
     def create_duel(self, challenger, challengee, issue_time, prob, dtype):
+        """Returns the id of the new duel, or None if either user is in a duel already."""
+        if self.check_duel_challenge(challenger) or self.check_duel_challenge(challengee):
+            return None
         query = f'''
             INSERT INTO duel (challenger, challengee, issue_time, problem_name, contest_id, p_index, status, type) VALUES (?, ?, ?, ?, ?, ?, {Duel.PENDING}, ?)
         '''
@@ -666,6 +722,19 @@ class UserDbConn:
         self.update()
         return 1
 
+    def complete_rated_duel(self, duelid, winner, finish_time, winner_id, loser_id, dtype,
+                            rating_delta):
+        """Complete the duel with the rating change `rating_delta(winner rating, loser rating)`.
+        The ratings are read in the same call, so that duels completed at the same time do not
+        use the same ratings. Returns the ratings and the change, or None if the duel is not
+        ongoing."""
+        winner_r = self.get_duel_rating(winner_id)
+        loser_r = self.get_duel_rating(loser_id)
+        delta = rating_delta(winner_r, loser_r)
+        if not self.complete_duel(duelid, winner, finish_time, winner_id, loser_id, delta, dtype):
+            return None
+        return winner_r, loser_r, delta
+
     def update_duel_rating(self, userid, delta):
         query = '''
             UPDATE duelist SET rating = rating + ? WHERE user_id = ?
@@ -886,5 +955,5 @@ class UserDbConn:
         return account_id
     
     def close(self):
-        self.update()
+        self.uploader.close()
         self.conn.close()
\ No newline at end of file
@@ -8,6 +8,7 @@ from disnake.ext import commands
 
 from tle.util import codeforces_api as cf
 from tle.util import clist_api as clist
+from tle.util import compute
 from tle.util import db
 from tle.util import tasks
 
@@ -127,7 +128,7 @@ async def bot_error_handler(inter, exception):
         await inter.send(embed=embed_alert('Sorry, this is an owner-only command :face_with_raised_eyebrow:'))
     elif isinstance(exception, (cf.CodeforcesApiError, commands.UserInputError)):
         await inter.send(embed=embed_alert(exception))
-    elif isinstance(exception, (clist.ClistApiError, commands.CheckAnyFailure, commands.CommandOnCooldown)):
+    elif isinstance(exception, (clist.ClistApiError, compute.ComputeError, commands.CheckAnyFailure, commands.CommandOnCooldown)):
         await inter.send(embed=embed_alert(exception))
     else:
         msg = 'Ignoring exception in command {}:'.format(inter.application_command)
@@ -11,9 +11,13 @@ class Event:
     pass
 
 
-class ContestListRefresh(Event):
-    def __init__(self, contests):
-        self.contests = contests
+class ContestListChange(Event):
+    """Dispatched when a refresh of the contest list finds contests that were added, changed or
+    removed. `updated` holds the new versions of the changed contests."""
+    def __init__(self, *, added, updated, removed):
+        self.added = added
+        self.updated = updated
+        self.removed = removed
 
 
 class RatingChangesUpdate(Event):
@@ -1,14 +1,13 @@
-import os
 import io
 import disnake
-import time
 import matplotlib.font_manager
 import matplotlib
 matplotlib.use('agg') # Explicitly set the backend to avoid issues
 
+import seaborn as sns
 from tle import constants
 from matplotlib import pyplot as plt
-from matplotlib import rcParams
+from matplotlib.figure import Figure
 from cycler import cycler
 
 rating_color_cycler = cycler('color', ['#5d4dff',
@@ -20,6 +19,18 @@ rating_color_cycler = cycler('color', ['#5d4dff',
 fontprop = matplotlib.font_manager.FontProperties(fname=constants.NOTO_SANS_CJK_REGULAR_FONT_PATH)
 
 
+def setup_style():
+    """Set the style of all plots. Must be called by every process that plots."""
+    plt.rcParams['figure.figsize'] = 7.0, 3.5
+    sns.set()
+    options = {
+        'axes.edgecolor': '#A0A0C5',
+        'axes.spines.top': False,
+        'axes.spines.right': False,
+    }
+    sns.set_style('darkgrid', options)
+
+
 # String wrapper to avoid the underscore behavior in legends
 #
 # In legends, matplotlib ignores labels that begin with _
@@ -31,23 +42,38 @@ class StrWrap:
     def __str__(self):
         return self.string
 
-def get_current_figure_as_file():
-    filename = os.path.join(constants.TEMP_DIR, f'tempplot_{time.time()}.png')
-    plt.savefig(filename, facecolor=plt.gca().get_facecolor(), bbox_inches='tight', pad_inches=0.25)
+def new_figure(figsize=None):
+    """A figure with one axes, which is not managed by pyplot. Unlike the pyplot figure, it can be
+    drawn and rendered in any thread, with other figures being drawn at the same time. The style
+    set by `setup_style` is applied when the figure is created."""
+    fig = Figure(figsize=figsize)
+    fig.add_subplot()
+    return fig
+
+
+def figure_as_png(fig):
+    """Render the figure to PNG bytes, without going through the filesystem."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', facecolor=fig.gca().get_facecolor(), bbox_inches='tight',
+                pad_inches=0.25)
+    return buf.getvalue()
+
+
+def figure_as_file(fig):
+    return png_as_file(figure_as_png(fig))
+
 
-    with open(filename, 'rb') as file:
-        discord_file = disnake.File(io.BytesIO(file.read()), filename='plot.png')
+def png_as_file(png):
+    """A discord file of the PNG bytes of a plot."""
+    return disnake.File(io.BytesIO(png), filename='plot.png')
 
-    os.remove(filename)
-    return discord_file
 
-def plot_rating_bg(ranks):
-    ymin, ymax = plt.gca().get_ylim()
-    bgcolor = plt.gca().get_facecolor()
+def plot_rating_bg(ax, ranks):
+    ymin, ymax = ax.get_ylim()
+    bgcolor = ax.get_facecolor()
     for rank in ranks:
-        plt.axhspan(rank.low, rank.high, facecolor=rank.color_graph, alpha=0.8, edgecolor=bgcolor, linewidth=0.5)
+        ax.axhspan(rank.low, rank.high, facecolor=rank.color_graph, alpha=0.8, edgecolor=bgcolor, linewidth=0.5)
 
-    locs, labels = plt.xticks()
-    for loc in locs:
-        plt.axvline(loc, color=bgcolor, linewidth=0.5)
-    plt.ylim(ymin, ymax)
+    for loc in ax.get_xticks():
+        ax.axvline(loc, color=bgcolor, linewidth=0.5)
+    ax.set_ylim(ymin, ymax)
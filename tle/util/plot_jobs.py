@@ -0,0 +1,355 @@
+"""
+    Plots rendered on the compute executor. Every function takes plain data, draws one plot and
+    returns it as PNG bytes. Times are passed as unix timestamps.
+"""
+
+import datetime as dt
+import math
+
+import pandas as pd
+import seaborn as sns
+from matplotlib import dates as mdates
+from matplotlib import lines as mlines
+from matplotlib import rcParams
+from matplotlib.ticker import MultipleLocator
+
+from tle.util import graph_common as gc
+
+
+def _to_datetimes(timestamps):
+    return [dt.datetime.fromtimestamp(timestamp) for timestamp in timestamps]
+
+
+def _plot_rating(ax, series, ranks, mark='o'):
+    """`series` holds a pair of lists of timestamps and ratings for every user."""
+    for times, ratings in series:
+        ax.plot(_to_datetimes(times),
+                ratings,
+                linestyle='-',
+                marker=mark,
+                markersize=3,
+                markerfacecolor='white',
+                markeredgewidth=0.5)
+    gc.plot_rating_bg(ax, ranks)
+    ax.figure.autofmt_xdate()
+
+
+def _running_mean(x, bin_size):
+    n = len(x)
+
+    cum_sum = [0] * (n + 1)
+    for i in range(n):
+        cum_sum[i + 1] = x[i] + cum_sum[i]
+
+    res = [0] * (n - bin_size + 1)
+    for i in range(bin_size, n + 1):
+        res[i - bin_size] = (cum_sum[i] - cum_sum[i - bin_size]) / bin_size
+
+    return res
+
+
+def _plot_average(ax, practice, bin_size, label=''):
+    if len(practice) > bin_size:
+        sub_times, ratings = map(list, zip(*practice))
+
+        mean_sub_times = _to_datetimes(_running_mean(sub_times, bin_size))
+        mean_ratings = _running_mean(ratings, bin_size)
+
+        ax.plot(mean_sub_times,
+                mean_ratings,
+                linestyle='-',
+                marker='',
+                markerfacecolor='white',
+                markeredgewidth=0.5,
+                label=label)
+
+
+def rating_graph(series, labels, ranks, ylim=None):
+    """Rating or performance over time for every user in `series`, see `_plot_rating`."""
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.set_prop_cycle(gc.rating_color_cycler)
+    _plot_rating(ax, series, ranks)
+    ax.legend([gc.StrWrap(label) for label in labels], loc='upper left')
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    return gc.figure_as_png(fig)
+
+
+def extremes(handle, rating, regular, fullsolves, nosolves, solved, unsolved, legend, ranks):
+    """`regular` holds (time, easiest unsolved, hardest solved) for every contest, `fullsolves`
+    and `nosolves` hold (time, rating) for contests where everything or nothing was solved."""
+    solvedcolor = 'tab:orange'
+    unsolvedcolor = 'tab:blue'
+    linecolor = '#00000022'
+    outlinecolor = '#00000022'
+
+    fig = gc.new_figure()
+    ax = fig.gca()
+
+    def scatter_outline(*args, **kwargs):
+        ax.scatter(*args, **kwargs)
+        kwargs['zorder'] -= 1
+        kwargs['color'] = outlinecolor
+        if kwargs['marker'] == '*':
+            kwargs['s'] *= 3
+        elif kwargs['marker'] == 's':
+            kwargs['s'] *= 1.5
+        else:
+            kwargs['s'] *= 2
+        if 'alpha' in kwargs:
+            del kwargs['alpha']
+        if 'label' in kwargs:
+            del kwargs['label']
+        ax.scatter(*args, **kwargs)
+
+    regular = [(dt.datetime.fromtimestamp(t), mn, mx) for t, mn, mx in regular]
+    fullsolves = [(dt.datetime.fromtimestamp(t), mx) for t, mx in fullsolves]
+    nosolves = [(dt.datetime.fromtimestamp(t), mn) for t, mn in nosolves]
+
+    time_scatter, plot_min, plot_max = zip(*regular)
+    if unsolved:
+        scatter_outline(time_scatter, plot_min, zorder=10,
+                        s=14, marker='o', color=unsolvedcolor,
+                        label='Easiest unsolved')
+    if solved:
+        scatter_outline(time_scatter, plot_max, zorder=10,
+                        s=14, marker='o', color=solvedcolor,
+                        label='Hardest solved')
+
+    if solved and unsolved:
+        for t, mn, mx in regular:
+            ax.add_line(mlines.Line2D((t, t), (mn, mx), color=linecolor))
+
+    if fullsolves:
+        scatter_outline(*zip(*fullsolves), zorder=15,
+                        s=42, marker='*',
+                        color=solvedcolor)
+    if nosolves:
+        scatter_outline(*zip(*nosolves), zorder=15,
+                        s=32, marker='X',
+                        color=unsolvedcolor)
+
+    if legend:
+        ax.legend(title=f'{handle}: {rating}', title_fontsize=rcParams['legend.fontsize'],
+                  loc='upper left').set_zorder(20)
+    gc.plot_rating_bg(ax, ranks)
+    fig.autofmt_xdate()
+    return gc.figure_as_png(fig)
+
+
+def solved_ratings(all_ratings, labels, bins, legend_title=None):
+    """With a `legend_title`, `all_ratings` are the ratings of one user by type of submission,
+    which are stacked. Otherwise they are the ratings of every user."""
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.set_xlabel('Problem rating')
+    ax.set_ylabel('Number solved')
+    if legend_title is not None:
+        ax.hist(all_ratings, stacked=True, bins=bins, label=labels)
+        ax.legend(title=legend_title, title_fontsize=rcParams['legend.fontsize'],
+                  loc='upper right')
+    else:
+        ax.hist(all_ratings, bins=bins)
+        ax.legend([gc.StrWrap(label) for label in labels], loc='upper right')
+    return gc.figure_as_png(fig)
+
+
+def solved_over_time(all_times, labels, phase_days, end, legend_title=None):
+    """Histogram of solve times in phases of `phase_days` days up to the timestamp `end`, the last
+    phase ending tomorrow at the latest. `legend_title` is as in `solved_ratings`."""
+    all_times = [_to_datetimes(times) for times in all_times]
+    phase_time = dt.timedelta(days=phase_days)
+    dlo = min(t for times in all_times for t in times).date()
+    dhi = min(dt.datetime.today() + dt.timedelta(days=1), dt.datetime.fromtimestamp(end)).date()
+    phase_cnt = math.ceil((dhi - dlo) / phase_time)
+    hist_range = (dhi - phase_cnt * phase_time, dhi)
+
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Number solved')
+    if legend_title is not None:
+        ax.hist(all_times, stacked=True, label=labels, range=hist_range,
+                bins=min(40, phase_cnt))
+        ax.legend(title=legend_title, title_fontsize=rcParams['legend.fontsize'])
+    else:
+        ax.hist(all_times, range=hist_range, bins=min(40 // len(all_times), phase_cnt))
+        ax.legend([gc.StrWrap(label) for label in labels])
+
+    # NOTE: In case of nested list, matplotlib decides type using 1st sublist,
+    # it assumes float when 1st sublist is empty.
+    # Hence explicitly assigning locator and formatter is must here.
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+
+    fig.autofmt_xdate()
+    return gc.figure_as_png(fig)
+
+
+def solve_count_curve(all_times, labels, end):
+    """Cumulative solve count of every user, extended to the timestamp `end`."""
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Cumulative solve count')
+
+    for times in all_times:
+        cumulative_solve_count = list(range(1, len(times) + 1)) + [len(times)]
+        ax.plot(_to_datetimes(times + [end]), cumulative_solve_count)
+
+    ax.legend([gc.StrWrap(label) for label in labels])
+    fig.autofmt_xdate()
+    return gc.figure_as_png(fig)
+
+
+def solved_scatter(regular, practice, virtual, rating_series, ranks, point_size, bin_size,
+                   legend, rating_bounds):
+    """`regular`, `practice` and `virtual` hold (time, problem rating) of the solved problems,
+    `rating_series` is as in `_plot_rating`. The y axis is cut to `rating_bounds` with a margin."""
+    fig = gc.new_figure()
+    ax = fig.gca()
+    for contest in [practice, regular, virtual]:
+        if contest:
+            times, ratings = zip(*contest)
+            ax.scatter(_to_datetimes(times), ratings, zorder=10, s=point_size)
+    labels = []
+    if practice:
+        labels.append('Practice')
+    if regular:
+        labels.append('Regular')
+    if virtual:
+        labels.append('Virtual')
+    if legend:
+        ax.legend(labels, loc='upper left')
+    _plot_average(ax, practice, bin_size)
+    _plot_rating(ax, rating_series, ranks, mark='')
+
+    # zoom
+    rlo, rhi = rating_bounds
+    ymin, ymax = ax.get_ylim()
+    ax.set_ylim(max(ymin, rlo - 100), min(ymax, rhi + 100))
+    return gc.figure_as_png(fig)
+
+
+def solve_speed(series, labels, point_size):
+    """`series` holds for every user the problem ratings, the average minutes spent on problems
+    of each rating and, to plot as well, the (rating, minutes) of every problem or None."""
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.set_xlabel('Rating')
+    ax.set_ylabel('Minutes spent')
+
+    max_time = 0
+    for xs, ys, scatter_points in series:
+        max_time = max(max_time, max(ys, default=0))
+        ax.plot(xs, ys)
+        if scatter_points:
+            ax.scatter(*zip(*scatter_points), s=point_size)
+            max_time = max(max_time, max(t for _, t in scatter_points))
+
+    ax.legend([gc.StrWrap(label) for label in labels])
+    ax.set_ylim(0, max_time + 5)
+
+    # make xticks divisible by 100
+    ticks = ax.get_xticks()
+    base = ticks[1] - ticks[0]
+    ax.xaxis.set_major_locator(MultipleLocator(base=max(base // 100 * 100, 100)))
+    return gc.figure_as_png(fig)
+
+
+def gitgud_deltas(all_deltas, labels, bins):
+    fig = gc.new_figure()
+    ax = fig.gca()
+    ax.margins(x=0)
+    ax.hist(all_deltas, bins=bins, rwidth=1)
+    ax.set_xlabel('Problem delta')
+    ax.set_ylabel('Number solved')
+    ax.legend([gc.StrWrap(label) for label in labels], prop=gc.fontprop)
+    return gc.figure_as_png(fig)
+
+
+def rating_distribution(x, height, width, colors, labels, xlim):
+    fig = gc.new_figure(figsize=(15, 5))
+    ax = fig.gca()
+
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlim(*xlim)
+    ax.bar(x, height, width, color=colors, linewidth=0, tick_label=labels, log=False)
+    ax.set_xlabel('Rating')
+    ax.set_ylabel('Number of users')
+    return gc.figure_as_png(fig)
+
+
+def country_counts(countries, counts):
+    with sns.axes_style(rc={'xtick.bottom': True}):
+        fig = gc.new_figure(figsize=(15, 5))
+    ax = fig.gca()
+    sns.barplot(x=countries, y=counts, ax=ax)
+
+    # Show counts on top of bars.
+    for p in ax.patches:
+        x = p.get_x() + p.get_width() / 2
+        y = p.get_y() + p.get_height() + 0.5
+        ax.text(x, y, int(p.get_height()), horizontalalignment='center', color='#30304f',
+                fontsize='x-small')
+
+    for label in ax.get_xticklabels():
+        label.set(rotation=40, horizontalalignment='right')
+    ax.tick_params(axis='x', length=4, color=ax.spines['bottom'].get_edgecolor())
+    ax.set_xlabel('Country')
+    ax.set_ylabel('Number of members')
+    return gc.figure_as_png(fig)
+
+
+def country_ratings(data, column_order, color_map):
+    """`data` is a list of [country, rating] pairs, `color_map` maps ratings to colors."""
+    df = pd.DataFrame(data, columns=['Country', 'Rating'])
+    if len(column_order) <= 5:
+        fig = gc.new_figure()
+        ax = fig.gca()
+        sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df, order=column_order,
+                      palette=color_map, ax=ax)
+    else:
+        # Add ticks and rotate tick labels to avoid overlap.
+        with sns.axes_style(rc={'xtick.bottom': True}):
+            fig = gc.new_figure()
+        ax = fig.gca()
+        sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df,
+                      order=column_order, palette=color_map, ax=ax)
+        for label in ax.get_xticklabels():
+            label.set(rotation=30, horizontalalignment='right')
+        ax.tick_params(axis='x', color=ax.spines['bottom'].get_edgecolor())
+    ax.legend().remove()
+    ax.set_xlabel('Country')
+    ax.set_ylabel('Rating')
+    return gc.figure_as_png(fig)
+
+
+def rating_changes_by_rank(title, xlim, ylim, ranks, deltas, colors, users_to_mark):
+    """`users_to_mark` maps handles to the (rank, delta) point to mark."""
+    fig = gc.new_figure(figsize=(12, 8))
+    ax = fig.gca()
+    ax.set_title(title)
+    ax.set_xlabel('Rank')
+    ax.set_ylabel('Rating Changes')
+
+    mark_size = 2e4 / len(ranks)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    ax.scatter(ranks, deltas, s=mark_size, c=colors)
+
+    for handle, point in users_to_mark.items():
+        ax.annotate(handle,
+                    xy=point,
+                    xytext=(0, 0),
+                    textcoords='offset points',
+                    ha='left',
+                    va='bottom',
+                    fontsize='large')
+        ax.plot(*point,
+                marker='o',
+                markersize=5,
+                color='black')
+    return gc.figure_as_png(fig)
@@ -1 +1,2 @@
 from .ranklist import *
+from .archive import RanklistArchive
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+from tle.util import codeforces_api as cf
+from tle.util.ranklist.ranklist import Ranklist
+
+
+def _pack_strings(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data, offsets):
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    return [data[begin:end].decode() for begin, end in zip(offsets, offsets[1:])]
+
+
+class RanklistArchive:
+    """Ranklists of finished contests saved to disk, one compressed .npz file per contest with the
+    standings columns, the final rating changes and the problems. Strings are stored as UTF-8
+    bytes with an array of offsets, so loading a ranklist involves no JSON.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, contest_id):
+        return os.path.join(self.directory, f'{contest_id}.npz')
+
+    def has(self, contest_id):
+        return os.path.exists(self._path(contest_id))
+
+    def save(self, ranklist):
+        standings = ranklist.standings
+        names = list(standings.names)
+        arrays = {f'standings_{name}': column for name, column in standings.columns().items()}
+
+        deltas = ranklist.delta_by_handle or {}
+        name_ids = {name: i for i, name in enumerate(names)}
+        delta_name_ids = []
+        for handle in deltas:
+            if handle not in name_ids:
+                name_ids[handle] = len(names)
+                names.append(handle)
+            delta_name_ids.append(name_ids[handle])
+        arrays['delta_name_ids'] = np.array(delta_name_ids, dtype=np.int64)
+        arrays['delta_values'] = np.array(list(deltas.values()), dtype=np.int64)
+
+        arrays['names'], arrays['names_offsets'] = _pack_strings(names)
+        problems = ranklist.problems
+        for field in ('index', 'name', 'type'):
+            arrays[f'problem_{field}'], arrays[f'problem_{field}_offsets'] = _pack_strings(
+                [getattr(problem, field) for problem in problems])
+        arrays['problem_tags'], arrays['problem_tags_offsets'] = _pack_strings(
+            [','.join(problem.tags) for problem in problems])
+        arrays['problem_points'] = np.array(
+            [np.nan if problem.points is None else problem.points for problem in problems],
+            dtype=np.float64)
+        arrays['problem_rating'] = np.array(
+            [-1 if problem.rating is None else problem.rating for problem in problems],
+            dtype=np.int64)
+        arrays['is_rated'] = np.array(ranklist.is_rated)
+        arrays['fetch_time'] = np.array(ranklist.fetch_time, dtype=np.float64)
+
+        path = self._path(ranklist.contest.id)
+        # Written under another name first, so that a half written archive is never loaded.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, contest):
+        """Returns the archived ranklist of the contest, or None if it is not archived."""
+        try:
+            archive = np.load(self._path(contest.id))
+        except FileNotFoundError:
+            return None
+        with archive:
+            names = _unpack_strings(archive['names'], archive['names_offsets'])
+            columns = {name: archive[f'standings_{name}'] for name in cf.Standings.COLUMNS}
+            standings = cf.Standings(contest.id, names, columns)
+
+            problem_fields = {
+                field: _unpack_strings(archive[f'problem_{field}'],
+                                       archive[f'problem_{field}_offsets'])
+                for field in ('index', 'name', 'type', 'tags')}
+            problems = [
+                cf.Problem(contest.id, None, index, name, type_, None if np.isnan(points) else points,
+                           None if rating == -1 else rating, tags.split(',') if tags else [])
+                for index, name, type_, tags, points, rating in zip(
+                    problem_fields['index'], problem_fields['name'], problem_fields['type'],
+                    problem_fields['tags'], archive['problem_points'].tolist(),
+                    archive['problem_rating'].tolist())]
+
+            ranklist = Ranklist(contest, problems, standings, float(archive['fetch_time']),
+                                is_rated=bool(archive['is_rated']))
+            if ranklist.is_rated:
+                ranklist.set_deltas(
+                    {names[name_id]: delta for name_id, delta in
+                     zip(archive['delta_name_ids'].tolist(), archive['delta_values'].tolist())})
+        return ranklist
+
+    def remove(self, contest_id):
+        try:
+            os.remove(self._path(contest_id))
+        except FileNotFoundError:
+            pass
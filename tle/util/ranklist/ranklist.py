@@ -1,7 +1,10 @@
+import sys
+
+import numpy as np
 from disnake.ext import commands
 
-from tle.util.ranklist.rating_calculator import CodeforcesRatingCalculator
-from tle.util.handledict import HandleDict
+from tle.util.ranklist.rating_calculator import (JoiningRatingCalculator,
+                                                 predict_rating_changes)
 
 
 class RanklistError(commands.CommandError):
@@ -29,6 +32,7 @@ class DeltasNotPresentError(RanklistError):
 
 class Ranklist:
     def __init__(self, contest, problems, standings, fetch_time, *, is_rated):
+        """`standings` is a `cf.Standings`, rows are only materialized when asked for."""
         self.contest = contest
         self.problems = problems
         self.standings = standings
@@ -36,17 +40,19 @@ class Ranklist:
 
         self.is_rated = is_rated
 
-        self.standing_by_id = HandleDict()
-        for row in self.standings:
-            if row.party.ghost:
-                # Apparently ghosts don't have team ID.
-                id_ = row.party.teamName
-            else:
-                id_ = row.party.teamId or row.party.members[0].handle
-            self.standing_by_id[id_] = row
-
         self.delta_by_handle = None
         self.deltas_status = None
+        # What the last prediction was made from, so that later ranklists of the contest can
+        # reuse it.
+        self._prediction_input = None
+        self._seed = None
+
+    def estimated_size(self):
+        """Rough number of bytes held by the ranklist."""
+        size = self.standings.estimated_size()
+        if self.delta_by_handle is not None:
+            size += sys.getsizeof(self.delta_by_handle) + 36 * len(self.delta_by_handle)
+        return size
 
     def set_deltas(self, delta_by_handle):
         if not self.is_rated:
@@ -54,24 +60,80 @@ class Ranklist:
         self.delta_by_handle = delta_by_handle.copy()
         self.deltas_status = 'Final'
 
-    def predict(self, current_rating):
+    def _find(self, id_):
+        try:
+            return self.standings.find(id_)
+        except KeyError:
+            raise HandleNotPresentError(self.contest, id_)
+
+    def predict(self, current_rating, previous=None):
+        """Predict rating changes given the current rating of the participants. `previous` may be
+        a ranklist of an earlier fetch of the same contest; its predictions are reused if the rated
+        rows are unchanged, and its seed table if the rated participants are the same."""
+        job = self.prepare_prediction(current_rating, previous)
+        if job is not None:
+            self.finish_prediction(*predict_rating_changes(*job))
+
+    def prepare_prediction(self, current_rating, previous=None):
+        """The first half of `predict`, which returns the arguments to `predict_rating_changes`
+        if rating changes have to be calculated, and None if the prediction is done already. The
+        result of `predict_rating_changes` is then passed to `finish_prediction`, possibly from
+        another process."""
         if not self.is_rated:
             raise ContestNotRatedError(self.contest)
-        standings = [(id_, row.points, row.penalty, current_rating[id_])
-                     for id_, row in self.standing_by_id.items() if id_ in current_rating]
-        if standings:
-            self.delta_by_handle = CodeforcesRatingCalculator(standings).calculate_rating_changes()
+        self.deltas_status = 'Predicted'
+        party_keys = self.standings.party_keys()
+        # With repeated parties, the last row of each counts.
+        last_row_by_key = {self.standings.find(id_): id_ for id_ in party_keys}
+        rows = [i for i, id_ in sorted(last_row_by_key.items()) if id_ in current_rating]
+        if not rows:
+            return None
+        ids = [party_keys[i] for i in rows]
+        points = self.standings.points[rows]
+        penalty = self.standings.penalty[rows]
+        ratings = np.array([current_rating[id_] for id_ in ids], dtype=np.int64)
+        self._prediction_input = ids, points, penalty, ratings
+        seed = None
+        previous_input = previous and previous._prediction_input
+        if (previous_input is not None and previous_input[0] == ids
+                and np.array_equal(previous_input[3], ratings)):
+            if (np.array_equal(previous_input[1], points)
+                    and np.array_equal(previous_input[2], penalty)):
+                self.delta_by_handle = previous.delta_by_handle
+                self._seed = previous._seed
+                return None
+            seed = previous._seed
+        return ids, points, penalty, ratings, seed
+
+    def finish_prediction(self, delta_by_handle, seed):
+        self.delta_by_handle = delta_by_handle
+        self._seed = seed
+
+    def predict_joining(self, current_rating, joining_rating):
+        """Predict the rating change of every party in `joining_rating`, each as if it had been
+        the only one of them to take part alongside the parties rated in `current_rating`. The
+        contest without them is only set up once."""
+        if not self.is_rated:
+            raise ContestNotRatedError(self.contest)
+        party_keys = self.standings.party_keys()
+        last_row_by_key = {self.standings.find(id_): id_ for id_ in party_keys}
+        rows = [i for i, id_ in sorted(last_row_by_key.items())
+                if id_ in current_rating and id_ not in joining_rating]
+        calculator = JoiningRatingCalculator(
+            rows, self.standings.points[rows], self.standings.penalty[rows],
+            [current_rating[party_keys[i]] for i in rows])
+        self.delta_by_handle = {}
+        for id_, rating in joining_rating.items():
+            row = self.standings.find(id_)
+            self.delta_by_handle[id_] = calculator.calculate_delta(
+                row, self.standings.points[row], self.standings.penalty[row], rating)
         self.deltas_status = 'Predicted'
 
     def get_delta(self, handle):
         if not self.is_rated:
             raise ContestNotRatedError(self.contest)
-        if handle not in self.standing_by_id:
-            raise HandleNotPresentError(self.contest, handle)
+        self._find(handle)
         return self.delta_by_handle.get(handle)
 
     def get_standing_row(self, handle):
-        try:
-            return self.standing_by_id[handle]
-        except KeyError:
-            raise HandleNotPresentError(self.contest, handle)
+        return self.standings.row(self._find(handle))
@@ -2,108 +2,200 @@
 Adapted from Codeforces code to recalculate ratings
 by Mike Mirzayanov (mirzayanovmr@gmail.com) at https://codeforces.com/contest/1/submission/13861109
 Updated to use the current rating formula.
-"""
 
-from dataclasses import dataclass
+The contestants are stored as parallel NumPy arrays (struct-of-arrays) rather than one object per
+contestant, so that ranking, seeding and the performance binary search run for everyone at once.
+"""
 
 import numpy as np
 from numpy.fft import fft, ifft
 
+_MAX = 6144
+
+# ELO win probability for all possible rating differences. A negative difference d is found at
+# index d, wrapping around to the end of the array.
+_ELO_WIN_PROB = np.roll(1 / (1 + pow(10, np.arange(-_MAX, _MAX) / 400)), -_MAX)
+_ELO_WIN_PROB_FFT = fft(_ELO_WIN_PROB)
+
 
 def intdiv(x, y):
     return -(-x // y) if x < 0 else x // y
 
 
-@dataclass
-class Contestant:
-    party: str
-    points: float
-    penalty: int
-    rating: int
-    need_rating: int = 0
-    delta: int = 0
-    rank: float = 0.0
-    seed: float = 0.0
+def _intdiv_array(x, y):
+    """Element-wise `intdiv`, i.e. integer division rounding towards zero."""
+    return np.where(x < 0, -(-x // y), x // y)
 
 
 class CodeforcesRatingCalculator:
     def __init__(self, standings):
         """Calculate Codeforces rating changes and seeds given contest and user information."""
-        self.contestants = [Contestant(handle, points, penalty, rating)
-                            for handle, points, penalty, rating in standings]
-        self._precalc_seed()
+        parties, points, penalty, rating = zip(*standings) if standings else ((), (), (), ())
+        self._calculate(parties, points, penalty, rating)
+
+    @classmethod
+    def from_columns(cls, parties, points, penalty, rating, *, seed=None):
+        """Like the constructor, but takes the parties and parallel sequences or arrays of points,
+        penalty and rating instead of one tuple per contestant. The seed table depends only on the
+        ratings, `seed` may be the `seed` of an earlier calculator with the same ratings."""
+        calculator = cls.__new__(cls)
+        calculator._calculate(parties, points, penalty, rating, seed)
+        return calculator
+
+    def _calculate(self, parties, points, penalty, rating, seed=None):
+        self.parties = list(parties)
+        self.points = np.array(points, dtype=np.float64)
+        self.penalty = np.array(penalty, dtype=np.int64)
+        self.rating = np.array(rating, dtype=np.int64)
+        self.elo_win_prob = _ELO_WIN_PROB
+
+        if seed is None:
+            self._precalc_seed()
+        else:
+            self.seed = seed
         self._reassign_ranks()
         self._process()
         self._update_delta()
 
     def calculate_rating_changes(self):
         """Return a mapping between contestants and their corresponding delta."""
-        return {contestant.party: contestant.delta for contestant in self.contestants}
+        return dict(zip(self.parties, self.delta.tolist()))
 
-    def get_seed(self, rating, me=None):
-        """Get seed given a rating and user."""
+    def get_seed(self, rating, me_rating=None):
+        """Get seed given a rating and optionally the rating of the user to exclude. Both
+        arguments may be scalars or arrays."""
         seed = self.seed[rating]
-        if me:
-            seed -= self.elo_win_prob[rating - me.rating]
+        if me_rating is not None:
+            seed = seed - self.elo_win_prob[np.subtract(rating, me_rating)]
         return seed
 
     def _precalc_seed(self):
-        MAX = 6144
-
-        # Precompute the ELO win probability for all possible rating differences.
-        self.elo_win_prob = np.roll(1 / (1 + pow(10, np.arange(-MAX, MAX) / 400)), -MAX)
-
-        # Compute the rating histogram.
-        count = np.zeros(2 * MAX)
-        for a in self.contestants:
-            count[a.rating] += 1
+        self.seed = _seed_table(self.rating)
 
-        # Precompute the seed for all possible ratings using FFT.
-        self.seed = 1 + ifft(fft(count) * fft(self.elo_win_prob)).real
+    def _permute(self, order):
+        self.parties = [self.parties[i] for i in order]
+        self.points = self.points[order]
+        self.penalty = self.penalty[order]
+        self.rating = self.rating[order]
 
     def _reassign_ranks(self):
-        """Find the rank of each contestant."""
-        contestants = self.contestants
-        contestants.sort(key=lambda o: (-o.points, o.penalty))
-        points = penalty = rank = None
-        for i in reversed(range(len(contestants))):
-            if contestants[i].points != points or contestants[i].penalty != penalty:
-                rank = i + 1
-                points = contestants[i].points
-                penalty = contestants[i].penalty
-            contestants[i].rank = rank
+        """Find the rank of each contestant. Tied contestants all get the lowest rank of their
+        group."""
+        # lexsort is stable and sorts by the last key first.
+        self._permute(np.lexsort((self.penalty, -self.points)))
+        self.rank = _group_ranks(self.points, self.penalty)
 
     def _process(self):
         """Process and assign approximate delta for each contestant."""
-        for a in self.contestants:
-            a.seed = self.get_seed(a.rating, a)
-            mid_rank = (a.rank * a.seed) ** 0.5
-            a.need_rating = self._rank_to_rating(mid_rank, a)
-            a.delta = intdiv(a.need_rating - a.rating, 2)
-
-    def _rank_to_rating(self, rank, me):
-        """Binary Search to find the performance rating for a given rank."""
-        left, right = 1, 8000
-        while right - left > 1:
-            mid = (left + right) // 2
-            if self.get_seed(mid, me) < rank:
-                right = mid
-            else:
-                left = mid
-        return left
+        self.contestant_seed = self.get_seed(self.rating, self.rating)
+        mid_rank = np.sqrt(self.rank * self.contestant_seed)
+        self.need_rating = _rank_to_rating(self.seed, mid_rank, self.rating)
+        self.delta = _intdiv_array(self.need_rating - self.rating, 2)
 
     def _update_delta(self):
         """Update the delta of each contestant."""
-        contestants = self.contestants
-        n = len(contestants)
-
-        contestants.sort(key=lambda o: -o.rating)
-        correction = intdiv(-sum(c.delta for c in contestants), n) - 1
-        for contestant in contestants:
-            contestant.delta += correction
-
-        zero_sum_count = min(4 * round(n ** 0.5), n)
-        delta_sum = -sum(contestants[i].delta for i in range(zero_sum_count))
-        correction = min(0, max(-10, intdiv(delta_sum, zero_sum_count)))
-        for contestant in contestants:
-            contestant.delta += correction
+        n = len(self.parties)
+        if n == 0:
+            return
+
+        order = np.argsort(-self.rating, kind='stable')
+        self._permute(order)
+        self.delta = self.delta[order]
+        self.delta += _delta_correction(self.delta)
+
+
+def predict_rating_changes(parties, points, penalty, rating, seed=None):
+    """Returns the mapping between contestants and their delta, and the seed table for reuse.
+    Suitable to run in another process."""
+    calculator = CodeforcesRatingCalculator.from_columns(parties, points, penalty, rating,
+                                                         seed=seed)
+    return calculator.calculate_rating_changes(), calculator.seed
+
+
+def _seed_table(rating):
+    """The seed for all possible ratings, given the ratings of the contestants."""
+    # Compute the rating histogram.
+    count = np.zeros(2 * _MAX)
+    np.add.at(count, rating, 1)
+
+    # Precompute the seed for all possible ratings using FFT.
+    return 1 + ifft(fft(count) * _ELO_WIN_PROB_FFT).real
+
+
+def _group_ranks(points, penalty):
+    """The rank of each contestant, given their results ordered by rank. Tied contestants all get
+    the lowest rank of their group."""
+    n = len(points)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    is_last = np.ones(n, dtype=bool)
+    is_last[:-1] = (points[1:] != points[:-1]) | (penalty[1:] != penalty[:-1])
+    group_end = np.flatnonzero(is_last) + 1
+    group_id = np.cumsum(is_last) - is_last
+    return group_end[group_id]
+
+
+def _rank_to_rating(seed, rank, me_rating):
+    """Binary Search to find the performance rating for a given rank. All contestants are
+    searched in lockstep, each one following exactly the steps of a scalar binary search."""
+    left = np.ones_like(me_rating)
+    right = np.full_like(me_rating, 8000)
+    active = right - left > 1
+    while active.any():
+        mid = (left + right) // 2
+        go_left = seed[mid] - _ELO_WIN_PROB[mid - me_rating] < rank
+        right = np.where(active & go_left, mid, right)
+        left = np.where(active & ~go_left, mid, left)
+        active = right - left > 1
+    return left
+
+
+def _delta_correction(delta):
+    """The correction added to every delta, given the deltas ordered by decreasing rating."""
+    n = len(delta)
+    correction = intdiv(-int(delta.sum()), n) - 1
+
+    zero_sum_count = min(4 * round(n ** 0.5), n)
+    delta_sum = -int(delta[:zero_sum_count].sum()) - zero_sum_count * correction
+    return correction + min(0, max(-10, intdiv(delta_sum, zero_sum_count)))
+
+
+class JoiningRatingCalculator:
+    """Calculates the rating change of a contestant joining a contest, as if they had been its
+    only extra participant, for many such contestants in turn. The contest without them is ranked
+    and seeded once. A joining contestant only adds their own term to the seed table and moves
+    down the contestants they beat or tie with, so no FFT or sort is repeated for them.
+    """
+
+    def __init__(self, positions, points, penalty, rating):
+        """The contestants are given by parallel sequences. Ties in points and penalty are broken
+        by `positions`, as the order of the contestants would in `CodeforcesRatingCalculator`."""
+        positions = np.asarray(positions, dtype=np.int64)
+        points = np.asarray(points, dtype=np.float64)
+        penalty = np.asarray(penalty, dtype=np.int64)
+        rating = np.asarray(rating, dtype=np.int64)
+        order = np.lexsort((positions, penalty, -points))
+        self.positions = positions[order]
+        self.points = points[order]
+        self.penalty = penalty[order]
+        self.rating = rating[order]
+        self.rank = _group_ranks(self.points, self.penalty)
+        self.seed = _seed_table(self.rating)
+
+    def calculate_delta(self, position, points, penalty, rating):
+        """Return the delta of a contestant with the given results and rating joining the contest
+        at `position`."""
+        ahead = (self.points > points) | ((self.points == points) & (self.penalty < penalty))
+        tied = (self.points == points) & (self.penalty == penalty)
+        num_ahead = int(ahead.sum())
+        index = num_ahead + int((tied & (self.positions < position)).sum())
+        # Everyone not strictly ahead shares a group with the contestant or ranks below.
+        rank = np.insert(self.rank + ~ahead, index, num_ahead + int(tied.sum()) + 1)
+        all_rating = np.insert(self.rating, index, rating)
+        seed = self.seed + np.roll(_ELO_WIN_PROB, rating)
+
+        contestant_seed = seed[all_rating] - _ELO_WIN_PROB[0]
+        need_rating = _rank_to_rating(seed, np.sqrt(rank * contestant_seed), all_rating)
+        delta = _intdiv_array(need_rating - all_rating, 2)
+        by_rating = np.argsort(-all_rating, kind='stable')
+        return int(delta[index]) + _delta_correction(delta[by_rating])
@@ -0,0 +1,162 @@
+"""
+    Syncing of the Codeforces rank roles of members across all guilds.
+"""
+
+import asyncio
+import logging
+from collections import namedtuple
+
+import disnake
+
+from tle.util import codeforces_api as cf
+from tle.util import codeforces_common as cf_common
+
+_EDIT_INTERVAL = 0.5  # seconds between role edits in one guild
+
+logger = logging.getLogger(__name__)
+
+# The outcome of a sync for one guild. `missing_roles` are the titles of ranks which have no role
+# in the guild, in which case no roles are changed. `changed` members got new roles, changing the
+# roles of `forbidden` members was refused by Discord.
+GuildSyncResult = namedtuple('GuildSyncResult', 'has_handles missing_roles changed forbidden')
+
+_RANK_TITLES = frozenset(rank.title for rank in cf.RATED_RANKS)
+
+
+async def set_rank_role(member, role_to_assign, *, reason):
+    """Sets the `member` to only have the rank role of `role_to_assign`. All other rank roles
+    on the member, if any, will be removed. If `role_to_assign` is None all existing rank roles
+    on the member will be removed.
+    """
+    role_names_to_remove = set(_RANK_TITLES)
+    if role_to_assign is not None:
+        role_names_to_remove.discard(role_to_assign.name)
+    to_remove = [role for role in member.roles if role.name in role_names_to_remove]
+    if to_remove:
+        await member.remove_roles(*to_remove, reason=reason)
+    if role_to_assign is not None and role_to_assign not in member.roles:
+        await member.add_roles(role_to_assign, reason=reason)
+
+
+def _has_rank_role(member, role_to_assign):
+    """Whether the rank roles of the member, as cached by the client, are exactly
+    `role_to_assign`."""
+    rank_roles = [role for role in member.roles if role.name in _RANK_TITLES]
+    if role_to_assign is None:
+        return not rank_roles
+    return rank_roles == [role_to_assign]
+
+
+class _GuildQueue:
+    """Rank role edits for the members of one guild, applied one member at a time with a pause in
+    between. A newer edit for a member replaces the pending one.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._worker = None
+
+    def put(self, member, role_to_assign, reason):
+        """Queue an edit. Returns a future which is True once the edit is made, False if it was
+        replaced by a newer edit, and which holds the exception if the edit failed."""
+        future = asyncio.get_running_loop().create_future()
+        replaced = self._pending.pop(member.id, None)
+        if replaced is not None:
+            replaced[-1].set_result(False)
+        self._pending[member.id] = member, role_to_assign, reason, future
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        return future
+
+    async def _work(self):
+        while self._pending:
+            member_id = next(iter(self._pending))
+            member, role_to_assign, reason, future = self._pending.pop(member_id)
+            try:
+                await set_rank_role(member, role_to_assign, reason=reason)
+            except disnake.HTTPException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(True)
+            await asyncio.sleep(self.interval)
+
+
+class RankRoleSync:
+    """Brings the rank roles of members in any number of guilds in line with their current
+    Codeforces rating. The users of all guilds are fetched with one `user.info` request and cached
+    together, and only members whose rank role is not the right one already are edited, through a
+    queue per guild which spaces out the edits.
+    """
+
+    def __init__(self, *, edit_interval=_EDIT_INTERVAL):
+        self.edit_interval = edit_interval
+        self._queue_by_guild = {}
+
+    async def sync(self, guilds, *, reason):
+        """Returns a dict of guild id to `GuildSyncResult`, once all edits are made."""
+        guilds = list(guilds)
+        member_handles_by_guild = {}
+        all_res = await asyncio.gather(
+            *(cf_common.user_db.get_handles_for_guild(guild.id) for guild in guilds))
+        for guild, res in zip(guilds, all_res):
+            member_handles = [(guild.get_member(user_id), handle) for user_id, handle in res]
+            member_handles_by_guild[guild] = [(member, handle) for member, handle in member_handles
+                                              if member is not None]
+
+        user_by_handle = await self._fetch_users(
+            handle for member_handles in member_handles_by_guild.values()
+            for _, handle in member_handles)
+
+        results = await asyncio.gather(
+            *(self._sync_guild(guild, member_handles, user_by_handle, reason)
+              for guild, member_handles in member_handles_by_guild.items()))
+        return {guild.id: result for guild, result in zip(member_handles_by_guild, results)}
+
+    @staticmethod
+    async def _fetch_users(handles):
+        """Fetches and caches the users of the handles, returns a dict of lowercase handle to
+        user. Handles which are not found are left out."""
+        handles = list({handle.lower(): handle for handle in handles}.values())
+        users = []
+        for handle_chunk in cf.user_info_chunkify(handles):
+            while handle_chunk:
+                try:
+                    users += await cf.user.info(handles=handle_chunk)
+                    break
+                except cf.HandleNotFoundError as e:
+                    logger.warning(f'Handle {e.handle} not found, skipping its rank role.')
+                    handle_chunk.remove(e.handle)
+        await cf_common.user_db.cache_cf_users(users)
+        return {user.handle.lower(): user for user in users}
+
+    async def _sync_guild(self, guild, member_handles, user_by_handle, reason):
+        if not member_handles:
+            return GuildSyncResult(False, set(), 0, 0)
+        member_users = [(member, user_by_handle[handle.lower()])
+                        for member, handle in member_handles if handle.lower() in user_by_handle]
+        required_roles = {user.rank.title for _, user in member_users
+                          if user.rank != cf.UNRATED_RANK}
+        rank2role = {role.name: role for role in guild.roles if role.name in required_roles}
+        missing_roles = required_roles - rank2role.keys()
+        if missing_roles:
+            return GuildSyncResult(True, missing_roles, 0, 0)
+
+        queue = self._queue_by_guild.get(guild.id)
+        if queue is None:
+            queue = self._queue_by_guild[guild.id] = _GuildQueue(self.edit_interval)
+        futures = []
+        for member, user in member_users:
+            role_to_assign = None if user.rank == cf.UNRATED_RANK else rank2role[user.rank.title]
+            if not _has_rank_role(member, role_to_assign):
+                futures.append(queue.put(member, role_to_assign, reason))
+
+        changed = forbidden = 0
+        for result in await asyncio.gather(*futures, return_exceptions=True):
+            if result is True:
+                changed += 1
+            elif isinstance(result, disnake.Forbidden):
+                forbidden += 1
+            elif isinstance(result, Exception):
+                logger.warning(f'Rank role update failed in guild {guild.id}: {result!r}')
+        return GuildSyncResult(True, missing_roles, changed, forbidden)